@@ -0,0 +1,197 @@
+#### initialize libraries ####
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+import warnings
+import numpy as np
+import pandas as pd
+import sklearn
+import data
+import models
+import simulation
+from seeding import makeRNG
+
+#### benchmark suite ####
+
+#times the main stages of the project (data pipeline, evaluation functions, bracket simulation and variable selection) on fixed inputs and writes the results as json
+#so runs on different versions of the code can be compared; every random choice is seeded, and nothing needs a network connection
+#run from the Python folder, e.g.:
+#   python benchmark.py --data-dir ../Data/2020DataFiles/2020DataFiles/2020-Mens-Data/MDataFiles_Stage1 --out results.json
+#   python benchmark.py --data-dir <synthetic data folder> --compare results.json
+
+#function that times repeated calls of a function and measures its peak memory
+#inputs:
+#   fn: the function to time (called with no arguments)
+#   repeats: number of timed calls
+#   calls: number of operations each call of fn performs (used for the time per operation; default 1)
+#   warmup: number of untimed calls made first (default 1)
+#output:
+#   result: dictionary with the minimum, median and mean seconds per call, the seconds per operation (from the minimum), and the peak memory of one call in MB
+def timeStage(fn, repeats, calls = 1, warmup = 1):
+    for _ in range(warmup):
+        fn()
+
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+
+    #peak memory is measured on a separate call, since tracing allocations slows the code down
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    result = {'min': min(times), 'median': float(np.median(times)), 'mean': float(np.mean(times)), 'repeats': repeats, 'calls': calls,
+              'perCall': min(times) / calls, 'peakMB': peak / 2 ** 20}
+
+    return result
+
+#function that calls an evalFn on every game of a list of matchups (one timed unit for the evaluation function benchmarks)
+#inputs:
+#   evalFn: the evaluation function
+#   games: list of [teamA, teamB] pairs
+#   refDF: that season's rows of the DF containing stats for all the teams
+#   rng: numpy Generator used to break ties
+def evaluateGames(evalFn, games, refDF, rng):
+    for teamA, teamB in games:
+        evalFn(teamA, teamB, refDF, rng = rng)
+
+#function that empties the caches the evaluation functions and the simulator keep between calls (team features with their rankings, each year's rows,
+#and matchup results), so the next call starts cold
+def clearCaches():
+    models.teamFeaturesCache.clear()
+    simulation.yearRowsCache.clear()
+    models.matchupResults.clear()
+
+#function that returns a version of a stage function that clears the caches first, so every timed call (the warmup included) pays for building them
+#input:
+#   fn: the stage function
+#output:
+#   the cold start stage function
+def coldStart(fn):
+    def coldFn():
+        clearCaches()
+        fn()
+    return coldFn
+
+#function that builds the benchmark stages for a data set; all inputs are loaded here so only the stage itself is timed
+#inputs:
+#   ds: the kaggleData to run on
+#   years: list of tournament years for the simulation stages
+#   seed: seed for every random choice
+#output:
+#   stages: list of [name, function, operations per call]; the evaluation function and simulation stages come twice, as they run in a long session
+#           (the caches filled by the warmup call are reused) and from a cold start (the caches are cleared inside every timed call, see coldStart)
+def createStages(ds, years, seed):
+    regSeasCompactResults = ds.regSeasCompactResults
+    regSeasDetailedResults = ds.regSeasDetailedResults
+    seedResults = ds.seedResults
+    regSeasDetailedTotals = ds.regSeasDetailedTotals
+    masterCompact = ds.masterCompact
+    masterDetailed = ds.masterDetailed
+    logRegDF = data.createDetailedLogRegDF(masterDetailed, rng = seed)
+
+    lastYear = years[-1]
+    yearDF = masterDetailed[masterDetailed['Season'] == lastYear]
+    games = [[a, b] for a, b in zip(yearDF['WTeamID'].tolist(), yearDF['LTeamID'].tolist())] #that year's tournament matchups
+
+    stages = [['createRegSeasonStatsDF (compact)', lambda: data.createRegSeasonStatsDF(regSeasCompactResults, data.columnsCompact), 1],
+              ['createRegSeasonStatsDF (detailed)', lambda: data.createRegSeasonStatsDF(regSeasDetailedResults, data.columnsDetailed), 1],
+              ['createMasterDF', lambda: data.createMasterDF(seedResults, regSeasDetailedTotals), 1],
+              ['createDetailedLogRegDF', lambda: data.createDetailedLogRegDF(masterDetailed, rng = seed), 1]]
+
+    #one evaluation function from each family: seed, stat comparison and logistic regression
+    cachedStages = []
+    for name, evalFn in {'highSeedWins': models.highSeedWins, 'betterRecordWins': models.betterRecordWins, 'logRegPredictFull': models.logRegPredictFull}.items():
+        cachedStages.append(['evalFn ' + name, lambda evalFn = evalFn: evaluateGames(evalFn, games, yearDF, makeRNG(seed)), len(games)])
+
+    cachedStages.extend([['tourneySim (' + str(lastYear) + ')', lambda: simulation.tourneySim(lastYear, models.logRegPredictFull, masterDetailed, rng = seed), 1],
+                         ['tourneySimVsActual (' + str(years[0]) + '-' + str(lastYear) + ')', lambda: simulation.tourneySimVsActual(years, models.logRegPredictFull, masterCompact, masterDetailed, rng = seed), 1]])
+
+    for name, fn, calls in cachedStages:
+        stages.extend([[name, fn, calls], [name + ' (cold)', coldStart(fn), calls]])
+
+    stages.append(['logisticSelect', lambda: models.logisticSelect(data.yVariable, data.xVariables, logRegDF, rng = makeRNG(seed)), 1])
+
+    return stages
+
+#function that returns the commit of the code being benchmarked (None outside a git checkout)
+def codeVersion():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd = os.path.dirname(os.path.abspath(__file__)), capture_output = True, text = True, check = True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+#function that runs the benchmark suite
+#inputs:
+#   dataDir: folder holding the Kaggle csv's (or a synthetic data set in the same format)
+#   years: list of tournament years for the simulation stages (years missing from the data are left out)
+#   repeats: number of timed calls of each stage (default 5)
+#   seed: seed for every random choice (default 0)
+#   stageFilter: only run stages whose name contains one of these strings (default None runs every stage)
+#output:
+#   results: dictionary with the environment the suite ran in and the timings of each stage (see timeStage)
+def runBenchmarks(dataDir, years, repeats = 5, seed = 0, stageFilter = None):
+    ds = data.kaggleData(dataDir = dataDir, useCache = False) #always build from the csv's so results do not depend on the state of the cache
+    seasons = set(np.asarray(ds.seeds['Season'], dtype = np.int64).tolist())
+    years = [x for x in years if x in seasons]
+    if len(years) == 0:
+        raise ValueError('none of the requested years are in ' + dataDir)
+
+    results = {'version': codeVersion(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(), 'numpy': np.__version__,
+               'pandas': pd.__version__, 'sklearn': sklearn.__version__, 'platform': platform.platform(), 'cpus': os.cpu_count(),
+               'dataDir': os.path.abspath(dataDir), 'years': [years[0], years[-1]], 'seed': seed, 'stages': {}}
+
+    for name, fn, calls in createStages(ds, years, seed):
+        if stageFilter is not None and not any(x in name for x in stageFilter):
+            continue
+        results['stages'][name] = timeStage(fn, repeats, calls = calls)
+        print('{:<45}{:>12.4f} s{:>12.1f} MB'.format(name, results['stages'][name]['min'], results['stages'][name]['peakMB']), file = sys.stderr)
+
+    return results
+
+#function that compares the timings of two benchmark runs
+#inputs:
+#   results: the current results (see runBenchmarks)
+#   baseline: earlier results to compare with
+#output:
+#   compareDF: data frame indexed by stage with the time per call of both runs and their ratio (above 1 is slower than the baseline)
+def compareResults(results, baseline):
+    stages = [x for x in results['stages'] if x in baseline['stages']]
+    compareDF = pd.DataFrame({'baseline': [baseline['stages'][x]['perCall'] for x in stages], 'current': [results['stages'][x]['perCall'] for x in stages]}, index = pd.Index(stages, name = 'stage'))
+    compareDF['ratio'] = compareDF['current'] / compareDF['baseline']
+
+    return compareDF
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'time the main stages of the project and write the results as json')
+    parser.add_argument('--data-dir', default = data.dataDir, help = 'folder holding the Kaggle csv files (default: the project data folder)')
+    parser.add_argument('--first-year', type = int, default = 2003, help = 'first tournament year of the simulation stages (default 2003)')
+    parser.add_argument('--last-year', type = int, default = 2019, help = 'last tournament year of the simulation stages (default 2019)')
+    parser.add_argument('--repeats', type = int, default = 5, help = 'timed calls of each stage (default 5)')
+    parser.add_argument('--seed', type = int, default = 0, help = 'seed for every random choice (default 0)')
+    parser.add_argument('--stage', action = 'append', help = 'only run stages whose name contains this text (can be repeated)')
+    parser.add_argument('--out', help = 'file to write the json results to (default: standard output)')
+    parser.add_argument('--compare', help = 'json results of an earlier run to compare against')
+    args = parser.parse_args()
+
+    warnings.simplefilter('ignore', pd.errors.SettingWithCopyWarning) #dataAugment works on a slice of its input, which is expected here
+
+    results = runBenchmarks(args.data_dir, list(range(args.first_year, args.last_year + 1)), repeats = args.repeats, seed = args.seed, stageFilter = args.stage)
+
+    if args.out is None:
+        print(json.dumps(results, indent = 2))
+    else:
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent = 2)
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            print(compareResults(results, json.load(f)).to_string(), file = sys.stderr)
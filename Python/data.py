@@ -1,10 +1,21 @@
 #### initialize libraries ####
 import numpy as np
+from numpy.lib import recfunctions
 import pandas as pd
 import os
 import sys
 import time
-import re
+import functools
+import hashlib
+import pickle
+import instrument
+from seeding import makeRNG
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError: #the derived data cache falls back to pickles without pyarrow
+    pyarrow = None
 
 #### data functions ####
 
@@ -47,6 +58,55 @@ def createSeedResultsDF(seeds, results):
 
     return seedResults
 
+#function that aggregates regular season game results into raw per-team season totals in one vectorized pass (no per-game loop)
+#the winner and loser views of every game are stacked once, each (season, team) pair gets a row number, and every stat is summed with a single bincount
+#inputs:
+#   regSeasonResults: a data frame pulled directly from MRegularSeasonCompactResults.csv or MRegularSeasonDetailedResults.csv
+#   columns: a list with the names of the columns to be included (columnsCompact or columnsDetailed)
+#output:
+#   seasonTotals: a data frame containing Season, TeamID, Wins, Losses, Pts, PA (and extra items if detailed) for every team; G is left at 0
+def aggregateRegSeasonTotals(regSeasonResults, columns):
+    nGames = regSeasonResults.shape[0]
+    seasonCodes, seasons = pd.factorize(regSeasonResults['Season']) #position of each game's season in the list of seasons (seasons kept in order of appearance)
+    WTeams = regSeasonResults['WTeamID'].to_numpy(dtype = np.int64)
+    LTeams = regSeasonResults['LTeamID'].to_numpy(dtype = np.int64)
+
+    #stack the winner view of every game on top of the loser view
+    stackedSeasons = np.concatenate((seasonCodes, seasonCodes)).astype(np.int64)
+    stackedTeams = np.concatenate((WTeams, LTeams))
+    side = np.repeat([0, 1], nGames) #0 for winner rows, 1 for loser rows
+
+    #walk the stacked rows season by season, winners before losers, so teams are numbered in the same order the old game loop found them
+    order = np.argsort(stackedSeasons * 2 + side, kind = 'stable')
+    teamBase = int(stackedTeams.max()) + 1 if nGames > 0 else 1
+    teamKeys = stackedSeasons * teamBase + stackedTeams #single integer key for each (season, team) pair
+
+    rowCodes = np.empty(2 * nGames, dtype = np.int64) #output row of every stacked game
+    rowCodes[order], rowKeys = pd.factorize(teamKeys[order])
+    nrow = rowKeys.shape[0]
+
+    rowSeasons = rowKeys // teamBase
+    rowIndex = np.arange(nrow) - np.searchsorted(rowSeasons, rowSeasons) #rows are numbered from 0 within each season, as they were when each season was built separately
+
+    data = {}
+    data['Season'] = np.asarray(seasons)[rowSeasons].astype(object) #kept as object to match the previously generated totals
+    data['TeamID'] = (rowKeys % teamBase).astype(object)
+    data['G'] = np.zeros(nrow)
+    data['Wins'] = np.bincount(rowCodes[:nGames], minlength = nrow).astype(float)
+    data['Losses'] = np.bincount(rowCodes[nGames:], minlength = nrow).astype(float)
+
+    WScore = regSeasonResults['WScore'].to_numpy()
+    LScore = regSeasonResults['LScore'].to_numpy()
+    data['Pts'] = np.bincount(rowCodes, weights = np.concatenate((WScore, LScore)), minlength = nrow) #each team's own score from both views
+    data['PA'] = np.bincount(rowCodes, weights = np.concatenate((LScore, WScore)), minlength = nrow) #and the opponent's score
+
+    for j in columns[7:]: #remaining data items (detailed run only)
+        data[j] = np.bincount(rowCodes, weights = np.concatenate((regSeasonResults['W' + j].to_numpy(), regSeasonResults['L' + j].to_numpy())), minlength = nrow)
+
+    seasonTotals = pd.DataFrame(data = data, columns = columns, index = rowIndex)
+
+    return seasonTotals
+
 #function that creates a data frame containing the wins, losses, points scored and points allowed of every NCAA div 1 team since 1985
 #input:
 #   regSeasonResults: a data frame pulled directly from MRegularSeasonCompactResults.csv or MRegularSeasonDetailedResults.csv
@@ -54,58 +114,296 @@ def createSeedResultsDF(seeds, results):
 #output:
 #   masterSeasonTotals: a data frame containing team id, season, G, W, L, PF, PA (and extra items if detailed) for every team
 def createRegSeasonStatsDF(regSeasonResults, columns):
-    years = regSeasonResults.Season.unique() #every unique year in the data set
-    masterSeasonTotals = pd.DataFrame(columns = columns) #make an empty data frame to hold the new season data
+    masterSeasonTotals = aggregateRegSeasonTotals(regSeasonResults, columns) #W, L, PF and PA, and any additional columns, for each team in each year
+
+    masterSeasonTotals = addPerGameStats(masterSeasonTotals, columns) #games played, record and per game columns
+
+    return masterSeasonTotals
+
+#function that builds the same season totals as aggregateRegSeasonTotals while reading the results csv in chunks, so the full raw table is never held in memory
+#each chunk is read with narrow integer types and folded into running per-team totals; the first game each team wins and loses is tracked so the rows come out in the same order
+#inputs:
+#   path: path of MRegularSeasonCompactResults.csv or MRegularSeasonDetailedResults.csv
+#   columns: a list with the names of the columns to be included (columnsCompact or columnsDetailed)
+#   chunkSize: number of games read at a time (default 100000)
+#output:
+#   seasonTotals: the raw totals, with G left at 0 (see addPerGameStats)
+def streamRegSeasonTotals(path, columns, chunkSize = 100000):
+    items = ['Score'] + columns[7:] #the items read for both teams
+    usecols = ['Season', 'WTeamID', 'LTeamID'] + [x + y for y in items for x in ['W', 'L']]
+    dtypes = {x: np.int16 for x in usecols} #seasons, team ids and box score numbers all fit in 16 bits
+
+    teamBase = 1 << 16 #team ids are below this, so season * teamBase + team id is a unique key
+    noGame = np.iinfo(np.int64).max
+
+    keyIndex = pd.Index(np.zeros(0, dtype = np.int64)) #(season, team) key of each running total
+    seasons = [] #seasons in order of first appearance
+    sums = {x: np.zeros(0) for x in ['Wins', 'Losses', 'Pts', 'PA'] + columns[7:]}
+    firstWin = np.zeros(0, dtype = np.int64) #position in the file of each team's first win (noGame if none yet)
+    firstLoss = np.zeros(0, dtype = np.int64) #and first loss
+    gamesRead = 0
+
+    for chunk in pd.read_csv(path, usecols = usecols, dtype = dtypes, chunksize = chunkSize):
+        n = chunk.shape[0]
+        season = chunk['Season'].to_numpy(dtype = np.int64)
+        seasons.extend([x for x in pd.unique(season).tolist() if x not in seasons])
+
+        #winner view of every game followed by the loser view
+        stackedKeys = np.concatenate((season * teamBase + chunk['WTeamID'].to_numpy(dtype = np.int64), season * teamBase + chunk['LTeamID'].to_numpy(dtype = np.int64)))
+        rowCodes = keyIndex.get_indexer(stackedKeys)
+        newKeys = pd.unique(stackedKeys[rowCodes < 0])
+        if newKeys.shape[0] > 0: #new teams get running totals starting from zero
+            keyIndex = keyIndex.append(pd.Index(newKeys))
+            for x in sums:
+                sums[x] = np.concatenate((sums[x], np.zeros(newKeys.shape[0])))
+            firstWin = np.concatenate((firstWin, np.full(newKeys.shape[0], noGame)))
+            firstLoss = np.concatenate((firstLoss, np.full(newKeys.shape[0], noGame)))
+            rowCodes = keyIndex.get_indexer(stackedKeys)
+        nrow = keyIndex.shape[0]
+
+        sums['Wins'] += np.bincount(rowCodes[:n], minlength = nrow)
+        sums['Losses'] += np.bincount(rowCodes[n:], minlength = nrow)
+        WScore = chunk['WScore'].to_numpy(dtype = np.float64)
+        LScore = chunk['LScore'].to_numpy(dtype = np.float64)
+        sums['Pts'] += np.bincount(rowCodes, weights = np.concatenate((WScore, LScore)), minlength = nrow)
+        sums['PA'] += np.bincount(rowCodes, weights = np.concatenate((LScore, WScore)), minlength = nrow)
+        for j in columns[7:]:
+            sums[j] += np.bincount(rowCodes, weights = np.concatenate((chunk['W' + j].to_numpy(dtype = np.float64), chunk['L' + j].to_numpy(dtype = np.float64))), minlength = nrow)
+
+        gamePos = gamesRead + np.arange(n)
+        np.minimum.at(firstWin, rowCodes[:n], gamePos)
+        np.minimum.at(firstLoss, rowCodes[n:], gamePos)
+        gamesRead += n
+
+    #order the rows as aggregateRegSeasonTotals does: by season, then teams by their first win, then teams without a win by their first loss
+    rowKeys = keyIndex.to_numpy()
+    seasonRank = pd.Index(seasons, dtype = np.int64).get_indexer(rowKeys // teamBase)
+    hasWin = firstWin < noGame
+    order = np.lexsort((np.where(hasWin, firstWin, firstLoss), ~hasWin, seasonRank))
+    rowKeys = rowKeys[order]
+    seasonRank = seasonRank[order]
+    rowIndex = np.arange(rowKeys.shape[0]) - np.searchsorted(seasonRank, seasonRank) #rows are numbered from 0 within each season
+
+    data = {}
+    data['Season'] = (rowKeys // teamBase).astype(object) #kept as object to match the previously generated totals
+    data['TeamID'] = (rowKeys % teamBase).astype(object)
+    data['G'] = np.zeros(rowKeys.shape[0])
+    for x in sums:
+        data[x] = sums[x][order]
+
+    seasonTotals = pd.DataFrame(data = data, columns = columns, index = rowIndex)
+
+    return seasonTotals
+
+#function that fills in the games played column and the per game / percentage columns from the raw season totals
+#inputs:
+#   seasonTotals: raw totals as created by aggregateRegSeasonTotals (or any subset of its rows)
+#   columns: the list of columns the totals were built with (columnsCompact or columnsDetailed)
+#output:
+#   seasonTotals: the input DF with G and the derived columns (Record, PtsPG, ...) filled in
+def addPerGameStats(seasonTotals, columns):
     ncol = len(columns) #size of output data frame will depend on columns given
 
-    #loop that iterates through each year in the data set and finds the W, L, PF and PA, and any additional columns, for each team in each year
-    for year in years:
-        print(year)
-        actSeason = regSeasonResults[regSeasonResults.Season == year] #the currently active year (a subset of original data set)
-        actSeason.reset_index(inplace = True) #reset the index of the subset (for cleaner indexing in next loop)
-        teams = actSeason.WTeamID.append(actSeason.LTeamID).unique() #get list of unique teams for active year
-        nrow = len(teams) #number of rows to be added to data frame
-        actSeasonTotals = pd.DataFrame(data = np.zeros((nrow, ncol)), columns = columns) #create data frame with correct number of rows and columns for data fill
-
-        actSeasonTotals['Season'] = pd.Series(data = [year] * nrow) #fill in this data frame with the current season
-        actSeasonTotals['TeamID'] = pd.Series(data = teams) #also fill in with every team that played that season
-
-        #loop that iterates through each game in the season and aggregates the info into the new data frame
-        for game in range(actSeason.shape[0]):
-            WInd = actSeasonTotals.index[actSeasonTotals['TeamID'] == actSeason.loc[game, 'WTeamID']].tolist()[0] #find the row index of the winning team in the active game
-            LInd = actSeasonTotals.index[actSeasonTotals['TeamID'] == actSeason.loc[game, 'LTeamID']].tolist()[0] #row index of losing team in active game
-            actSeasonTotals.loc[WInd, 'Wins'] += 1 #increment winning team's win total by 1
-            actSeasonTotals.loc[LInd, 'Losses'] += 1 #increment losing team's loss total by 1
-            actSeasonTotals.loc[WInd, 'Pts'] += actSeason.loc[game, 'WScore'] #add the winning team's points scored to their season PF total
-            actSeasonTotals.loc[WInd, 'PA'] += actSeason.loc[game, 'LScore'] #add the losing team's points scored to the winning team's PA total
-            actSeasonTotals.loc[LInd, 'Pts'] += actSeason.loc[game, 'LScore'] #do the same for the losing team
-            actSeasonTotals.loc[LInd, 'PA'] += actSeason.loc[game, 'WScore']
-
-            if ncol > 7: #test to see if this is the detailed run (otherwise this code won't run)
-                for j in columns[7:]: #iterate through remaining data items
-                    actSeasonTotals.loc[WInd, j] += actSeason.loc[game, ('W' + j)] #follow the procedure from above for winner and loser
-                    actSeasonTotals.loc[LInd, j] += actSeason.loc[game, ('L' + j)]
-
-        masterSeasonTotals = pd.concat([masterSeasonTotals, actSeasonTotals], axis = 0) #collect all the active seasons together in the master data frame created above
-
-    masterSeasonTotals['G'] = masterSeasonTotals['Wins'] + masterSeasonTotals['Losses'] #fill in games played column with sum of win and loss columns
-
-    masterSeasonTotals['Record'] = masterSeasonTotals['Wins'] / masterSeasonTotals['G']
-    masterSeasonTotals['PtsPG'] = masterSeasonTotals['Pts'] / masterSeasonTotals['G']
+    seasonTotals['G'] = seasonTotals['Wins'] + seasonTotals['Losses'] #fill in games played column with sum of win and loss columns
 
-    if ncol > 7: #check to see whether this is detailed or compact stats DF (detailed if > 7)
-        masterSeasonTotals['FGPerc'] = masterSeasonTotals['FGM'] / masterSeasonTotals['FGA']
-        masterSeasonTotals['FG3Perc'] = masterSeasonTotals['FGM3'] / masterSeasonTotals['FGA3']
-        masterSeasonTotals['FTPerc'] = masterSeasonTotals['FTM'] / masterSeasonTotals['FTA']
-        masterSeasonTotals['TR'] = masterSeasonTotals['OR'] + masterSeasonTotals['DR']
-        masterSeasonTotals['RebPG'] = masterSeasonTotals['TR'] / masterSeasonTotals['G']
-        masterSeasonTotals['AstPG'] = masterSeasonTotals['Ast'] / masterSeasonTotals['G']
-        masterSeasonTotals['TOPG'] = masterSeasonTotals['TO'] / masterSeasonTotals['G']
-        masterSeasonTotals['StlPG'] = masterSeasonTotals['Stl'] / masterSeasonTotals['G']
-        masterSeasonTotals['BlkPG'] = masterSeasonTotals['Blk'] / masterSeasonTotals['G']
-        masterSeasonTotals['PFPG'] = masterSeasonTotals['PF'] / masterSeasonTotals['G']
+    seasonTotals['Record'] = seasonTotals['Wins'] / seasonTotals['G']
+    seasonTotals['PtsPG'] = seasonTotals['Pts'] / seasonTotals['G']
 
-    return masterSeasonTotals
+    if ncol > 7: #check to see whether this is detailed or compact stats DF (detailed if > 7)
+        seasonTotals['FGPerc'] = seasonTotals['FGM'] / seasonTotals['FGA']
+        seasonTotals['FG3Perc'] = seasonTotals['FGM3'] / seasonTotals['FGA3']
+        seasonTotals['FTPerc'] = seasonTotals['FTM'] / seasonTotals['FTA']
+        seasonTotals['TR'] = seasonTotals['OR'] + seasonTotals['DR']
+        seasonTotals['RebPG'] = seasonTotals['TR'] / seasonTotals['G']
+        seasonTotals['AstPG'] = seasonTotals['Ast'] / seasonTotals['G']
+        seasonTotals['TOPG'] = seasonTotals['TO'] / seasonTotals['G']
+        seasonTotals['StlPG'] = seasonTotals['Stl'] / seasonTotals['G']
+        seasonTotals['BlkPG'] = seasonTotals['Blk'] / seasonTotals['G']
+        seasonTotals['PFPG'] = seasonTotals['PF'] / seasonTotals['G']
+
+    return seasonTotals
+
+#class that keeps the regular season totals on disk and folds in only the games that have not been seen yet (results files are append-only during the season)
+#updateFromCSV is the refresh path kaggleData uses: it remembers how far into the results csv it has read and only reads the rows appended since, in chunks
+#(a csv that was rewritten rather than appended to is read again from the start); update folds the unseen games of a results data frame that is already loaded
+#the totals come out exactly as createRegSeasonStatsDF builds them from the whole file, row order included
+#attributes:
+#   path: location of the pickled store
+#   columns: the list of columns the totals are built with (columnsCompact or columnsDetailed)
+#   totals: the season totals, same layout as the output of createRegSeasonStatsDF
+#   firstGames: array with the position in the results of each totals row's first win and first loss (noGame if none yet), used to keep the rows in order
+#   seasons: list of the seasons in order of first appearance
+#   foldedGames: a data frame with one row per (Season, DayNum) holding the number of games from that day already in totals
+#   bytesRead, rowsRead: how much of the results csv updateFromCSV has folded in (bytesRead is None when the totals did not come from updateFromCSV)
+#   tailHash: hash of the last block of the csv before bytesRead, to tell an appended csv from a rewritten one
+class seasonTotalsStore:
+    noGame = np.iinfo(np.int64).max
+    tailBytes = 1 << 16 #size of the block tailHash covers
+
+    def __init__(self, path, columns):
+        self.path = path
+        self.columns = columns
+        self.reset()
+
+        if os.path.exists(path): #pick up where the last run stopped
+            stored = pd.read_pickle(path)
+            if 'firstGames' in stored: #stores written before the totals were kept in order are built again
+                self.__dict__.update(stored)
+
+    #function that empties the store
+    def reset(self):
+        self.totals = None
+        self.firstGames = np.zeros((0, 2), dtype = np.int64)
+        self.seasons = []
+        self.foldedGames = pd.DataFrame({'Season': pd.Series(dtype = np.int64), 'DayNum': pd.Series(dtype = np.int64), 'Games': pd.Series(dtype = np.int64)})
+        self.bytesRead = 0
+        self.rowsRead = 0
+        self.tailHash = None
+
+    #function that returns the high-water mark of each season (the last DayNum folded into the totals)
+    def highWaterMarks(self):
+        return self.foldedGames.groupby('Season')['DayNum'].max()
+
+    #function that marks the rows of a results data frame that have not been folded into the totals yet
+    #input:
+    #   regSeasonResults: a data frame pulled directly from MRegularSeasonCompactResults.csv or MRegularSeasonDetailedResults.csv
+    #output:
+    #   boolean array that is True for the unseen games (rows before a season's high-water mark are skipped without further checks)
+    def newGameMask(self, regSeasonResults):
+        highWater = regSeasonResults['Season'].map(self.highWaterMarks()).to_numpy() #NaN for seasons that have never been folded
+        isCandidate = ~(regSeasonResults['DayNum'].to_numpy() < highWater) #only days at or after the high-water mark can hold new games
+        candidates = regSeasonResults[isCandidate]
+
+        #within each (Season, DayNum) the first 'Games' rows are the ones folded on an earlier run
+        gameNum = candidates.groupby(['Season', 'DayNum']).cumcount().to_numpy()
+        folded = pd.merge(candidates[['Season', 'DayNum']], self.foldedGames, on = ['Season', 'DayNum'], how = 'left')['Games'].fillna(0).to_numpy()
+
+        isNew = np.zeros(regSeasonResults.shape[0], dtype = bool)
+        isNew[np.flatnonzero(isCandidate)[gameNum >= folded]] = True
+        return isNew
+
+    #function that picks out the rows of a results data frame that have not been folded into the totals yet (see newGameMask)
+    def newGames(self, regSeasonResults):
+        return regSeasonResults[self.newGameMask(regSeasonResults)]
+
+    #function that folds the unseen games of a results data frame into the stored totals
+    #input:
+    #   regSeasonResults: the whole of a data frame pulled directly from MRegularSeasonCompactResults.csv or MRegularSeasonDetailedResults.csv
+    #output:
+    #   the number of games folded in (0 if the totals were already up to date)
+    def update(self, regSeasonResults):
+        isNew = self.newGameMask(regSeasonResults)
+        self.bytesRead = None #the totals no longer follow a known point in the csv
+        return self.fold(regSeasonResults[isNew], np.flatnonzero(isNew))
+
+    #function that folds the games appended to a results csv since the last call into the stored totals, reading only the new rows
+    #inputs:
+    #   csvPath: path of MRegularSeasonCompactResults.csv or MRegularSeasonDetailedResults.csv
+    #   chunkSize: number of games read at a time (default 100000)
+    #output:
+    #   the number of games folded in (0 if the totals were already up to date)
+    def updateFromCSV(self, csvPath, chunkSize = 100000):
+        size = os.path.getsize(csvPath)
+        with open(csvPath, 'rb') as f:
+            header = f.readline().decode().strip().split(',')
+            start = f.tell()
+
+            if self.bytesRead is None or size < self.bytesRead or (self.bytesRead > start and self.fileTailHash(f, self.bytesRead) != self.tailHash):
+                self.reset() #rewritten, or folded some other way: read it all again
+            if self.bytesRead > start:
+                start = self.bytesRead
+            if start >= size:
+                return 0
+
+            usecols = ['Season', 'DayNum', 'WTeamID', 'LTeamID'] + [x + y for y in ['Score'] + self.columns[7:] for x in ['W', 'L']]
+            f.seek(start)
+            folded = 0
+            for chunk in pd.read_csv(f, header = None, names = header, usecols = usecols, dtype = {x: np.int16 for x in usecols}, chunksize = chunkSize):
+                folded += self.fold(chunk, self.rowsRead + np.arange(chunk.shape[0]))
+                self.rowsRead += chunk.shape[0]
+
+            self.bytesRead = f.tell()
+            self.tailHash = self.fileTailHash(f, self.bytesRead)
+
+        return folded
+
+    #function that hashes the last block of a file before a position
+    def fileTailHash(self, f, end):
+        f.seek(max(end - self.tailBytes, 0))
+        return hashlib.sha256(f.read(min(end, self.tailBytes))).hexdigest()
+
+    #function that adds games to the stored totals
+    #inputs:
+    #   newResults: games not folded in yet, in the format of the results csv's
+    #   positions: position of each game in the results (keeps the rows in the order a full build has them)
+    #output:
+    #   the number of games folded in
+    def fold(self, newResults, positions):
+        if newResults.shape[0] == 0:
+            return 0
+
+        newTotals = aggregateRegSeasonTotals(newResults, self.columns) #totals over the new games only
+        rawColumns = self.columns[3:] #Wins, Losses, Pts, PA and any extra items (G and the derived columns are recomputed)
+        self.seasons.extend([x for x in pd.unique(newResults['Season'].to_numpy(dtype = np.int64)).tolist() if x not in self.seasons])
+
+        #first win and first loss of each team among the new games
+        teamBase = 1 << 16 #team ids are below this, so season * teamBase + team id is a unique key
+        season = newResults['Season'].to_numpy(dtype = np.int64)
+        newKeys = pd.Index(newTotals['Season'].to_numpy(dtype = np.int64) * teamBase + newTotals['TeamID'].to_numpy(dtype = np.int64))
+        newFirstGames = np.full((newKeys.shape[0], 2), self.noGame, dtype = np.int64)
+        positions = np.asarray(positions, dtype = np.int64)
+        np.minimum.at(newFirstGames[:, 0], newKeys.get_indexer(season * teamBase + newResults['WTeamID'].to_numpy(dtype = np.int64)), positions)
+        np.minimum.at(newFirstGames[:, 1], newKeys.get_indexer(season * teamBase + newResults['LTeamID'].to_numpy(dtype = np.int64)), positions)
+
+        if self.totals is None or self.totals.shape[0] == 0:
+            totals = addPerGameStats(newTotals, self.columns)
+            firstGames = newFirstGames
+        else:
+            totals = self.totals.reset_index(drop = True) #positional index while folding
+            storedKeys = pd.Index(totals['Season'].to_numpy(dtype = np.int64) * teamBase + totals['TeamID'].to_numpy(dtype = np.int64))
+            rowPos = storedKeys.get_indexer(newKeys) #row of each team in the stored totals (-1 if the team has no games yet this season)
+            found = rowPos >= 0
+            changed = rowPos[found]
+
+            #add the new games onto teams that already have a row
+            raw = totals[rawColumns].to_numpy()
+            raw[changed] += newTotals[rawColumns].to_numpy()[found]
+            totals[rawColumns] = raw
+            firstGames = self.firstGames.copy()
+            firstGames[changed] = np.minimum(firstGames[changed], newFirstGames[found])
+
+            #recompute G and the per game columns for the changed teams only
+            changedTotals = addPerGameStats(totals.iloc[changed].copy(), self.columns)
+            derivedColumns = ['G'] + [x for x in changedTotals.columns if x not in self.columns]
+            totals.iloc[changed, [totals.columns.get_loc(x) for x in derivedColumns]] = changedTotals[derivedColumns].to_numpy()
+
+            #teams playing their first game of the season are added
+            addedTotals = addPerGameStats(newTotals[~found].copy(), self.columns)
+            totals = pd.concat([totals, addedTotals], ignore_index = True)
+            firstGames = np.concatenate((firstGames, newFirstGames[~found]))
+
+        #put the rows in the order a full build has them: by season, then teams by their first win, then teams without a win by their first loss
+        seasonRank = pd.Index(self.seasons, dtype = np.int64).get_indexer(totals['Season'].to_numpy(dtype = np.int64))
+        hasWin = firstGames[:, 0] < self.noGame
+        order = np.lexsort((np.where(hasWin, firstGames[:, 0], firstGames[:, 1]), ~hasWin, seasonRank))
+        totals = totals.iloc[order]
+        totals.index = np.arange(order.shape[0]) - np.searchsorted(seasonRank[order], seasonRank[order]) #rows numbered from 0 within each season
+        self.totals = totals
+        self.firstGames = firstGames[order]
+
+        #record how many games of each (Season, DayNum) have now been folded
+        newCounts = newResults.groupby(['Season', 'DayNum']).size().rename('Games')
+        newCounts.index = newCounts.index.set_levels([x.astype(np.int64) for x in newCounts.index.levels])
+        foldedCounts = self.foldedGames.set_index(['Season', 'DayNum'])['Games']
+        self.foldedGames = foldedCounts.add(newCounts, fill_value = 0).astype(np.int64).reset_index()
+
+        return newResults.shape[0]
+
+    #function that writes the store back to disk (to a temporary file first, so other processes never read a partial store)
+    def save(self):
+        tempPath = self.path + '.' + str(os.getpid()) + '.tmp'
+        pd.to_pickle({x: self.__dict__[x] for x in ['totals', 'firstGames', 'seasons', 'foldedGames', 'bytesRead', 'rowsRead', 'tailHash']}, tempPath)
+        os.replace(tempPath, self.path)
 
 #function that merges the seedResults and regSeasTotals data frames created above, and adds columns for conference appearances
 #inputs:
@@ -114,48 +412,20 @@ def createRegSeasonStatsDF(regSeasonResults, columns):
 #outputs:
 #   outDF: a data frame that merges these two data frames such that the columns defined above are incorporated for the winning and losing teams
 def createMasterDF(seedResults, regSeasTotals):
-    srFn = seedResults[:] #create copy to avoid modifying original
-    rstFn = regSeasTotals[:]
+    statCols = [x for x in regSeasTotals.columns if x not in ['Season', 'TeamID']] #the values to be added for both teams (everything other than the merge keys)
 
-    rstFn.rename(columns = {'TeamID': 'WTeamID'}, inplace = True) #match up column names to merge on
-    outDF = pd.merge(srFn, rstFn, on = ['WTeamID', 'Season'])
-
-    colNames = list(outDF.columns) 
-
-    for i in range(12, len(colNames)): #loop to add a 'W' to the front of these column names because the values are for the winning team (first 12 columns are general game info)
-        colNames[i] = re.sub(r'^', 'W', colNames[i])
-
-    outDF.columns = colNames #use new column names
-
-    colInd = len(colNames)
+    #merge the winner's season totals on, adding a 'W' to the front of their column names because the values are for the winning team
+    WTotals = regSeasTotals.rename(columns = dict([('TeamID', 'WTeamID')] + [(x, 'W' + x) for x in statCols]))
+    outDF = pd.merge(seedResults, WTotals, on = ['WTeamID', 'Season'])
 
     #do the same thing as above but for the losing team
-    rstFn.rename(columns = {'WTeamID': 'LTeamID'}, inplace = True)
-    outDF = pd.merge(outDF, rstFn, on = ['LTeamID', 'Season'])
-
-    colNames = list(outDF.columns)
-
-    for i in range(colInd, len(colNames)):
-        colNames[i] = re.sub(r'^', 'L', colNames[i])
-
-    outDF.columns = colNames
+    LTotals = regSeasTotals.rename(columns = dict([('TeamID', 'LTeamID')] + [(x, 'L' + x) for x in statCols]))
+    outDF = pd.merge(outDF, LTotals, on = ['LTeamID', 'Season'])
 
     #this part adds the number of tournament game appearances for the winner's and loser's conferences (proxy for strength of schedule)
-    outDF['LConfAppearances'] = pd.Series(data = np.zeros(outDF.shape[0])) #new columns to hold appearances
-    outDF['WConfAppearances'] = pd.Series(data = np.zeros(outDF.shape[0]))
-
-    LConfAppearances = outDF['LConfAbbrev'].value_counts() #get the totals for each conference for winners and losers
-    WConfAppearances = outDF['WConfAbbrev'].value_counts()
-
-    for i in LConfAppearances.index: #this loop combines the winner and loser appearances into one list with all the conferences
-        if i in WConfAppearances.index:
-            LConfAppearances[i] = LConfAppearances[i] + WConfAppearances[i]
-
-    totalConfAppearances = LConfAppearances #rename for clarity
-
-    for i in outDF.index: #loop over the DF and add the appropriate apppearances value based on the winner's and loser's conf appearances
-        outDF.loc[i, 'LConfAppearances'] = totalConfAppearances[outDF.loc[i, 'LConfAbbrev']]
-        outDF.loc[i, 'WConfAppearances'] = totalConfAppearances[outDF.loc[i, 'WConfAbbrev']]
+    totalConfAppearances = outDF['LConfAbbrev'].value_counts().add(outDF['WConfAbbrev'].value_counts(), fill_value = 0) #winner and loser appearances for each conference combined
+    outDF['LConfAppearances'] = outDF['LConfAbbrev'].map(totalConfAppearances).astype(np.float64)
+    outDF['WConfAppearances'] = outDF['WConfAbbrev'].map(totalConfAppearances).astype(np.float64)
     
     return outDF
 
@@ -206,74 +476,488 @@ def addConferences(regSeasStatsDF, conferences):
     outDF = pd.merge(regSeasStatsDF, conferences, on = ['TeamID', 'Season'])
     return outDF
 
+#the difference features of the logistic regression DF: name -> stat that is taken as self minus opp
+logRegDifStats = [('SeedDif', 'NumSeed'), ('RecordDif', 'Record'), ('PtsPGDif', 'PtsPG'), ('FGPercDif', 'FGPerc'), ('FG3PercDif', 'FG3Perc'), ('FTPercDif', 'FTPerc'), ('TRDif', 'TR'),
+                  ('RebPGDif', 'RebPG'), ('AstPGDif', 'AstPG'), ('TOPGDif', 'TOPG'), ('StlPGDif', 'StlPG'), ('BlkPGDif', 'BlkPG'), ('PFPGDif', 'PFPG'), ('PtsDifDif', 'PtsDif'),
+                  ('PtsPGDifDif', 'PtsPGDif'), ('ATRDif', 'ATR'), ('TrueShtPercDif', 'TrueShtPerc'), ('ORPGDif', 'ORPG'), ('DRPGDif', 'DRPG'), ('FTAPGDif', 'FTAPG'),
+                  ('ConfAppDif', 'ConfAppearances'), ('DefMetricDif', 'DefMetric')]
+
 #function to make a DF that can be used to run logistic regression tests (primarily combines winner/loser stats into one "difference" stat)
-#input:
+#each game is seen from the point of view of a random one of its teams: the winner's games ('gameOutcome' 1) come first, then the loser's games ('gameOutcome' 0)
+#the W / L columns become self / opp columns by taking the rows of each game from one side or the other into one float block, and the difference columns are taken from that block in one step
+#inputs:
 #   detailedDF: final masterDetailed DF from running functions above
+#   rng: seed or numpy Generator used to pick the point of view of each game (default None uses the global numpy RNG)
 #output:
 #   outDF
-def createDetailedLogRegDF(detailedDF):
-    tempDF = detailedDF[:]
-    tempDF.reset_index(inplace = True)
-
-    tempDF.rename(columns = {'WLoc': 'wLoc'}, inplace = True) #change to lower case to avoid issues with regex later
-
-    tempDF['gameOutcome'] = pd.Series(data = np.random.randint(low = 0, high = 2, size = tempDF.shape[0])) #assign each game a random 0/1
-
-    loseDF = tempDF[tempDF['gameOutcome'] == 0] #games assigned a 0 will be designated as a "loser" game (from POV of losing team)
-    winDF = tempDF[tempDF['gameOutcome'] == 1] #games assigned a 1 from POV of winning team
-
-    loseColumns = list(loseDF.columns)
-    winColumns = list(winDF.columns)
-
-    #this loop replaces the "W" and "L" for team stats with "self" and "opp", depending on POV defined above
-    for i in range(len(loseColumns)):
-        loseColumns[i] = re.sub(r'^W', 'opp', loseColumns[i]) #for loser, opponent is the winning team
-        loseColumns[i] = re.sub(r'^L', 'self', loseColumns[i]) #self is losing team
-
-        winColumns[i] = re.sub(r'^L', 'opp', winColumns[i]) #vice versa
-        winColumns[i] = re.sub(r'^W', 'self', winColumns[i])
-
-    loseDF.columns = loseColumns
-    winDF.columns = winColumns
-
-    loseDF = loseDF[winColumns] #reorder the loseDF columns to match the winDF columns for concatenation
-
-    outDF = pd.concat((winDF, loseDF))
-
-    #everything below is taking differences of self minus opp to obtain a dif score (easier for variable selection)
-    outDF['SeedDif'] = outDF['selfNumSeed'] - outDF['oppNumSeed']
-    outDF['RecordDif'] = outDF['selfRecord'] - outDF['oppRecord']
-    outDF['PtsPGDif'] = outDF['selfPtsPG'] - outDF['oppPtsPG']
-    outDF['FGPercDif'] = outDF['selfFGPerc'] - outDF['oppFGPerc']
-    outDF['FG3PercDif'] = outDF['selfFG3Perc'] - outDF['oppFG3Perc']
-    outDF['FTPercDif'] = outDF['selfFTPerc'] - outDF['oppFTPerc']
-    outDF['TRDif'] = outDF['selfTR'] - outDF['oppTR']
-    outDF['RebPGDif'] = outDF['selfRebPG'] - outDF['oppRebPG']
-    outDF['AstPGDif'] = outDF['selfAstPG'] - outDF['oppAstPG']
-    outDF['TOPGDif'] = outDF['selfTOPG'] - outDF['oppTOPG']
-    outDF['StlPGDif'] = outDF['selfStlPG'] - outDF['oppStlPG']
-    outDF['BlkPGDif'] = outDF['selfBlkPG'] - outDF['oppBlkPG']
-    outDF['PFPGDif'] = outDF['selfPFPG'] - outDF['oppPFPG']
-    outDF['PtsDifDif'] = outDF['selfPtsDif'] - outDF['oppPtsDif']
-    outDF['PtsPGDifDif'] = outDF['selfPtsPGDif'] - outDF['oppPtsPGDif']
-    outDF['ATRDif'] = outDF['selfATR'] - outDF['oppATR']
-    outDF['TrueShtPercDif'] = outDF['selfTrueShtPerc'] - outDF['oppTrueShtPerc']
-    outDF['ORPGDif'] = outDF['selfORPG'] - outDF['oppORPG']
-    outDF['DRPGDif'] = outDF['selfDRPG'] - outDF['oppDRPG']
-    outDF['FTAPGDif'] = outDF['selfFTAPG'] - outDF['oppFTAPG']
-    outDF['ConfAppDif'] = outDF['selfConfAppearances'] - outDF['oppConfAppearances']
-    outDF['DefMetricDif'] = outDF['selfDefMetric'] - outDF['oppDefMetric']
+def createDetailedLogRegDF(detailedDF, rng = None):
+    nGames = detailedDF.shape[0]
+    if rng is None:
+        gameOutcome = np.random.randint(low = 0, high = 2, size = nGames) #assign each game a random 0/1
+    else:
+        gameOutcome = makeRNG(rng).integers(low = 0, high = 2, size = nGames).astype(np.int64)
+
+    winRows = np.flatnonzero(gameOutcome == 1) #games seen from the winning team
+    loseRows = np.flatnonzero(gameOutcome == 0) #games seen from the losing team
+    rowOrder = np.concatenate((winRows, loseRows))
+    outIndex = pd.Index(rowOrder)
+
+    #output name of every column: W / L team columns become self / opp, the home / away column (WLoc) is not a team stat and the old index is kept as a column
+    dtypes = detailedDF.dtypes.to_dict()
+    outColumns = []
+    pairedColumns = {} #output name -> (column read for the winner's games, column read for the loser's games)
+    for x in detailedDF.columns:
+        if x == 'WLoc':
+            outColumns.append('wLoc')
+        elif x[0] == 'W':
+            outColumns.append('self' + x[1:])
+            pairedColumns['self' + x[1:]] = (x, 'L' + x[1:])
+        elif x[0] == 'L':
+            outColumns.append('opp' + x[1:])
+            pairedColumns['opp' + x[1:]] = (x, 'W' + x[1:])
+        else:
+            outColumns.append(x)
+
+    #float pairs (nearly all of the stats) go into one block, kept as one row per column (pandas' own layout): the winner's games take their values from one side and the loser's games from the other
+    blockColumns = [x for x in pairedColumns if dtypes[pairedColumns[x][0]] == np.float64 and dtypes[pairedColumns[x][1]] == np.float64]
+    blockPos = {x: i for i, x in enumerate(blockColumns)}
+    block = np.empty((len(blockColumns) + len(logRegDifStats), nGames))
+    nWin = winRows.shape[0]
+    for i, x in enumerate(blockColumns):
+        np.take(detailedDF[pairedColumns[x][0]].to_numpy(), winRows, out = block[i, :nWin])
+        np.take(detailedDF[pairedColumns[x][1]].to_numpy(), loseRows, out = block[i, nWin:])
+
+    #every difference column at once, as self minus opp over the whole block
+    selfRows = [blockPos['self' + x[1]] for x in logRegDifStats]
+    oppRows = [blockPos['opp' + x[1]] for x in logRegDifStats]
+    np.subtract(block[selfRows], block[oppRows], out = block[len(blockColumns):])
+
+    outDF = pd.DataFrame(block.T, index = outIndex, columns = blockColumns + [x[0] for x in logRegDifStats])
+
+    #slot the remaining columns in at their places
+    otherColumns = dict(zip(outColumns, detailedDF.columns))
+    for i, name in enumerate(['index'] + outColumns + ['gameOutcome']):
+        if name in blockColumns:
+            continue
+        if name == 'index': #the old index is kept as a column
+            values = detailedDF.index.to_numpy()[rowOrder]
+        elif name == 'gameOutcome':
+            values = gameOutcome[rowOrder]
+        elif name in pairedColumns: #other pairs keep pandas' rules for combining their types (e.g. categorical and object team ids)
+            values = pd.concat((detailedDF[pairedColumns[name][0]].iloc[winRows], detailedDF[pairedColumns[name][1]].iloc[loseRows])).set_axis(outIndex)
+        else: #columns about the game itself
+            values = detailedDF[otherColumns[name]].iloc[rowOrder].set_axis(outIndex)
+        outDF.insert(i, name, values)
+
     return outDF
 
+gameColumns = ['TeamID', 'Score'] #W / L columns of a master DF that belong to the game rather than the team's season (the score would give away the result)
+
+#function that collapses a master DF (one row per tournament game, stats for both teams) into one row per team per season
+#the losing team columns are read before the winning team columns, so each team's stats come from its first game as a loser if it has one, otherwise its first win
+#input:
+#   masterDF: masterCompact / masterDetailed from running functions above (or any subset of their rows)
+#output:
+#   featureDF: a data frame with Season, TeamID and every numeric stat that appears for both the winner and the loser in masterDF (e.g. NumSeed, Record, PtsPG),
+#              other than the ones describing the tournament game itself (see gameColumns)
+def createTeamFeatureDF(masterDF):
+    stats = [x[1:] for x in masterDF.columns if x[0] == 'W' and x[1:] not in gameColumns and ('L' + x[1:]) in masterDF.columns and pd.api.types.is_numeric_dtype(masterDF[x])]
+
+    #stack the loser view of every game on top of the winner view
+    seasons = masterDF['Season'].to_numpy(dtype = np.int64)
+    stackedSeasons = np.concatenate((seasons, seasons))
+    stackedTeams = np.concatenate((np.asarray(masterDF['LTeamID'], dtype = np.int64), np.asarray(masterDF['WTeamID'], dtype = np.int64)))
+    stackedValues = np.concatenate((masterDF[['L' + x for x in stats]].to_numpy(dtype = float), masterDF[['W' + x for x in stats]].to_numpy(dtype = float)))
+
+    firstRow = ~pd.MultiIndex.from_arrays([stackedSeasons, stackedTeams]).duplicated() #keep the first row found for each (season, team)
+
+    featureDF = pd.DataFrame(data = stackedValues[firstRow], columns = stats)
+    featureDF.insert(0, 'Season', stackedSeasons[firstRow])
+    featureDF.insert(1, 'TeamID', stackedTeams[firstRow])
+
+    return featureDF
+
+
+#### derived data cache ####
+
+cacheVersion = 3 #part of every cache key; bump it when a function that builds a cached table changes its output
+
+fileHashes = {} #memo of content hashes by (path, size, modification time), so each input file is only read once per process
+
+#function that returns a hash of the contents of a file
+#input:
+#   path: path of the file
+#output:
+#   the hex sha256 digest of the file
+def fileHash(path):
+    stat = os.stat(path)
+    memoKey = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if memoKey not in fileHashes:
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                h.update(block)
+        fileHashes[memoKey] = h.hexdigest()
+    return fileHashes[memoKey]
+
+#class that stores derived data frames on disk, keyed by a hash of the files they were built from and the parameters used, so an entry is rebuilt as soon as its inputs change
+#entries are parquet files when pyarrow is installed (which allows loading only some of the columns) and pickles otherwise
+#attributes:
+#   cacheDir: folder holding the entries (None turns the cache off, and every table is built when asked for)
+#   fileFormat: 'parquet' or 'pickle'
+class derivedCache:
+    def __init__(self, cacheDir, fileFormat = None):
+        self.cacheDir = cacheDir
+        if fileFormat is None:
+            fileFormat = 'pickle' if pyarrow is None else 'parquet'
+        if fileFormat == 'parquet' and pyarrow is None:
+            raise ImportError('parquet cache files need pyarrow')
+        self.fileFormat = fileFormat
+
+    #function that creates the key of an entry
+    #inputs:
+    #   name: name of the table
+    #   inputFiles: list of the paths of the files the table is built from
+    #   params: anything else the table depends on (must have a stable repr)
+    def key(self, name, inputFiles, params = ()):
+        h = hashlib.sha256(repr((name, cacheVersion, params)).encode())
+        for x in inputFiles:
+            h.update(fileHash(x).encode())
+        return name + '_' + h.hexdigest()[:16]
+
+    def path(self, key):
+        return os.path.join(self.cacheDir, key + ('.parquet' if self.fileFormat == 'parquet' else '.pkl'))
+
+    #function that loads an entry
+    #inputs:
+    #   key: key of the entry
+    #   columns: list of columns to load (default None loads all of them)
+    #output:
+    #   the data frame, or None if there is no such entry
+    def load(self, key, columns = None):
+        path = self.path(key)
+        if not os.path.exists(path):
+            return None
+
+        if self.fileFormat == 'pickle':
+            df = pd.read_pickle(path)
+            return df if columns is None else df[columns]
+
+        table = pyarrow.parquet.read_table(path, columns = columns, use_pandas_metadata = True)
+        df = table.to_pandas()
+        dtypes = pickle.loads(table.schema.metadata[b'dtypes'])
+        changed = {x: dtypes[x] for x in df.columns if df[x].dtype != dtypes[x]} #parquet does not keep object / categorical columns of ints as they were
+        if len(changed) > 0:
+            df = df.astype(changed)
+        return df
+
+    #function that saves an entry (written to a temporary file first, so other processes never read a partial entry)
+    def save(self, key, df):
+        os.makedirs(self.cacheDir, exist_ok = True)
+        path = self.path(key)
+        tempPath = path + '.' + str(os.getpid()) + '.tmp'
+
+        if self.fileFormat == 'pickle':
+            df.to_pickle(tempPath)
+        else:
+            table = pyarrow.Table.from_pandas(df)
+            metadata = dict(table.schema.metadata)
+            metadata[b'dtypes'] = pickle.dumps(df.dtypes.to_dict()) #the exact dtypes to restore on load
+            pyarrow.parquet.write_table(table.replace_schema_metadata(metadata), tempPath)
+
+        os.replace(tempPath, path)
+
+    #function that returns a table from the cache, building and saving it first if there is no entry for the current inputs
+    #inputs:
+    #   name: name of the table
+    #   build: function with no arguments that builds the table
+    #   inputFiles: list of the paths of the files the table is built from
+    #   params: anything else the table depends on (default ())
+    #   columns: list of columns to return (default None returns all of them)
+    #output:
+    #   df: the table
+    def get(self, name, build, inputFiles, params = (), columns = None):
+        if self.cacheDir is None:
+            df = build()
+            return df if columns is None else df[columns]
+
+        key = self.key(name, inputFiles, params)
+        df = self.load(key, columns)
+        if df is None:
+            df = build()
+            self.save(key, df)
+            if columns is not None:
+                df = df[columns]
+        return df
+
+
+#### compact team stats store ####
+
+#function that picks a compact dtype for each column of a season-team stats DF: int16 for Season and TeamID and float32 for every stat
+#(counting stats included, which float32 holds exactly, so the stats of a row sit side by side in one type and can be read as a 2-D block, see statsArrayValues)
+#non numeric columns (e.g. ConfAbbrev) are left out
+#input:
+#   statsDF: a DF with one row per team per season (e.g. regSeasDetailedTotals or the output of createTeamFeatureDF)
+#output:
+#   a numpy structured dtype with one field per kept column, Season and TeamID first
+def compactStatsDtype(statsDF):
+    fields = [(x, np.int16) for x in ['Season', 'TeamID'] if x in statsDF.columns]
+    for x in statsDF.columns:
+        if x not in ['Season', 'TeamID'] and pd.api.types.is_numeric_dtype(statsDF[x]):
+            fields.append((x, np.float32))
+    return np.dtype(fields)
+
+#function that saves a season-team stats DF as a structured array file that can be memory mapped (see loadStatsArray)
+#inputs:
+#   statsDF: a DF with one row per team per season
+#   path: the .npy file to write (written to a temporary file first, so other processes never read a partial file)
+def saveStatsArray(statsDF, path):
+    dtype = compactStatsDtype(statsDF)
+    statsArray = np.empty(statsDF.shape[0], dtype = dtype)
+    for x in dtype.names:
+        values = np.asarray(statsDF[x], dtype = np.float64)
+        statsArray[x] = values
+        if (dtype[x].kind == 'i' or x in columnsDetailed) and not np.array_equal(statsArray[x], values): #make sure no whole number was changed on the way
+            raise ValueError('column ' + x + ' does not fit in ' + str(dtype[x]))
+
+    tempPath = path + '.' + str(os.getpid()) + '.tmp.npy'
+    np.save(tempPath, statsArray)
+    os.replace(tempPath, path)
+
+#function that opens a file written by saveStatsArray
+#inputs:
+#   path: the .npy file
+#   mmapMode: numpy memory map mode (default 'r' maps the file read-only, so every process that opens it shares the same pages; None reads it into memory)
+#output:
+#   the structured array (each column, e.g. statsArray['PtsPG'], is a view that copies nothing)
+def loadStatsArray(path, mmapMode = 'r'):
+    return np.load(path, mmap_mode = mmapMode)
+
+#function that turns a structured stats array back into a data frame (keeping the compact dtypes)
+#inputs:
+#   statsArray: array from loadStatsArray
+#   columns: list of columns to include (default None includes all of them)
+def statsArrayToDF(statsArray, columns = None):
+    if columns is None:
+        columns = list(statsArray.dtype.names)
+    return pd.DataFrame({x: statsArray[x] for x in columns})
+
+#function that returns the stats of a structured stats array as a 2-D float32 block, as a view of the array (of the memory map itself for a mapped file) that copies nothing
+#input:
+#   statsArray: array from loadStatsArray
+#output:
+#   [columns, values]: the stat names and the 2-D array with one row per team per season and one column per stat
+def statsArrayValues(statsArray):
+    columns = [x for x in statsArray.dtype.names if x not in ['Season', 'TeamID']]
+    return [columns, recfunctions.structured_to_unstructured(statsArray[columns])]
+
 
 #### data imports ####
 
-#### data from provided csv's as data frames ####
-seeds = pd.read_csv(os.path.join(sys.path[0], '../Data/2020DataFiles/2020DataFiles/2020-Mens-Data/MDataFiles_Stage1/MNCAATourneySeeds.csv'))
-tourneyCompactResults = pd.read_csv(os.path.join(sys.path[0], '../Data/2020DataFiles/2020DataFiles/2020-Mens-Data/MDataFiles_Stage1/MNCAATourneyCompactResults.csv'))
-regSeasCompactResults = pd.read_csv(os.path.join(sys.path[0], '../Data/2020DataFiles/2020DataFiles/2020-Mens-Data/MDataFiles_Stage1/MRegularSeasonCompactResults.csv'))
-regSeasDetailedResults = pd.read_csv(os.path.join(sys.path[0], '../Data/2020DataFiles/2020DataFiles/2020-Mens-Data/MDataFiles_Stage1/MRegularSeasonDetailedResults.csv'))
-conferences = pd.read_csv(os.path.join(sys.path[0], '../Data/2020DataFiles/2020DataFiles/2020-Mens-Data/MDataFiles_Stage1/MTeamConferences.csv'))
+#### locations of the provided csv's and previously generated data (relative to the folder of the running script / notebook) ####
+#the KAGGLE_DATA_DIR / KAGGLE_GENERATED_DIR environment variables point the default data set somewhere else (e.g. at a synthetic data set, see synthetic.py)
+dataDir = os.environ.get('KAGGLE_DATA_DIR', os.path.join(sys.path[0], '../Data/2020DataFiles/2020DataFiles/2020-Mens-Data/MDataFiles_Stage1'))
+generatedDir = os.environ.get('KAGGLE_GENERATED_DIR', os.path.join(sys.path[0], '../GeneratedData'))
+
+#class that holds all of the project data frames; nothing is read or built until a data frame is first used, after which it is kept for later use
+#this keeps importing data.py free of file I/O, so pulling in a single helper function (e.g. from models.py) is cheap
+#the season totals and master frames are kept in a derived data cache (see derivedCache) so they are only built again when the csv's change, and when games are
+#appended to a regular season results csv only the new rows are read and folded into the stored totals (see seasonTotalsStore)
+#each csv read, table load and table build is timed as a stage when instrumentation is on (see instrument.py)
+#attributes (each loaded / built on first access):
+#   seeds, tourneyCompactResults, regSeasCompactResults, regSeasDetailedResults, conferences: data frames from the provided csv's
+#   regSeasCompactStats, regSeasDetailedStats: season totals built from the regular season results
+#   regSeasCompactTotals, regSeasDetailedTotals: season totals augmented and with conferences added
+#   teamFeaturesCompact, teamFeaturesDetailed: one row of tournament team stats per team per season from the master frames (see createTeamFeatureDF)
+#   seedResults, masterCompact, masterDetailed, logRegDF: the created data frames
+#   cache: the derivedCache used for the cached tables (kept in generatedDir/cache unless cacheDir is given; useCache = False turns it off)
+#   statsArrays: the memory mapped stats arrays opened by statsArray, by file path
+#   seed: seed for the random points of view in logRegDF (default None uses numpy's global RNG; with an int seed logRegDF is cached like the other tables)
+class kaggleData:
+    def __init__(self, dataDir = dataDir, generatedDir = generatedDir, cacheDir = None, useCache = True, seed = None):
+        self.dataDir = dataDir
+        self.generatedDir = generatedDir
+        self.seed = seed
+        if cacheDir is None:
+            cacheDir = os.path.join(generatedDir, 'cache')
+        self.cache = derivedCache(cacheDir if useCache else None)
+        self.statsArrays = {} #path -> memory mapped stats array opened by statsArray
+
+    #### data from provided csv's as data frames ####
+    def readCSV(self, fileName):
+        with instrument.stage('read ' + fileName):
+            return pd.read_csv(os.path.join(self.dataDir, fileName))
+
+    @functools.cached_property
+    def seeds(self):
+        return self.readCSV('MNCAATourneySeeds.csv')
+
+    @functools.cached_property
+    def tourneyCompactResults(self):
+        return self.readCSV('MNCAATourneyCompactResults.csv')
+
+    @functools.cached_property
+    def regSeasCompactResults(self):
+        return self.readCSV('MRegularSeasonCompactResults.csv')
+
+    @functools.cached_property
+    def regSeasDetailedResults(self):
+        return self.readCSV('MRegularSeasonDetailedResults.csv')
+
+    @functools.cached_property
+    def conferences(self):
+        return self.readCSV('MTeamConferences.csv')
+
+    #### functions that build the cached tables ####
+    #the season totals are kept in a seasonTotalsStore in the cache folder, so when games are appended to a results csv only the new rows are read and folded in;
+    #without a cache folder they are streamed from the csv's in chunks rather than built from the full results tables
+    def buildRegSeasonStats(self, fileName, columns):
+        csvPath = os.path.join(self.dataDir, fileName)
+        if self.cache.cacheDir is None:
+            return addPerGameStats(streamRegSeasonTotals(csvPath, columns), columns)
+
+        os.makedirs(self.cache.cacheDir, exist_ok = True)
+        storeName = os.path.splitext(fileName)[0] + '_' + hashlib.sha256(os.path.abspath(csvPath).encode()).hexdigest()[:16] + '.store.pkl' #one store per csv
+        store = seasonTotalsStore(os.path.join(self.cache.cacheDir, storeName), columns)
+        if store.updateFromCSV(csvPath) > 0:
+            store.save()
+        return store.totals.copy()
+
+    def buildRegSeasCompactStats(self):
+        return self.buildRegSeasonStats('MRegularSeasonCompactResults.csv', columnsCompact)
+
+    def buildRegSeasDetailedStats(self):
+        return self.buildRegSeasonStats('MRegularSeasonDetailedResults.csv', columnsDetailed)
+
+    def buildRegSeasCompactTotals(self):
+        return addConferences(dataAugment(self.regSeasCompactStats, detailed = False), self.conferences)
+
+    def buildRegSeasDetailedTotals(self):
+        return addConferences(dataAugment(self.regSeasDetailedStats), self.conferences)
+
+    def buildMasterCompact(self):
+        return createMasterDF(self.seedResults, self.regSeasCompactTotals)
+
+    def buildMasterDetailed(self):
+        return createMasterDF(self.seedResults, self.regSeasDetailedTotals)
+
+    def buildTeamFeaturesCompact(self):
+        return createTeamFeatureDF(self.masterCompact)
+
+    def buildTeamFeaturesDetailed(self):
+        return createTeamFeatureDF(self.masterDetailed)
+
+    #name of each cached table -> (function that builds it, csv's it is built from)
+    cachedTables = {'regSeasCompactStats': (buildRegSeasCompactStats, ['MRegularSeasonCompactResults.csv']),
+                    'regSeasDetailedStats': (buildRegSeasDetailedStats, ['MRegularSeasonDetailedResults.csv']),
+                    'regSeasCompactTotals': (buildRegSeasCompactTotals, ['MRegularSeasonCompactResults.csv', 'MTeamConferences.csv']),
+                    'regSeasDetailedTotals': (buildRegSeasDetailedTotals, ['MRegularSeasonDetailedResults.csv', 'MTeamConferences.csv']),
+                    'masterCompact': (buildMasterCompact, ['MNCAATourneySeeds.csv', 'MNCAATourneyCompactResults.csv', 'MRegularSeasonCompactResults.csv', 'MTeamConferences.csv']),
+                    'masterDetailed': (buildMasterDetailed, ['MNCAATourneySeeds.csv', 'MNCAATourneyCompactResults.csv', 'MRegularSeasonDetailedResults.csv', 'MTeamConferences.csv']),
+                    'teamFeaturesCompact': (buildTeamFeaturesCompact, ['MNCAATourneySeeds.csv', 'MNCAATourneyCompactResults.csv', 'MRegularSeasonCompactResults.csv', 'MTeamConferences.csv']),
+                    'teamFeaturesDetailed': (buildTeamFeaturesDetailed, ['MNCAATourneySeeds.csv', 'MNCAATourneyCompactResults.csv', 'MRegularSeasonDetailedResults.csv', 'MTeamConferences.csv'])}
+
+    #function that returns one of the cached tables, optionally only some of its columns (which, with a parquet cache, are the only ones read from disk)
+    #inputs:
+    #   name: name of the table (one of cachedTables)
+    #   columns: list of columns to return (default None returns all of them)
+    #output:
+    #   the table
+    def table(self, name, columns = None):
+        if name in self.__dict__: #already loaded in full
+            df = self.__dict__[name]
+            return df if columns is None else df[columns]
+
+        inputFiles = self.cachedTables[name][1]
+        with instrument.stage('load ' + name): #includes building the table when it is not in the cache
+            return self.cache.get(name, lambda: self.buildTable(name), [os.path.join(self.dataDir, x) for x in inputFiles], columns = columns)
+
+    #function that builds one of the cached tables
+    def buildTable(self, name):
+        with instrument.stage('build ' + name):
+            return self.cachedTables[name][0](self)
+
+    #function that returns one of the cached season-team tables as a memory mapped compact stats array (see saveStatsArray), writing the array file into the cache folder if needed
+    #worker processes that open the same file share its memory instead of each holding their own copy of the table, and the evaluation functions in models.py
+    #read the stats straight from it (e.g. models.winProbMatrix(models.logRegPredictFull, season, teams, ds.statsArray('teamFeaturesDetailed')))
+    #input:
+    #   name: name of the table (regSeasCompactStats, regSeasDetailedStats, regSeasCompactTotals, regSeasDetailedTotals, teamFeaturesCompact or teamFeaturesDetailed)
+    #output:
+    #   the read-only memory mapped structured array (the same one on every call while the input files are unchanged, so the team features built from it are reused)
+    def statsArray(self, name):
+        if self.cache.cacheDir is None:
+            raise ValueError('stats arrays are kept in the cache folder, which is turned off')
+
+        inputFiles = [os.path.join(self.dataDir, x) for x in self.cachedTables[name][1]]
+        path = os.path.join(self.cache.cacheDir, self.cache.key(name + 'Array', inputFiles) + '.npy')
+        if path not in self.statsArrays:
+            if not os.path.exists(path):
+                os.makedirs(self.cache.cacheDir, exist_ok = True)
+                saveStatsArray(self.table(name), path)
+            self.statsArrays[path] = loadStatsArray(path)
+        return self.statsArrays[path]
+
+    #### cached data ####
+    @functools.cached_property
+    def regSeasCompactStats(self):
+        return self.table('regSeasCompactStats')
+
+    @functools.cached_property
+    def regSeasDetailedStats(self):
+        return self.table('regSeasDetailedStats')
+
+    @functools.cached_property
+    def regSeasCompactTotals(self):
+        return self.table('regSeasCompactTotals')
+
+    @functools.cached_property
+    def regSeasDetailedTotals(self):
+        return self.table('regSeasDetailedTotals')
+
+    @functools.cached_property
+    def masterCompact(self):
+        return self.table('masterCompact')
+
+    @functools.cached_property
+    def masterDetailed(self):
+        return self.table('masterDetailed')
+
+    @functools.cached_property
+    def teamFeaturesCompact(self):
+        return self.table('teamFeaturesCompact')
+
+    @functools.cached_property
+    def teamFeaturesDetailed(self):
+        return self.table('teamFeaturesDetailed')
+
+    #### created data ####
+    @functools.cached_property
+    def seedResults(self):
+        seeds, tourneyCompactResults = self.seeds, self.tourneyCompactResults
+        with instrument.stage('build seedResults'):
+            return createSeedResultsDF(seeds, tourneyCompactResults)
+
+    @functools.cached_property
+    def logRegDF(self):
+        if isinstance(self.seed, int): #the same seed always gives the same DF, so it can be cached
+            with instrument.stage('load logRegDF'):
+                return self.cache.get('logRegDF', self.buildLogRegDF, [os.path.join(self.dataDir, x) for x in self.cachedTables['masterDetailed'][1]], params = (self.seed,))
+        return self.buildLogRegDF() #otherwise every build draws new points of view
+
+    def buildLogRegDF(self):
+        masterDetailed = self.masterDetailed
+        with instrument.stage('build logRegDF'):
+            return createDetailedLogRegDF(masterDetailed, rng = self.seed)
+
+#the data set used by the rest of the project; its data frames can also be reached as module attributes (e.g. data.masterCompact), which loads them on first use
+dataset = kaggleData()
+datasetNames = ['seeds', 'tourneyCompactResults', 'regSeasCompactResults', 'regSeasDetailedResults', 'conferences', 'regSeasCompactStats', 'regSeasDetailedStats',
+                'regSeasCompactTotals', 'regSeasDetailedTotals', 'seedResults', 'masterCompact', 'masterDetailed', 'teamFeaturesCompact', 'teamFeaturesDetailed', 'logRegDF']
+
+def __getattr__(name):
+    if name in datasetNames:
+        return getattr(dataset, name)
+    raise AttributeError("module 'data' has no attribute '" + name + "'")
 
 #### other variables that will be needed ####
 columnsCompact = ['Season', 'TeamID', 'G', 'Wins', 'Losses', 'Pts', 'PA']
@@ -287,15 +971,5 @@ xVariablesDesc = ['Difference in seeds', 'Difference in record', 'Difference in
                   'Difference in free throw attempts per game', 'Difference in defensive metric (combination of blk, stl, DR, and PF) per game', 'Difference in conference appearances']
 chosenFeatures = ['NumSeedDif', 'RecordDif', 'PtsPGDif', 'PtsPGDifDif', 'TrueShtPercDif', 'ORPGDif', 'DRPGDif', 'AstPGDif', 'StlPGDif', 'BlkPGDif', 'TOPGDif', 'ATRDif']
 
-#### previously generated data ####
-regSeasCompactTotals = pd.read_pickle(os.path.join(sys.path[0], '../GeneratedData/regSeasCompactTotals.pkl'))
-regSeasDetailedTotals = pd.read_pickle(os.path.join(sys.path[0], '../GeneratedData/regSeasDetailedTotals.pkl'))
-
-#### created data ####
-seedResults = createSeedResultsDF(seeds, tourneyCompactResults)
-regSeasDetailedTotals = dataAugment(regSeasDetailedTotals)
-regSeasCompactTotals = addConferences(regSeasCompactTotals, conferences)
-regSeasDetailedTotals = addConferences(regSeasDetailedTotals, conferences)
-masterCompact = createMasterDF(seedResults, regSeasCompactTotals)
-masterDetailed = createMasterDF(seedResults, regSeasDetailedTotals)
-logRegDF = createDetailedLogRegDF(masterDetailed)
\ No newline at end of file
+#names exported by 'from data import *' (includes the data set names, which loads them at that point as the notebook uses them)
+__all__ = [x for x in list(globals()) if not x.startswith('_')] + datasetNames
@@ -0,0 +1,182 @@
+#### initialize libraries ####
+import bisect
+import contextlib
+import json
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+#### instrumentation ####
+
+#opt-in timers and counters for finding where the time goes in a run: stage timers around the data build steps and the backtest loops,
+#and call counts and latency histograms for every evalFn call the simulator makes
+#everything is off until enable() is called; while off, stage() hands back a shared do-nothing context manager and evalFns are not wrapped,
+#so the only cost left in the hot paths is checking the enabled flag
+#   instrument.enable()
+#   simulation.tourneySimVsActual(years, evalFn, compactDF, refDF)
+#   print(instrument.summaryTables()[1])
+#or let a run turn it on for itself and report at the end: tourneySimVsActual(..., report = True) / logisticSelectMulti(..., report = 'selectRun.json')
+
+enabled = False
+latencyEdges = (10 ** np.arange(-7, 1.01, 0.25)).tolist() #upper edges of the latency histogram buckets in seconds (100 ns to 10 s, four per decade; slower calls go in a last bucket)
+stageStats = {} #stage name -> [calls, total seconds, max seconds]
+evalStats = {} #evalFn name -> [calls, total seconds, histogram counts]
+nullStage = contextlib.nullcontext() #what stage() returns while instrumentation is off
+
+#function that turns instrumentation on
+def enable():
+    global enabled
+    enabled = True
+
+#function that turns instrumentation off (what has been recorded is kept until reset())
+def disable():
+    global enabled
+    enabled = False
+
+#function that clears everything recorded so far
+def reset():
+    stageStats.clear()
+    evalStats.clear()
+
+#function that adds a timing to a stage
+#inputs:
+#   name: name of the stage
+#   seconds: time taken
+#   calls: number of calls the time covers (default 1)
+def addStage(name, seconds, calls = 1):
+    stats = stageStats.get(name)
+    if stats is None:
+        stats = stageStats[name] = [0, 0.0, 0.0]
+    stats[0] += calls
+    stats[1] += seconds
+    stats[2] = max(stats[2], seconds / calls)
+
+#context manager that times the code inside it as one call of a stage
+@contextlib.contextmanager
+def stageTimer(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        addStage(name, time.perf_counter() - start)
+
+#function that returns a context manager timing the code inside it as one call of a stage (stages can be nested; each time includes the stages inside it)
+#input:
+#   name: name of the stage
+#output:
+#   the context manager (one that does nothing while instrumentation is off)
+def stage(name):
+    if not enabled:
+        return nullStage
+    return stageTimer(name)
+
+#function that gives the name an evalFn is recorded under: its function name, or its class name and id for objects such as logRegModel
+def evalFnName(evalFn):
+    name = getattr(evalFn, '__name__', None)
+    if name is None:
+        name = type(evalFn).__name__ + '@' + hex(id(evalFn))
+    return name
+
+#function that records one call of an evalFn
+#inputs:
+#   name: name the evalFn is recorded under
+#   seconds: time the call took
+def addEvalCall(name, seconds):
+    stats = evalStats.get(name)
+    if stats is None:
+        stats = evalStats[name] = [0, 0.0, [0] * (len(latencyEdges) + 1)]
+    stats[0] += 1
+    stats[1] += seconds
+    stats[2][bisect.bisect_left(latencyEdges, seconds)] += 1
+
+#class that wraps an evalFn so each call is counted and timed; it is called exactly like the evalFn it wraps
+#attributes:
+#   evalFn: the wrapped evalFn
+#   name: name the calls are recorded under
+class timedEvalFn:
+    def __init__(self, evalFn, name = None):
+        self.evalFn = evalFn
+        self.name = evalFnName(evalFn) if name is None else name
+
+    def __call__(self, *args, **kwargs):
+        start = time.perf_counter()
+        out = self.evalFn(*args, **kwargs)
+        addEvalCall(self.name, time.perf_counter() - start)
+        return out
+
+#function that returns an evalFn that records its calls while instrumentation is on (and the evalFn itself, at no cost, while it is off)
+def wrapEvalFn(evalFn):
+    if not enabled or isinstance(evalFn, timedEvalFn):
+        return evalFn
+    return timedEvalFn(evalFn)
+
+#function that estimates a percentile of an evalFn's call latency from its histogram (the upper edge of the bucket the percentile falls in)
+#inputs:
+#   counts: histogram counts
+#   q: the percentile (0 to 100)
+#output:
+#   the latency in seconds (inf if it falls in the last, open ended bucket)
+def histogramPercentile(counts, q):
+    target = q / 100 * sum(counts)
+    cumulative = np.cumsum(counts)
+    i = int(np.searchsorted(cumulative, target))
+    return latencyEdges[i] if i < len(latencyEdges) else float('inf')
+
+#function that summarizes everything recorded so far
+#output:
+#   summary: dictionary with a 'stages' entry (name -> calls, total, mean and max seconds) and an 'evalFns' entry
+#            (name -> calls, total and mean seconds, approximate 50th / 90th / 99th percentile latency, and the histogram as bucket upper edge -> count)
+def summary():
+    stages = {}
+    for name, (calls, total, maxTime) in stageStats.items():
+        stages[name] = {'calls': calls, 'total': total, 'mean': total / calls, 'max': maxTime}
+
+    evalFns = {}
+    for name, (calls, total, counts) in evalStats.items():
+        evalFns[name] = {'calls': calls, 'total': total, 'mean': total / calls, 'p50': histogramPercentile(counts, 50), 'p90': histogramPercentile(counts, 90),
+                         'p99': histogramPercentile(counts, 99), 'histogram': {('%.3g' % x if i < len(latencyEdges) else 'inf'): y for i, (x, y) in enumerate(zip(latencyEdges + [float('inf')], counts)) if y > 0}}
+
+    return {'stages': stages, 'evalFns': evalFns}
+
+#function that puts the summary in tables
+#output:
+#   [stageDF, evalFnDF]: data frames of the stage timings and the evalFn call statistics (see summary), slowest first
+def summaryTables():
+    out = summary()
+    stageDF = pd.DataFrame.from_dict(out['stages'], orient = 'index', columns = ['calls', 'total', 'mean', 'max'])
+    evalFnDF = pd.DataFrame.from_dict({x: {k: v for k, v in y.items() if k != 'histogram'} for x, y in out['evalFns'].items()}, orient = 'index', columns = ['calls', 'total', 'mean', 'p50', 'p90', 'p99'])
+    return [stageDF.sort_values('total', ascending = False), evalFnDF.sort_values('total', ascending = False)]
+
+#function that outputs the summary of a run
+#input:
+#   report: True prints the summary tables, a string writes the summary as json to that path
+def emit(report):
+    if isinstance(report, str):
+        with open(report, 'w') as f:
+            json.dump(summary(), f, indent = 2)
+    else:
+        stageDF, evalFnDF = summaryTables()
+        print(stageDF.to_string(), file = sys.stdout)
+        if evalFnDF.shape[0] > 0:
+            print(evalFnDF.to_string(), file = sys.stdout)
+
+#context manager for functions that can report on their own run: with a report, instrumentation is turned on and cleared for the code inside it,
+#the summary is emitted at the end, and instrumentation is then put back the way it was (the recorded numbers are kept for summary())
+#input:
+#   report: None / False for no report, otherwise see emit()
+@contextlib.contextmanager
+def recording(report):
+    if report is None or report is False:
+        yield
+        return
+
+    wasEnabled = enabled
+    enable()
+    reset()
+    try:
+        yield
+    finally:
+        if not wasEnabled:
+            disable()
+    emit(report)
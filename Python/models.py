@@ -3,7 +3,15 @@ import pandas as pd
 import sklearn.model_selection
 import sklearn.linear_model
 import sklearn.preprocessing
-from data import createDetailedLogRegDF
+import weakref
+import hashlib
+import collections
+import os
+import concurrent.futures
+import time
+import instrument
+from data import createTeamFeatureDF, statsArrayValues
+from seeding import makeRNG, spawnSeeds, coinFlip, acceptsRNG, seedGlobalRNG
 
 #### supporting functions ####
 
@@ -30,11 +38,15 @@ def AIC(y, ySigmoid, k):
 #   yTrain: y values to be used to train the model
 #   xTrain: x values to be used to train
 #   xTest: x values to be used for prediction
+#   warmStart: optional [coefficients, intercept] to start the solver from (e.g. a parent model's fit); default None starts from zero
 #outputs:
 #   sigVals: the sigmoided values of the predicted y's
 #   fitted model: the model as fitted on the provided data
-def generateSigVals(yTrain, xTrain, xTest):
-    model = sklearn.linear_model.LogisticRegression(max_iter = 500, solver = 'lbfgs')
+def generateSigVals(yTrain, xTrain, xTest, warmStart = None):
+    model = sklearn.linear_model.LogisticRegression(max_iter = 500, solver = 'lbfgs', warm_start = warmStart is not None)
+    if warmStart is not None:
+        model.coef_ = np.array(warmStart[0]).reshape(1, -1)
+        model.intercept_ = np.array(warmStart[1])
     fittedModel = model.fit(xTrain, yTrain)
 
     rawVals = np.matmul(xTest, fittedModel.coef_[0])
@@ -42,6 +54,99 @@ def generateSigVals(yTrain, xTrain, xTest):
 
     return [sigVals, fittedModel]
 
+#### team lookup ####
+
+#class that gives the evaluation functions direct access to each team's stats in a reference DF (instead of searching refDF on every game)
+#attributes:
+#   seasons: season of each row of values
+#   teamIDs: team id of each row of values
+#   values: 2-D float array with one row per team per season and one column per stat (see createTeamFeatureDF in data.py; for a compact stats array, a float32 view of it)
+#   columns: dictionary of stat name -> column of values
+#   rows: dictionary of (season, team id) -> row of values
+#   teamRows: dictionary of team id -> row of values (the team's first row, used when no season is given)
+#   matrices: cached column subsets of values, see matrix()
+#   rankArrays: cached team rankings of the statComparators used with these features, see statComparator.ranks()
+#   hashKey: fingerprint of the features, see fingerprint()
+#   teamBase, keyOrder, sortedKeys: sorted integer (season, team id) keys used by lookupRows()
+class teamFeatures:
+    def __init__(self, refDF):
+        if isinstance(refDF, np.ndarray): #a compact stats array (see saveStatsArray in data.py) already has one row per team per season, and its stats are used in place
+            self.seasons = refDF['Season']
+            self.teamIDs = refDF['TeamID']
+            columns, self.values = statsArrayValues(refDF)
+        else:
+            featureDF = createTeamFeatureDF(refDF)
+            self.seasons = featureDF['Season'].to_numpy()
+            self.teamIDs = featureDF['TeamID'].to_numpy()
+            self.values = featureDF.drop(columns = ['Season', 'TeamID']).to_numpy()
+            columns = featureDF.columns[2:]
+        self.columns = {x: i for i, x in enumerate(columns)}
+
+        self.rows = {(season, team): i for i, (season, team) in enumerate(zip(self.seasons.tolist(), self.teamIDs.tolist()))}
+        self.matrices = {}
+        self.rankArrays = {}
+        self.hashKey = None
+        self.teamRows = {}
+        for i, team in enumerate(self.teamIDs.tolist()):
+            self.teamRows.setdefault(team, i)
+
+        #sorted (season, team) keys for looking up many rows at once
+        self.teamBase = int(self.teamIDs.max()) + 1 if self.teamIDs.shape[0] > 0 else 1
+        keys = self.seasons.astype(np.int64) * self.teamBase + self.teamIDs.astype(np.int64)
+        self.keyOrder = np.argsort(keys)
+        self.sortedKeys = keys[self.keyOrder]
+
+    #function that returns a short hash of the stats held (features built from the same data give the same fingerprint, whichever DF they came from)
+    def fingerprint(self):
+        if self.hashKey is None:
+            digest = hashlib.blake2b(digest_size = 16)
+            digest.update(repr(list(self.columns)).encode())
+            for x in [self.seasons.astype(np.int64), self.teamIDs.astype(np.int64), np.asarray(self.values, dtype = np.float64)]:
+                digest.update(np.ascontiguousarray(x).tobytes())
+            self.hashKey = digest.hexdigest()
+        return self.hashKey
+
+    #function that returns the value of one stat for one team
+    def stat(self, team, stat):
+        return self.values[self.teamRows[team], self.columns[stat]]
+
+    #function that returns the columns of values for a list of stats (kept so repeated calls with the same stats are free)
+    def matrix(self, stats):
+        key = tuple(stats)
+        if key not in self.matrices:
+            self.matrices[key] = np.asarray(self.values[:, [self.columns[x] for x in stats]], dtype = np.float64)
+        return self.matrices[key]
+
+    #function that returns the rows of values for arrays of seasons and team ids (seasons can also be a single season for all teams)
+    def lookupRows(self, seasons, teams):
+        teams = np.asarray(teams, dtype = np.int64)
+        seasons = np.broadcast_to(np.asarray(seasons, dtype = np.int64), teams.shape)
+        keys = seasons * self.teamBase + teams
+
+        pos = np.minimum(np.searchsorted(self.sortedKeys, keys), max(self.sortedKeys.shape[0] - 1, 0))
+        found = (teams < self.teamBase) & (self.sortedKeys[pos] == keys) if self.sortedKeys.shape[0] > 0 else np.zeros(teams.shape, dtype = bool)
+        if not found.all():
+            missing = list(zip(seasons[~found].tolist(), teams[~found].tolist()))
+            raise KeyError('no stats for (season, team): ' + str(missing[:5]))
+
+        return self.keyOrder[pos]
+
+teamFeaturesCache = {} #id of refDF -> teamFeatures built from it
+
+#function that returns the teamFeatures for a reference DF, building them the first time the DF is seen
+#reference DFs are treated as read-only; the cached entry is dropped when the DF itself is garbage collected
+def getTeamFeatures(refDF):
+    key = id(refDF)
+    features = teamFeaturesCache.get(key)
+    if features is None:
+        features = teamFeatures(refDF)
+        try:
+            weakref.finalize(refDF, teamFeaturesCache.pop, key, None)
+        except TypeError: #plain numpy arrays cannot be weakly referenced, so they are not cached (memory mapped arrays can be)
+            return features
+        teamFeaturesCache[key] = features
+    return features
+
 #### logistic models ####
 
 #function to select variables based on AIC value; starts with full model and drops values with worst AIC impact until improvement no longer certain
@@ -50,35 +155,55 @@ def generateSigVals(yTrain, xTrain, xTest):
 #   xVariables: the name of the x value columns
 #   logRegDF: DF output by createLogRegDF in data.py
 #   testCondition: AIC improvement threshold to stop searching (default 5)
+#   rng: seed or numpy Generator used for the train / test splits (default None uses numpy's global RNG)
 #output:
 #   bestModel: the optimal model as determined by AIC selection
-def logisticSelect(yVariable, xVariables, logRegDF, testCondition = 5):
-    logRegTemp = logRegDF[:]
+def logisticSelect(yVariable, xVariables, logRegDF, testCondition = 5, rng = None):
     xVariablesTemp = xVariables[:]
+    if rng is not None:
+        rng = makeRNG(rng)
 
-    y = logRegTemp[yVariable].to_numpy()
+    y = logRegDF[yVariable].to_numpy()
+
+    #use normalized x values to aid regression; scaling works column by column, so every candidate column is standardized once up front
+    xAll = sklearn.preprocessing.StandardScaler().fit_transform(logRegDF[xVariables].to_numpy(dtype = float))
+    keptCols = list(range(len(xVariables))) #columns of xAll still in the model
 
     searching = True #stop flag for while loop
 
     while searching:
-        fullDF = logRegTemp[xVariablesTemp] #full DF for this iteration
-        x = fullDF.to_numpy()
-        #use normalized x values to aid regression
-        xTrain, xTest, yTrain, yTest = sklearn.model_selection.train_test_split(sklearn.preprocessing.StandardScaler().fit_transform(x), y, test_size = 0.2)
-        
+        #one train / test split per round, shared by the full model and every partial model
+        if rng is None:
+            trainInd, testInd = sklearn.model_selection.train_test_split(np.arange(y.shape[0]), test_size = 0.2)
+        else: #the same split train_test_split makes: the first 20% (rounded up) of a shuffle are the test rows
+            shuffled = rng.permutation(y.shape[0])
+            nTest = int(np.ceil(0.2 * y.shape[0]))
+            trainInd, testInd = shuffled[nTest:], shuffled[:nTest]
+        xTrain = xAll[np.ix_(trainInd, keptCols)]
+        xTest = xAll[np.ix_(testInd, keptCols)]
+        yTrain = y[trainInd]
+        yTest = y[testInd]
+
         output = (generateSigVals(yTrain, xTrain, xTest))
 
         fullModelAIC = AIC(yTest, output[0], xTest.shape[1]) #get AIC value for full model
 
         AICTestVals = [] #list to hold partial model AIC's
-        
-        for i in xVariablesTemp: #loop over remaining x variables
-            x = fullDF.drop(columns = i).to_numpy() #drop each in turn
-            xTrain, xTest, yTrain, yTest = sklearn.model_selection.train_test_split(sklearn.preprocessing.StandardScaler().fit_transform(x), y, test_size = 0.2)
-            
-            sigVals = (generateSigVals(yTrain, xTrain, xTest))[0] #run logistic regression leaving off ith column
 
-            AICTestVals.append(AIC(yTest, sigVals, x.shape[1])) #put AIC value for this particular regression in AICTestVals list
+        #partial models are filled into preallocated arrays and start from the full model's coefficients
+        nCols = len(keptCols)
+        xTrainPartial = np.empty((xTrain.shape[0], nCols - 1))
+        xTestPartial = np.empty((xTest.shape[0], nCols - 1))
+
+        for i in range(nCols): #loop over remaining x variables
+            partialCols = [j for j in range(nCols) if j != i] #drop each in turn
+            np.take(xTrain, partialCols, axis = 1, out = xTrainPartial)
+            np.take(xTest, partialCols, axis = 1, out = xTestPartial)
+
+            warmStart = [output[1].coef_[0][partialCols], output[1].intercept_]
+            sigVals = (generateSigVals(yTrain, xTrainPartial, xTestPartial, warmStart))[0] #run logistic regression leaving off ith column
+
+            AICTestVals.append(AIC(yTest, sigVals, nCols - 1)) #put AIC value for this particular regression in AICTestVals list
 
         bestTestAICInd = AICTestVals.index(min(AICTestVals)) #location of optimal (minimum) AIC value for partial models
         bestTestAIC = min(AICTestVals) #minimum AIC test value is the best partial-model value
@@ -86,6 +211,7 @@ def logisticSelect(yVariable, xVariables, logRegDF, testCondition = 5):
         #check to see whether improvement uncertain or number of variables too low to continue
         if fullModelAIC - bestTestAIC > testCondition and len(xVariablesTemp) > 2: 
             xVariablesTemp.pop(bestTestAICInd) #remove least important variable if not
+            keptCols.pop(bestTestAICInd)
         else:
             searching = False #otherwise stop the search
 
@@ -93,24 +219,79 @@ def logisticSelect(yVariable, xVariables, logRegDF, testCondition = 5):
         
     return bestModel
 
-#function to run the logisticSelect function defined above an arbitrary number of times
+#function that runs a batch of logisticSelect trials and counts how often each variable is kept; kept at module level so it can be sent to worker processes
+#input:
+#   task: a list holding yVariable, xVariables, logRegDF and the np.random.SeedSequence of every trial in the batch
+#output:
+#   xVariableCounts: array with the number of trials that kept the variable in each position of xVariables
+def logisticSelectTrials(task):
+    yVariable, xVariables, logRegDF, trialSeeds = task
+    xVariableCounts = np.zeros(len(xVariables))
+
+    for trialSeed in trialSeeds:
+        keptVariables = logisticSelect(yVariable, xVariables, logRegDF, rng = makeRNG(trialSeed))[1] #independent random stream for every trial; the variables kept by the optimal model
+        for i in keptVariables:
+            xVariableCounts[xVariables.index(i)] += 1 #add one to counts if variable was selected
+
+    return xVariableCounts
+
+#function to run the logisticSelect function defined above an arbitrary number of times, spread across worker processes
 #inputs:
 #   yVariable: the name of the y value column (to be passed on to select function)
 #   xVariables: the name of the x value columns (to be passed on to select function)
 #   logRegDF: DF output by createLogRegDF in data.py (to be passed on to select function)
 #   trials: number of times to run the selection
+#   processes: number of worker processes (default None uses every core; 1 runs everything in this process)
+#   seed: seed (or numpy Generator) the trials' random streams are spawned from; the same seed gives the same result for any number of processes (default None)
+#   progress: print the number of trials finished after each round (default False)
+#   tol: stop early once no frequency moves by more than tol from one round to the next (default None runs every trial)
+#   roundSize: number of trials run between progress / convergence checks (default 100)
+#   report: True prints a summary of where the time went (see instrument.py), a path writes it as json (default None)
 #output:
-#   xVariableFreq: the number of times the variable in each position of xVariables was selected / total number of trials (% / 100)
-def logisticSelectMulti(yVariable, xVariables, logRegDF, trials):
-    xVariableCounts = [0] * len(xVariables) #initialize counts to 0
-
-    #loop to run logisticSelect 'trials' times
-    for _ in range(trials):
-        keptVariables = logisticSelect(yVariable, xVariables, logRegDF)[1] #the variables kept by the optimal model
-        for i in keptVariables:
-            xVariableCounts[xVariables.index(i)] += 1 #add one to counts if variable was selected
-    
-    xVariableFreq = [x / trials for x in xVariableCounts] #divide counts by trials for ratio of times selected
+#   xVariableFreq: the number of times the variable in each position of xVariables was selected / total number of trials run (% / 100)
+def logisticSelectMulti(yVariable, xVariables, logRegDF, trials, processes = None, seed = None, progress = False, tol = None, roundSize = 100, report = None):
+    with instrument.recording(report):
+        return runLogisticSelect(yVariable, xVariables, logRegDF, trials, processes, seed, progress, tol, roundSize)
+
+#function that does the work of logisticSelectMulti (same inputs and output)
+def runLogisticSelect(yVariable, xVariables, logRegDF, trials, processes, seed, progress, tol, roundSize):
+    xVariableCounts = np.zeros(len(xVariables)) #initialize counts to 0
+    trialSeeds = spawnSeeds(seed, trials) #trial i always gets stream i
+    selectDF = logRegDF[[yVariable] + xVariables] #only ship the needed columns to the workers
+
+    workers = 1 if processes == 1 else (processes or os.cpu_count() or 1)
+    executor = concurrent.futures.ProcessPoolExecutor(max_workers = workers) if workers > 1 else None
+
+    trialsRun = 0
+    lastFreq = None
+    try:
+        while trialsRun < trials:
+            roundSeeds = trialSeeds[trialsRun:(trialsRun + roundSize)]
+            tasks = [[yVariable, xVariables, selectDF, x] for x in np.array_split(np.array(roundSeeds, dtype = object), workers) if len(x) > 0] #one batch per worker
+
+            start = time.perf_counter()
+            if executor is None:
+                results = [logisticSelectTrials(x) for x in tasks]
+            else:
+                results = list(executor.map(logisticSelectTrials, tasks))
+            if instrument.enabled: #the trials run in other processes, so they are timed here as a whole round (mean is wall time per trial)
+                instrument.addStage('logisticSelect trials', time.perf_counter() - start, calls = len(roundSeeds))
+
+            for x in results:
+                xVariableCounts += x
+            trialsRun += len(roundSeeds)
+
+            xVariableFreq = xVariableCounts / trialsRun
+            if progress:
+                print(str(trialsRun) + ' / ' + str(trials) + ' trials')
+            if tol is not None and lastFreq is not None and np.max(np.abs(xVariableFreq - lastFreq)) <= tol: #frequencies have settled
+                break
+            lastFreq = xVariableFreq
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    xVariableFreq = [x / trialsRun for x in xVariableCounts.tolist()] #divide counts by trials for ratio of times selected
 
     return xVariableFreq
 
@@ -130,523 +311,518 @@ def generateModel(yVariable, xVariables, logRegDF):
 
     return fittedModel
         
-#### evaluation functions ####
-
-#these are functions that are fed to the simulator and determine the winners of individual games; they all take two teams as inputs and output one of the two teams
-#based on criteria inside the function (most often a simple comparison, e.g. whichever team has a better record)
-
-#this function outputs the team with the higher tournament seed (ties broken by RNG)
-def highSeedWins(teamA, teamB, refDF):
-    teamADF = refDF[refDF['LTeamID'] == teamA]
-    if teamADF.empty:
-        teamADF = refDF[refDF['WTeamID'] == teamA]
-        teamASeed = float(teamADF.loc[teamADF.index[0], 'WNumSeed'])
-    else:
-        teamASeed = float(teamADF.loc[teamADF.index[0], 'LNumSeed'])
-
-    teamBDF = refDF[refDF['LTeamID'] == teamB]
-    if teamBDF.empty:
-        teamBDF = refDF[refDF['WTeamID'] == teamB]
-        teamBSeed = float(teamBDF.loc[teamBDF.index[0], 'WNumSeed'])
-    else:
-        teamBSeed = float(teamBDF.loc[teamBDF.index[0], 'LNumSeed'])
-
-    if teamASeed == teamBSeed:
-        rand = np.random.random()
-        if rand < 0.5:
+#class for evaluation functions driven by a fitted logistic regression model (called like the other evaluation functions: model(teamA, teamB, refDF))
+#a game is scored as one dot product of the coefficients with the difference of the two teams' stat vectors, followed by the sigmoid
+#attributes:
+#   columns: the stats used by the model (without W / L prefix)
+#   coefs: the coefficient of each stat difference, in the same order as columns
+#   __name__: name the model goes by in backtests and reports (made up from its columns if not given)
+class logRegModel:
+    def __init__(self, columns, coefs, name = None):
+        self.columns = columns
+        self.coefs = np.array(coefs)
+        if name is None:
+            name = 'logRegModel[' + ','.join(columns) + ']'
+        self.__name__ = name
+
+    def __repr__(self):
+        return 'logRegModel(' + self.__name__ + ')'
+
+    #function that returns the probability of team A beating team B according to the model
+    def probability(self, teamA, teamB, refDF):
+        features = getTeamFeatures(refDF)
+        vectors = features.matrix(self.columns) #stat vector of every team, built once per refDF
+        x = vectors[features.teamRows[teamA]] - vectors[features.teamRows[teamB]]
+        return float(sigmoid(np.dot(x, self.coefs)))
+
+    #function that outputs the team predicted to win (rng is accepted like the other evaluation functions but never needed)
+    def __call__(self, teamA, teamB, refDF, rng = None):
+        sig = self.probability(teamA, teamB, refDF)
+        prediction = round(sig)
+
+        if int(prediction) == 1:
             return teamA
         else:
             return teamB
-    elif teamASeed < teamBSeed:
-        return teamA
-    else:
-        return teamB
 
-#this one outputs team with better record (ties broken by RNG)
-def betterRecordWins(teamA, teamB, refDF):
-    teamADF = refDF[refDF['LTeamID'] == teamA]
-    if teamADF.empty:
-        teamADF = refDF[refDF['WTeamID'] == teamA]
-        teamARecord = float(teamADF.loc[teamADF.index[0], 'WRecord'])
-    else:
-        teamARecord = float(teamADF.loc[teamADF.index[0], 'LRecord'])
-
-    teamBDF = refDF[refDF['LTeamID'] == teamB]
-    if teamBDF.empty:
-        teamBDF = refDF[refDF['WTeamID'] == teamB]
-        teamBRecord = float(teamBDF.loc[teamBDF.index[0], 'WRecord'])
-    else:
-        teamBRecord = float(teamBDF.loc[teamBDF.index[0], 'LRecord'])
+#### stat comparators ####
 
-    if teamARecord == teamBRecord:
-        rand = np.random.random()
-        if rand < 0.5:
+#function that standardizes values within each season (mean 0, standard deviation 1; 0 for a season where every value is the same)
+#inputs:
+#   seasons: array of the season of each value
+#   values: array of values
+#output:
+#   array of standardized values
+def seasonZScores(seasons, values):
+    values = pd.Series(values, dtype = np.float64)
+    grouped = values.groupby(seasons)
+    zScores = (values - grouped.transform('mean')) / grouped.transform('std', ddof = 0)
+    return zScores.fillna(0).to_numpy()
+
+#function that ranks every row of a teamFeatures on a comparison, so that a better team always has a higher rank and equal teams share one
+#(rows of every season are ranked together on their values, so rows from different seasons compare the way their stats do)
+#inputs:
+#   features: a teamFeatures
+#   stat: name of the stat, or a dictionary of stat -> weight for a weighted composite of the stats standardized within each season
+#   higherWins: True if the higher value wins
+#   tieBreaks: list of (stat, higherWins) pairs that decide ties in order
+#output:
+#   ranks: integer array with the rank of each row of features.values (missing values rank below everything else)
+def rankTeams(features, stat, higherWins, tieBreaks):
+    keys = []
+    for x, xHigherWins in [(stat, higherWins)] + list(tieBreaks):
+        if isinstance(x, dict):
+            values = sum(weight * seasonZScores(features.seasons, features.values[:, features.columns[name]]) for name, weight in x.items())
+        else:
+            values = features.values[:, features.columns[x]].astype(np.float64)
+        if not xHigherWins:
+            values = -values
+        keys.append(np.where(np.isnan(values), -np.inf, values))
+
+    order = np.lexsort(keys[::-1]) #lexsort sorts on the last key first
+    sortedKeys = np.stack([x[order] for x in keys])
+    newRank = np.any(sortedKeys[:, 1:] != sortedKeys[:, :-1], axis = 0) #a row gets a new rank wherever any key changes
+
+    ranks = np.empty(order.shape[0], dtype = np.int64)
+    ranks[order] = np.concatenate([[0], np.cumsum(newRank)])
+
+    return ranks
+
+#function that returns a stat of a comparison as a hashable value: the stat name, or the sorted (stat, weight) pairs of a composite
+def statKey(stat):
+    if isinstance(stat, dict):
+        return tuple(sorted(stat.items()))
+    return stat
+
+#function that returns the name of a stat of a comparison: the stat name, or the weighted stats of a composite (e.g. 'Composite(0.5*PtsPGDif+1*Record)')
+def statName(stat):
+    if isinstance(stat, dict):
+        return 'Composite(' + '+'.join('%g*%s' % (weight, x) for x, weight in statKey(stat)) + ')'
+    return stat
+
+#class for evaluation functions that pick the team that compares better on a stat (called like the other evaluation functions: comparator(teamA, teamB, refDF))
+#the teams in a reference DF are ranked once on the whole comparison (kept with its teamFeatures), after which a game is settled by comparing two integers
+#and a whole round of games by comparing two arrays; a tie left after every tie break is broken by RNG
+#attributes:
+#   stat: name of the stat to compare (without the W / L prefix), or a dictionary of stat -> weight for a weighted composite of the stats standardized within each season
+#   higherWins: True if the team with the higher value wins, False if the lower value wins
+#   tieBreaks: list of (stat, higherWins) pairs compared in order when the teams are tied (a stat can be a composite dictionary here too)
+#   __name__: name the comparator goes by in backtests and reports (made up from the comparison, with the weights of any composite, if not given)
+#   key: the comparison as a hashable tuple (comparators with the same key share their rankings)
+class statComparator:
+    def __init__(self, stat, higherWins = True, tieBreaks = (), name = None):
+        self.stat = dict(stat) if isinstance(stat, dict) else stat
+        self.higherWins = higherWins
+        self.tieBreaks = [(dict(x) if isinstance(x, dict) else x, y) for x, y in tieBreaks]
+        self.key = (statKey(self.stat), higherWins, tuple((statKey(x), y) for x, y in self.tieBreaks))
+
+        if name is None:
+            names = [('higher' if y else 'lower') + statName(x) for x, y in [(self.stat, higherWins)] + self.tieBreaks]
+            name = '>'.join(names) + 'Wins'
+        self.__name__ = name
+
+    def __repr__(self):
+        return 'statComparator(' + self.__name__ + ')'
+
+    #function that returns the rank of every row of a teamFeatures on this comparison (built the first time the features are seen)
+    def ranks(self, features):
+        ranks = features.rankArrays.get(self.key)
+        if ranks is None:
+            ranks = features.rankArrays[self.key] = rankTeams(features, self.stat, self.higherWins, self.tieBreaks)
+        return ranks
+
+    #function that outputs the team that compares better (ties broken by RNG)
+    def __call__(self, teamA, teamB, refDF, rng = None):
+        features = getTeamFeatures(refDF)
+        ranks = self.ranks(features)
+        rankA = ranks[features.teamRows[teamA]]
+        rankB = ranks[features.teamRows[teamB]]
+
+        if rankA == rankB:
+            if coinFlip(rng):
+                return teamA
+            else:
+                return teamB
+        elif rankA > rankB:
             return teamA
         else:
             return teamB
-    elif teamARecord > teamBRecord:
-        return teamA
-    else:
-        return teamB
 
-#outputs team with better point differenctial (tie broken with RNG)
-def betterPtsDifWins(teamA, teamB, refDF):
-    teamADF = refDF[refDF['LTeamID'] == teamA]
-    if teamADF.empty:
-        teamADF = refDF[refDF['WTeamID'] == teamA]
-        teamAPtsDif = float(teamADF.loc[teamADF.index[0], 'WPtsDif'])
-    else:
-        teamAPtsDif = float(teamADF.loc[teamADF.index[0], 'LPtsDif'])
+    #function that picks the winners of many games at once
+    #inputs:
+    #   teamsA, teamsB: arrays of the team ids playing each game
+    #   refDF: the data frame that contains stats for all the teams (or a compact stats array of team features)
+    #   seasons: the season of each game (a single season or an array; default None uses each team's first row, like a single call does)
+    #   rng: numpy Generator used to break ties (default None uses numpy's global RNG)
+    #output:
+    #   winners: array of the team id of the winner of each game
+    def resolve(self, teamsA, teamsB, refDF, seasons = None, rng = None):
+        features = getTeamFeatures(refDF)
+        ranks = self.ranks(features)
+        teamsA = np.asarray(teamsA, dtype = np.int64)
+        teamsB = np.asarray(teamsB, dtype = np.int64)
+
+        if seasons is None:
+            rowsA = np.array([features.teamRows[x] for x in teamsA.tolist()], dtype = np.int64)
+            rowsB = np.array([features.teamRows[x] for x in teamsB.tolist()], dtype = np.int64)
+        else:
+            rowsA = features.lookupRows(seasons, teamsA)
+            rowsB = features.lookupRows(seasons, teamsB)
 
-    teamBDF = refDF[refDF['LTeamID'] == teamB]
-    if teamBDF.empty:
-        teamBDF = refDF[refDF['WTeamID'] == teamB]
-        teamBPtsDif = float(teamBDF.loc[teamBDF.index[0], 'WPtsDif'])
-    else:
-        teamBPtsDif = float(teamBDF.loc[teamBDF.index[0], 'LPtsDif'])
+        rankA = ranks[rowsA]
+        rankB = ranks[rowsB]
+        coins = (np.random.random(teamsA.shape[0]) if rng is None else rng.random(teamsA.shape[0])) < 0.5
+        aWins = np.where(rankA == rankB, coins, rankA > rankB)
 
-    if teamAPtsDif == teamBPtsDif:
-        rand = np.random.random()
-        if rand < 0.5:
-            return teamA
-        else:
-            return teamB
-    elif teamAPtsDif > teamBPtsDif:
-        return teamA
-    else:
-        return teamB
+        return np.where(aWins, teamsA, teamsB)
 
-#outputs team with better point differential per game
-def betterPtsDifPGWins(teamA, teamB, refDF):
-    teamADF = refDF[refDF['LTeamID'] == teamA]
-    if teamADF.empty:
-        teamADF = refDF[refDF['WTeamID'] == teamA]
-        teamAPtsPGDif = float(teamADF.loc[teamADF.index[0], 'WPtsPGDif'])
-    else:
-        teamAPtsPGDif = float(teamADF.loc[teamADF.index[0], 'LPtsPGDif'])
+#function that builds a comparator for every stat in both directions, for screening many comparisons at once (e.g. with tourneyGameBacktest in simulation.py)
+#inputs:
+#   stats: list of stat names
+#   directions: the higherWins values to try (default both)
+#   tieBreaks: tie breaks used by every comparator (default none)
+#output:
+#   comparators: dictionary of name -> statComparator
+def comparatorGrid(stats, directions = (True, False), tieBreaks = ()):
+    comparators = {}
+    for stat in stats:
+        for higherWins in directions:
+            comparator = statComparator(stat, higherWins = higherWins, tieBreaks = tieBreaks)
+            comparators[comparator.__name__] = comparator
+    return comparators
 
-    teamBDF = refDF[refDF['LTeamID'] == teamB]
-    if teamBDF.empty:
-        teamBDF = refDF[refDF['WTeamID'] == teamB]
-        teamBPtsPGDif = float(teamBDF.loc[teamBDF.index[0], 'WPtsPGDif'])
-    else:
-        teamBPtsPGDif = float(teamBDF.loc[teamBDF.index[0], 'LPtsPGDif'])
+#### evaluation functions ####
 
-    if teamAPtsPGDif == teamBPtsPGDif:
-        rand = np.random.random()
-        if rand < 0.5:
-            return teamA
-        else:
-            return teamB
-    elif teamAPtsPGDif > teamBPtsPGDif:
-        return teamA
-    else:
-        return teamB
+#these are functions that are fed to the simulator and determine the winners of individual games; they all take two teams as inputs and output one of the two teams
+#based on criteria inside the function (most often a simple comparison, e.g. whichever team has a better record, see statComparator)
+#they also take an optional rng (numpy Generator, see seeding.py) for breaking ties; without one they use numpy's global RNG
 
-#outputs team with better free throw percentage
-def betterFTPercWins(teamA, teamB, refDF):
-    teamADF = refDF[refDF['LTeamID'] == teamA]
-    if teamADF.empty:
-        teamADF = refDF[refDF['WTeamID'] == teamA]
-        teamAFTPerc = float(teamADF.loc[teamADF.index[0], 'WFTPerc'])
-    else:
-        teamAFTPerc = float(teamADF.loc[teamADF.index[0], 'LFTPerc'])
+#this function outputs the team with the higher tournament seed (ties broken by RNG)
+highSeedWins = statComparator('NumSeed', higherWins = False, name = 'highSeedWins')
 
-    teamBDF = refDF[refDF['LTeamID'] == teamB]
-    if teamBDF.empty:
-        teamBDF = refDF[refDF['WTeamID'] == teamB]
-        teamBFTPerc = float(teamBDF.loc[teamBDF.index[0], 'WFTPerc'])
-    else:
-        teamBFTPerc = float(teamBDF.loc[teamBDF.index[0], 'LFTPerc'])
+#this one outputs team with better record (ties broken by RNG)
+betterRecordWins = statComparator('Record', higherWins = True, name = 'betterRecordWins')
 
-    if teamAFTPerc == teamBFTPerc:
-        rand = np.random.random()
-        if rand < 0.5:
-            return teamA
-        else:
-            return teamB
-    elif teamAFTPerc > teamBFTPerc:
-        return teamA
-    else:
-        return teamB
+#outputs team with better point differenctial (tie broken with RNG)
+betterPtsDifWins = statComparator('PtsDif', higherWins = True, name = 'betterPtsDifWins')
 
-#outputs team with better assist to turnover ratio
-def betterAstTORatioWins(teamA, teamB, refDF):
-    teamADF = refDF[refDF['LTeamID'] == teamA]
-    if teamADF.empty:
-        teamADF = refDF[refDF['WTeamID'] == teamA]
-        teamAATR = float(teamADF.loc[teamADF.index[0], 'WATR'])
-    else:
-        teamAATR = float(teamADF.loc[teamADF.index[0], 'LATR'])
+#outputs team with better point differential per game
+betterPtsDifPGWins = statComparator('PtsPGDif', higherWins = True, name = 'betterPtsDifPGWins')
 
-    teamBDF = refDF[refDF['LTeamID'] == teamB]
-    if teamBDF.empty:
-        teamBDF = refDF[refDF['WTeamID'] == teamB]
-        teamBATR = float(teamBDF.loc[teamBDF.index[0], 'WATR'])
-    else:
-        teamBATR = float(teamBDF.loc[teamBDF.index[0], 'LATR'])
+#outputs team with better free throw percentage
+betterFTPercWins = statComparator('FTPerc', higherWins = True, name = 'betterFTPercWins')
 
-    if teamAATR == teamBATR:
-        rand = np.random.random()
-        if rand < 0.5:
-            return teamA
-        else:
-            return teamB
-    elif teamAATR > teamBATR:
-        return teamA
-    else:
-        return teamB
+#outputs team with better assist to turnover ratio
+betterAstTORatioWins = statComparator('ATR', higherWins = True, name = 'betterAstTORatioWins')
 
 #outputs the team that is predicted to win based on logistic regression model using all log reg values
-def logRegPredictFull(teamA, teamB, refDF):
-    tempDF = refDF[:]
-    columns = ['NumSeed', 'Record', 'PtsPG', 'PtsPGDif', 'TrueShtPerc', 'ORPG', 'DRPG', 'AstPG', 'StlPG', 'BlkPG', 'TOPG', 'ATR', 'PFPG', 'FTAPG', 'DefMetric', 'ConfAppearances'] #columns of full model
-    #these coefficients were found by running log reg with above variables
-    coefs = np.array([-0.10652044, -0.46803654,  0.02073799,  0.11885845,  0.04021554,
-        0.06865805, -0.09927938, -0.08682422,  0.01886909,  0.04548005,
-        0.00183267, -0.16278378, -0.04832846, -0.06462267,  0.00453879,
-        0.00111273])
-
-    tempDF = createDetailedLogRegDF(tempDF)
-
-    teamADF = tempDF[tempDF['selfTeamID'] == teamA]
-    prefixA = 'self'
-    if teamADF.empty:
-        teamADF = tempDF[tempDF['oppTeamID'] == teamA]
-        prefixA = 'opp'   
-    teamADF = teamADF.loc[teamADF.index[0],]
-    teamASeed = teamADF[prefixA + 'NumSeed']
-    
-    teamBDF = tempDF[tempDF['selfTeamID'] == teamB]
-    prefixB = 'self'
-    if teamBDF.empty:
-        teamBDF = tempDF[tempDF['oppTeamID'] == teamB]
-        prefixB = 'opp'
-    teamBDF = teamBDF.loc[teamBDF.index[0],]
-    teamBSeed = teamADF[prefixB + 'NumSeed']
-
-    teamAColumns = [prefixA + x for x in columns]
-    teamBColumns = [prefixB + x for x in columns]
-    difColumns = [x + 'Dif' for x in columns]
-    
-    teamADF = teamADF[teamAColumns]
-    teamBDF = teamBDF[teamBColumns]
-
-    difDF = pd.DataFrame(data = np.zeros(shape = (1, len(difColumns))), columns = difColumns)
-
-    for i in columns:
-        difDF[i + 'Dif'] = teamADF[prefixA + i] - teamBDF[prefixB + i]
-
-    x = difDF.to_numpy()
-
-    raw = np.matmul(x, coefs)
-    sig = float(sigmoid(raw))
-    prediction = round(sig)
-
-    if int(prediction) == 1:
-        return teamA
-    else:
-        return teamB
+#these coefficients were found by running log reg with the listed variables
+logRegPredictFull = logRegModel(['NumSeed', 'Record', 'PtsPG', 'PtsPGDif', 'TrueShtPerc', 'ORPG', 'DRPG', 'AstPG', 'StlPG', 'BlkPG', 'TOPG', 'ATR', 'PFPG', 'FTAPG', 'DefMetric', 'ConfAppearances'],
+                                [-0.10652044, -0.46803654,  0.02073799,  0.11885845,  0.04021554,
+                                 0.06865805, -0.09927938, -0.08682422,  0.01886909,  0.04548005,
+                                 0.00183267, -0.16278378, -0.04832846, -0.06462267,  0.00453879,
+                                 0.00111273], name = 'logRegPredictFull')
 
 #outputs team predicted by a modified version of full logistic regression
-def logRegPredictFullJr(teamA, teamB, refDF):
-    tempDF = refDF[:]
-    columns = ['NumSeed', 'Record', 'PtsPG', 'PtsPGDif', 'TrueShtPerc', 'ORPG', 'DRPG', 'AstPG', 'StlPG', 'BlkPG', 'TOPG', 'ATR']
-    coefs = np.array([-0.1277661425254346, -0.9675537604278555, -0.005681323906525973, 0.11413038711685244, -0.024540742010719464, 0.04180380199954239, -0.09256655706875093, -0.04161029124478528, 0.02002168652823342, 0.07146572080518195, -0.04077721508134719, 0.047984788430770614])
-
-    tempDF = createDetailedLogRegDF(tempDF)
-
-    teamADF = tempDF[tempDF['selfTeamID'] == teamA]
-    prefixA = 'self'
-    if teamADF.empty:
-        teamADF = tempDF[tempDF['oppTeamID'] == teamA]
-        prefixA = 'opp'   
-    teamADF = teamADF.loc[teamADF.index[0],]
-    teamASeed = teamADF[prefixA + 'NumSeed']
-    
-    teamBDF = tempDF[tempDF['selfTeamID'] == teamB]
-    prefixB = 'self'
-    if teamBDF.empty:
-        teamBDF = tempDF[tempDF['oppTeamID'] == teamB]
-        prefixB = 'opp'
-    teamBDF = teamBDF.loc[teamBDF.index[0],]
-    teamBSeed = teamADF[prefixB + 'NumSeed']
-
-    teamAColumns = [prefixA + x for x in columns]
-    teamBColumns = [prefixB + x for x in columns]
-    difColumns = [x + 'Dif' for x in columns]
-    
-    teamADF = teamADF[teamAColumns]
-    teamBDF = teamBDF[teamBColumns]
-
-    difDF = pd.DataFrame(data = np.zeros(shape = (1, len(difColumns))), columns = difColumns)
-
-    for i in columns:
-        difDF[i + 'Dif'] = teamADF[prefixA + i] - teamBDF[prefixB + i]
-
-    x = difDF.to_numpy()
-
-    raw = np.matmul(x, coefs)
-    sig = float(sigmoid(raw))
-    prediction = round(sig)
-
-    if int(prediction) == 1:
-        return teamA
-    else:
-        return teamB
+logRegPredictFullJr = logRegModel(['NumSeed', 'Record', 'PtsPG', 'PtsPGDif', 'TrueShtPerc', 'ORPG', 'DRPG', 'AstPG', 'StlPG', 'BlkPG', 'TOPG', 'ATR'],
+                                  [-0.1277661425254346, -0.9675537604278555, -0.005681323906525973, 0.11413038711685244, -0.024540742010719464, 0.04180380199954239, -0.09256655706875093, -0.04161029124478528, 0.02002168652823342, 0.07146572080518195, -0.04077721508134719, 0.047984788430770614], name = 'logRegPredictFullJr')
 
 #outputs team predicted by modified LR
-def logRegPredictFullJr2(teamA, teamB, refDF):
-    tempDF = refDF[:]
-    columns = ['PtsPG', 'PtsPGDif', 'TrueShtPerc', 'ORPG', 'DRPG', 'AstPG', 'StlPG', 'BlkPG', 'TOPG', 'ATR', 'PFPG', 'FTA']
-    coefs = np.array([0.020714883570040817, 0.17002007754667767, 0.03602944702342518, 0.12329308766779627, -0.12172048042621396, -0.06613829111009499, -0.02885618574988073, 0.12477181224884713, -0.016781619320912718, 0.07356410081655884, -0.0848784870047061, -0.0478585789639538])
-
-    tempDF = createDetailedLogRegDF(tempDF)
-
-    teamADF = tempDF[tempDF['selfTeamID'] == teamA]
-    prefixA = 'self'
-    if teamADF.empty:
-        teamADF = tempDF[tempDF['oppTeamID'] == teamA]
-        prefixA = 'opp'   
-    teamADF = teamADF.loc[teamADF.index[0],]
-    teamASeed = teamADF[prefixA + 'NumSeed']
-    
-    teamBDF = tempDF[tempDF['selfTeamID'] == teamB]
-    prefixB = 'self'
-    if teamBDF.empty:
-        teamBDF = tempDF[tempDF['oppTeamID'] == teamB]
-        prefixB = 'opp'
-    teamBDF = teamBDF.loc[teamBDF.index[0],]
-    teamBSeed = teamADF[prefixB + 'NumSeed']
-
-    teamAColumns = [prefixA + x for x in columns]
-    teamBColumns = [prefixB + x for x in columns]
-    difColumns = [x + 'Dif' for x in columns]
-    
-    teamADF = teamADF[teamAColumns]
-    teamBDF = teamBDF[teamBColumns]
-
-    difDF = pd.DataFrame(data = np.zeros(shape = (1, len(difColumns))), columns = difColumns)
-
-    for i in columns:
-        difDF[i + 'Dif'] = teamADF[prefixA + i] - teamBDF[prefixB + i]
-
-    x = difDF.to_numpy()
-
-    raw = np.matmul(x, coefs)
-    sig = float(sigmoid(raw))
-    prediction = round(sig)
-
-    if int(prediction) == 1:
-        return teamA
-    else:
-        return teamB
+logRegPredictFullJr2 = logRegModel(['PtsPG', 'PtsPGDif', 'TrueShtPerc', 'ORPG', 'DRPG', 'AstPG', 'StlPG', 'BlkPG', 'TOPG', 'ATR', 'PFPG', 'FTA'],
+                                   [0.020714883570040817, 0.17002007754667767, 0.03602944702342518, 0.12329308766779627, -0.12172048042621396, -0.06613829111009499, -0.02885618574988073, 0.12477181224884713, -0.016781619320912718, 0.07356410081655884, -0.0848784870047061, -0.0478585789639538], name = 'logRegPredictFullJr2')
 
 #optimal LR model without seed variable
-def logRegPredictMagicSansSeed(teamA, teamB, refDF):
-    tempDF = refDF[:]
-    columns = ['Record', 'PtsPG', 'PtsPGDif', 'TrueShtPerc', 'ORPG', 'DRPG', 'AstPG', 'StlPG', 'BlkPG', 'TOPG', 'ATR']
-    coefs = np.array([-0.3000112640198275, -0.002747095279902614, 0.17618385050626156, 0.037458857171097176, 0.091408841627562, -0.10604946381149698, -0.037403770159481195, -0.03893248026459082, 0.1487904628442653, -0.05756544476815563, 0.3299547245146217])
-
-    tempDF = createDetailedLogRegDF(tempDF)
-
-    teamADF = tempDF[tempDF['selfTeamID'] == teamA]
-    prefixA = 'self'
-    if teamADF.empty:
-        teamADF = tempDF[tempDF['oppTeamID'] == teamA]
-        prefixA = 'opp'   
-    teamADF = teamADF.loc[teamADF.index[0],]
-    teamASeed = teamADF[prefixA + 'NumSeed']
-    
-    teamBDF = tempDF[tempDF['selfTeamID'] == teamB]
-    prefixB = 'self'
-    if teamBDF.empty:
-        teamBDF = tempDF[tempDF['oppTeamID'] == teamB]
-        prefixB = 'opp'
-    teamBDF = teamBDF.loc[teamBDF.index[0],]
-    teamBSeed = teamADF[prefixB + 'NumSeed']
-
-    teamAColumns = [prefixA + x for x in columns]
-    teamBColumns = [prefixB + x for x in columns]
-    difColumns = [x + 'Dif' for x in columns]
-    
-    teamADF = teamADF[teamAColumns]
-    teamBDF = teamBDF[teamBColumns]
-
-    difDF = pd.DataFrame(data = np.zeros(shape = (1, len(difColumns))), columns = difColumns)
-
-    for i in columns:
-        difDF[i + 'Dif'] = teamADF[prefixA + i] - teamBDF[prefixB + i]
-
-    x = difDF.to_numpy()
-
-    raw = np.matmul(x, coefs)
-    sig = float(sigmoid(raw))
-    prediction = round(sig)
-
-    if int(prediction) == 1:
-        return teamA
-    else:
-        return teamB
+logRegPredictMagicSansSeed = logRegModel(['Record', 'PtsPG', 'PtsPGDif', 'TrueShtPerc', 'ORPG', 'DRPG', 'AstPG', 'StlPG', 'BlkPG', 'TOPG', 'ATR'],
+                                         [-0.3000112640198275, -0.002747095279902614, 0.17618385050626156, 0.037458857171097176, 0.091408841627562, -0.10604946381149698, -0.037403770159481195, -0.03893248026459082, 0.1487904628442653, -0.05756544476815563, 0.3299547245146217], name = 'logRegPredictMagicSansSeed')
 
 #outputs team with fewer turnovers per game
-def fewerTurnoversPGWins(teamA, teamB, refDF):
-    teamADF = refDF[refDF['LTeamID'] == teamA]
-    if teamADF.empty:
-        teamADF = refDF[refDF['WTeamID'] == teamA]
-        teamATOPG = float(teamADF.loc[teamADF.index[0], 'WTOPG'])
-    else:
-        teamATOPG = float(teamADF.loc[teamADF.index[0], 'LTOPG'])
+#note: compares the same way it always has, which picks the team with more turnovers per game
+fewerTurnoversPGWins = statComparator('TOPG', higherWins = True, name = 'fewerTurnoversPGWins')
 
-    teamBDF = refDF[refDF['LTeamID'] == teamB]
-    if teamBDF.empty:
-        teamBDF = refDF[refDF['WTeamID'] == teamB]
-        teamBTOPG = float(teamBDF.loc[teamBDF.index[0], 'WTOPG'])
-    else:
-        teamBTOPG = float(teamBDF.loc[teamBDF.index[0], 'LTOPG'])
+#outputs team with more steals per game (used in defensive metric calculation)
+moreStealsPGWins = statComparator('StlPG', higherWins = True, name = 'moreStealsPGWins')
 
-    if teamATOPG == teamBTOPG:
-        rand = np.random.random()
-        if rand < 0.5:
-            return teamA
-        else:
-            return teamB
-    elif teamATOPG > teamBTOPG:
-        return teamA
-    else:
-        return teamB
+#outputs team with fewer turnovers per game (used in defensive metric calculation)
+fewerFoulsPGWins = statComparator('PFPG', higherWins = False, name = 'fewerFoulsPGWins')
 
-#outputs team with more steals per game (used in defensive metric calculation)
-def moreStealsPGWins(teamA, teamB, refDF):
-    teamADF = refDF[refDF['LTeamID'] == teamA]
-    if teamADF.empty:
-        teamADF = refDF[refDF['WTeamID'] == teamA]
-        teamAStlPG = float(teamADF.loc[teamADF.index[0], 'WStlPG'])
-    else:
-        teamAStlPG = float(teamADF.loc[teamADF.index[0], 'LStlPG'])
+#outputs team with more defensive rebounds per game (used in defensive metric calculation)
+moreDefReboundsPGWins = statComparator('DRPG', higherWins = True, name = 'moreDefReboundsPGWins')
 
-    teamBDF = refDF[refDF['LTeamID'] == teamB]
-    if teamBDF.empty:
-        teamBDF = refDF[refDF['WTeamID'] == teamB]
-        teamBStlPG = float(teamBDF.loc[teamBDF.index[0], 'WStlPG'])
-    else:
-        teamBStlPG = float(teamBDF.loc[teamBDF.index[0], 'LStlPG'])
+#outputs team with more blocks per game (used in defensive metric calculation)
+moreBlocksPGWins = statComparator('BlkPG', higherWins = True, name = 'moreBlocksPGWins')
 
-    if teamAStlPG == teamBStlPG:
-        rand = np.random.random()
-        if rand < 0.5:
-            return teamA
-        else:
-            return teamB
-    elif teamAStlPG > teamBStlPG:
-        return teamA
-    else:
-        return teamB
+#outputs team with better field goal percentage
+#note: compares the same way it always has, which picks the team with the lower field goal percentage
+lowerFGPercLoses = statComparator('FGPerc', higherWins = False, name = 'lowerFGPercLoses')
 
-#outputs team with fewer turnovers per game (used in defensive metric calculation)
-def fewerFoulsPGWins(teamA, teamB, refDF):
-    teamADF = refDF[refDF['LTeamID'] == teamA]
-    if teamADF.empty:
-        teamADF = refDF[refDF['WTeamID'] == teamA]
-        teamAPFPG = float(teamADF.loc[teamADF.index[0], 'WPFPG'])
-    else:
-        teamAPFPG = float(teamADF.loc[teamADF.index[0], 'LPFPG'])
+#### batched prediction ####
 
-    teamBDF = refDF[refDF['LTeamID'] == teamB]
-    if teamBDF.empty:
-        teamBDF = refDF[refDF['WTeamID'] == teamB]
-        teamBPFPG = float(teamBDF.loc[teamBDF.index[0], 'WPFPG'])
+#function that scores a comparison between two arrays of values: 1 where the first value wins, 0 where it loses and 0.5 for ties (the cases the RNG would decide)
+def compareStatArrays(valuesA, valuesB, higherWins):
+    if higherWins:
+        better = valuesA > valuesB
     else:
-        teamBPFPG = float(teamBDF.loc[teamBDF.index[0], 'LPFPG'])
+        better = valuesA < valuesB
+    return np.where(valuesA == valuesB, 0.5, np.where(better, 1.0, 0.0))
 
-    if teamAPFPG == teamBPFPG:
-        rand = np.random.random()
-        if rand < 0.5:
-            return teamA
-        else:
-            return teamB
-    elif teamAPFPG < teamBPFPG:
-        return teamA
-    else:
-        return teamB
+#function that checks whether an evalFn can be scored as whole arrays of games (see predictMatchups)
+def hasBatchedPrediction(evalFn):
+    if isinstance(evalFn, cachedEvalFn):
+        evalFn = evalFn.evalFn
+    return isinstance(evalFn, (logRegModel, statComparator))
 
-#outputs team with more defensive rebounds per game (used in defensive metric calculation)
-def moreDefReboundsPGWins(teamA, teamB, refDF):
-    teamADF = refDF[refDF['LTeamID'] == teamA]
-    if teamADF.empty:
-        teamADF = refDF[refDF['WTeamID'] == teamA]
-        teamADRPG = float(teamADF.loc[teamADF.index[0], 'WDRPG'])
-    else:
-        teamADRPG = float(teamADF.loc[teamADF.index[0], 'LDRPG'])
+#function that returns the probability of team A beating team B for a single game, for any evalFn
+#logistic models give their sigmoid, stat comparisons give 1, 0, or 0.5 for a tie, and any other evalFn gives 1 or 0 for the team it picks
+#inputs:
+#   evalFn: the evaluation function
+#   teamA, teamB: team ids of the two teams playing
+#   refDF: the data frame that contains stats for all the teams
+#   rng: numpy Generator passed on to evalFns that only pick a winner, if they take an rng argument (default None uses numpy's global RNG)
+#output:
+#   P(team A wins)
+def winProbability(evalFn, teamA, teamB, refDF, rng = None):
+    if isinstance(evalFn, cachedEvalFn):
+        return evalFn.probability(teamA, teamB, refDF, rng = rng)
+    elif isinstance(evalFn, logRegModel):
+        return evalFn.probability(teamA, teamB, refDF)
+    elif isinstance(evalFn, statComparator):
+        features = getTeamFeatures(refDF)
+        ranks = evalFn.ranks(features)
+        return float(compareStatArrays(ranks[features.teamRows[teamA]], ranks[features.teamRows[teamB]], True))
+    elif rng is None or not acceptsRNG(evalFn):
+        return 1.0 if evalFn(teamA, teamB, refDF) == teamA else 0.0
+    else:
+        return 1.0 if evalFn(teamA, teamB, refDF, rng = rng) == teamA else 0.0
+
+#function that predicts the probability of team A beating team B for whole arrays of games at once
+#inputs:
+#   evalFn: a logRegModel or a statComparator
+#   seasons: the season of each game (a single season or an array with one per game)
+#   teamsA: array of team ids for team A
+#   teamsB: array of team ids for team B
+#   refDF: the data frame that contains stats for all the teams (or a compact stats array of team features, see kaggleData.statsArray in data.py)
+#output:
+#   probs: array holding P(team A wins) for each game (comparators give 1, 0, or 0.5 for a tie)
+def predictMatchups(evalFn, seasons, teamsA, teamsB, refDF):
+    if isinstance(evalFn, cachedEvalFn):
+        return evalFn.predictMatchups(seasons, teamsA, teamsB, refDF)
 
-    teamBDF = refDF[refDF['LTeamID'] == teamB]
-    if teamBDF.empty:
-        teamBDF = refDF[refDF['WTeamID'] == teamB]
-        teamBDRPG = float(teamBDF.loc[teamBDF.index[0], 'WDRPG'])
-    else:
-        teamBDRPG = float(teamBDF.loc[teamBDF.index[0], 'LDRPG'])
+    features = getTeamFeatures(refDF)
+    rowsA = features.lookupRows(seasons, teamsA)
+    rowsB = features.lookupRows(seasons, teamsB)
 
-    if teamADRPG == teamBDRPG:
-        rand = np.random.random()
-        if rand < 0.5:
-            return teamA
-        else:
-            return teamB
-    elif teamADRPG > teamBDRPG:
-        return teamA
+    if isinstance(evalFn, logRegModel):
+        vectors = features.matrix(evalFn.columns)
+        probs = sigmoid(np.matmul(vectors[rowsA] - vectors[rowsB], evalFn.coefs)) #one matrix multiply for every game
+    elif isinstance(evalFn, statComparator):
+        ranks = evalFn.ranks(features)
+        probs = compareStatArrays(ranks[rowsA], ranks[rowsB], True) #the better team has the higher rank
     else:
-        return teamB
+        raise ValueError('no batched prediction available for ' + getattr(evalFn, '__name__', repr(evalFn)))
 
-#outputs team with more blocks per game (used in defensive metric calculation)
-def moreBlocksPGWins(teamA, teamB, refDF):
-    teamADF = refDF[refDF['LTeamID'] == teamA]
-    if teamADF.empty:
-        teamADF = refDF[refDF['WTeamID'] == teamA]
-        teamABlkPG = float(teamADF.loc[teamADF.index[0], 'WBlkPG'])
-    else:
-        teamABlkPG = float(teamADF.loc[teamADF.index[0], 'LBlkPG'])
+    return probs
 
-    teamBDF = refDF[refDF['LTeamID'] == teamB]
-    if teamBDF.empty:
-        teamBDF = refDF[refDF['WTeamID'] == teamB]
-        teamBBlkPG = float(teamBDF.loc[teamBDF.index[0], 'WBlkPG'])
-    else:
-        teamBBlkPG = float(teamBDF.loc[teamBDF.index[0], 'LBlkPG'])
+#function that builds the full matrix of win probabilities for a field of teams
+#inputs:
+#   evalFn: a logRegModel or a statComparator
+#   season: the season the teams are playing in
+#   teams: array of team ids in the field
+#   refDF: the data frame that contains stats for all the teams (or a compact stats array of team features)
+#output:
+#   probMatrix: N x N array where probMatrix[i, j] is P(teams[i] beats teams[j]) (0.5 on the diagonal)
+def winProbMatrix(evalFn, season, teams, refDF):
+    if isinstance(evalFn, cachedEvalFn): #a full matrix is a single batched call, so it skips the cache
+        evalFn = evalFn.evalFn
 
-    if teamABlkPG == teamBBlkPG:
-        rand = np.random.random()
-        if rand < 0.5:
-            return teamA
-        else:
-            return teamB
-    elif teamABlkPG > teamBBlkPG:
-        return teamA
-    else:
-        return teamB
+    features = getTeamFeatures(refDF)
+    rows = features.lookupRows(season, teams)
 
-#outputs team with better field goal percentage
-def lowerFGPercLoses(teamA, teamB, refDF):
-    teamADF = refDF[refDF['LTeamID'] == teamA]
-    if teamADF.empty:
-        teamADF = refDF[refDF['WTeamID'] == teamA]
-        teamAFGPerc = float(teamADF.loc[teamADF.index[0], 'WFGPerc'])
+    if isinstance(evalFn, logRegModel):
+        scores = np.matmul(features.matrix(evalFn.columns)[rows], evalFn.coefs) #the model is linear, so each team needs a single score
+        probMatrix = sigmoid(scores[:, None] - scores[None, :])
+    elif isinstance(evalFn, statComparator):
+        ranks = evalFn.ranks(features)[rows]
+        probMatrix = compareStatArrays(ranks[:, None], ranks[None, :], True)
     else:
-        teamAFGPerc = float(teamADF.loc[teamADF.index[0], 'LFGPerc'])
+        raise ValueError('no batched prediction available for ' + getattr(evalFn, '__name__', repr(evalFn)))
 
-    teamBDF = refDF[refDF['LTeamID'] == teamB]
-    if teamBDF.empty:
-        teamBDF = refDF[refDF['WTeamID'] == teamB]
-        teamBFGPerc = float(teamBDF.loc[teamBDF.index[0], 'WFGPerc'])
-    else:
-        teamBBlkPG = float(teamBDF.loc[teamBDF.index[0], 'LFGPerc'])
+    return probMatrix
 
-    if teamAFGPerc == teamBFGPerc:
-        rand = np.random.random()
-        if rand < 0.5:
-            return teamA
+#function that creates the rows of a Kaggle submission file (every pairing of the field, lower team id first) for one season
+#inputs:
+#   evalFn: a logRegModel or a statComparator
+#   season: the season to predict
+#   teams: array of team ids in the field
+#   refDF: the data frame that contains stats for all the teams (or a compact stats array of team features)
+#output:
+#   outDF: a data frame with the ID ('season_teamA_teamB') and Pred (P(teamA wins)) columns
+def createSubmissionDF(evalFn, season, teams, refDF):
+    teams = np.sort(np.asarray(teams, dtype = np.int64))
+    probMatrix = winProbMatrix(evalFn, season, teams, refDF)
+    rowInd, colInd = np.triu_indices(teams.shape[0], k = 1) #every pairing once, lower team id as team A
+
+    ids = [str(season) + '_' + str(a) + '_' + str(b) for a, b in zip(teams[rowInd].tolist(), teams[colInd].tolist())]
+    outDF = pd.DataFrame({'ID': ids, 'Pred': probMatrix[rowInd, colInd]})
+
+    return outDF
+
+#### matchup cache ####
+
+#a deterministic evalFn always gives the same answer for the same game on the same data, so backtests and simulations that replay the same games
+#(e.g. a sweep comparing models over the same years, where every run plays the same first round games) only need to work each game out once
+#   cached = models.cachedEvalFn(models.logRegPredictFull)
+#   simulation.tourneySimVsActual(years, cached, compactDF, refDF); models.matchupResults.stats()
+
+#class that holds the results of recent matchups, dropping the least recently used entry once it is full
+#attributes:
+#   maxSize: the most entries kept
+#   entries: ordered dictionary of key -> result, least recently used first
+#   hits, misses, evictions: counts of lookups that found an entry, lookups that did not, and entries dropped to make room
+#   recorded: list of the (key, result) pairs stored since startRecording was called (None when not recording)
+class matchupCache:
+    def __init__(self, maxSize = 100000):
+        self.maxSize = maxSize
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.recorded = None
+
+    #function that returns the result stored under key (None if there is none), marking it as recently used
+    def get(self, key):
+        result = self.entries.get(key)
+        if result is None:
+            self.misses += 1
         else:
-            return teamB
-    elif teamAFGPerc < teamBFGPerc:
-        return teamA
-    else:
-        return teamB
\ No newline at end of file
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return result
+
+    #function that stores a result under key, dropping the least recently used entries past maxSize
+    def put(self, key, result):
+        if self.recorded is not None:
+            self.recorded.append((key, result))
+        self.entries[key] = result
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxSize:
+            self.entries.popitem(last = False)
+            self.evictions += 1
+
+    #function that starts keeping a list of the results stored from now on (e.g. so a worker process can send the results it worked out back, see tourneyBacktest in simulation.py)
+    def startRecording(self):
+        self.recorded = []
+
+    #function that stops recording and returns the (key, result) pairs stored since startRecording
+    def takeRecorded(self):
+        recorded = self.recorded
+        self.recorded = None
+        return [] if recorded is None else recorded
+
+    #function that empties the cache and its counts
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    #function that returns the hit / miss statistics as a dictionary
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {'size': len(self.entries), 'maxSize': self.maxSize, 'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'hitRate': self.hits / lookups if lookups > 0 else 0.0}
+
+matchupResults = matchupCache() #the cache shared by every cachedEvalFn that is not given its own
+
+#function that returns a hashable identity for an evalFn, the same for two models that always give the same answers
+#(logistic models by their stats and coefficients, comparators by their comparison, and anything else by the object itself)
+def modelKey(evalFn):
+    if isinstance(evalFn, logRegModel):
+        return ('logRegModel', tuple(evalFn.columns), evalFn.coefs.tobytes())
+    elif isinstance(evalFn, statComparator):
+        return ('statComparator',) + evalFn.key
+    return evalFn
+
+#class that wraps an evalFn so each game's result is kept in a matchupCache, keyed by the model, a fingerprint of the data and the two teams
+#it is called exactly like the evalFn it wraps (so it can be handed to the simulator, see tourneyGame.findWinner) and works with the batched functions above
+#the probability of team A winning is what gets stored, so a tie a comparator leaves to the RNG is still broken on every call; any other evalFn is only cached
+#when it is declared deterministic, since its picks are stored as they are
+#the cache is local to the process: a cachedEvalFn sent to a worker process is sent without it and uses that worker's matchupResults
+#(tourneyBacktest in simulation.py sends the results the workers work out back to the cache of the original)
+#attributes:
+#   evalFn: the wrapped evalFn
+#   cache: the matchupCache used
+#   deterministic: True if evalFn always picks the same winner for the same game (only used for evalFns other than logRegModel and statComparator)
+#   modelKey: the identity of evalFn in cache keys (see modelKey)
+#   takesRNG: True if evalFn takes an rng argument (see acceptsRNG in seeding.py)
+#   __name__: the name of evalFn
+class cachedEvalFn:
+    def __init__(self, evalFn, cache = None, deterministic = False):
+        self.evalFn = evalFn
+        self.cache = matchupResults if cache is None else cache
+        self.deterministic = deterministic or hasBatchedPrediction(evalFn)
+        self.takesRNG = acceptsRNG(evalFn)
+        self.modelKey = modelKey(evalFn)
+        self.__name__ = instrument.evalFnName(evalFn)
+
+    def __repr__(self):
+        return 'cachedEvalFn(' + self.__name__ + ')'
+
+    #the cache is left out when pickling, so worker processes are not sent a copy of every entry
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['cache'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.cache = matchupResults
+
+    #function that returns P(team A wins) for one game, from the cache when it has been worked out before (see winProbability)
+    def probability(self, teamA, teamB, refDF, rng = None):
+        if not self.deterministic:
+            return winProbability(self.evalFn, teamA, teamB, refDF, rng = rng)
+
+        key = (self.modelKey, getTeamFeatures(refDF).fingerprint(), None, teamA, teamB) #no season: a single game uses each team's first row
+        prob = self.cache.get(key)
+        if prob is None:
+            prob = winProbability(self.evalFn, teamA, teamB, refDF, rng = rng)
+            self.cache.put(key, prob)
+        return prob
+
+    #function that outputs the team predicted to win, picking it the same way the wrapped evalFn does
+    def __call__(self, teamA, teamB, refDF, rng = None):
+        if not self.deterministic:
+            if rng is None:
+                return self.evalFn(teamA, teamB, refDF)
+            elif self.takesRNG:
+                return self.evalFn(teamA, teamB, refDF, rng = rng)
+            seedGlobalRNG(rng) #an evalFn without an rng argument breaks ties with numpy's global RNG, seeded from rng so the game is still reproducible
+            return self.evalFn(teamA, teamB, refDF)
+
+        prob = self.probability(teamA, teamB, refDF)
+        if isinstance(self.evalFn, logRegModel):
+            return teamA if int(round(prob)) == 1 else teamB
+        if prob == 0.5: #a tie, broken by RNG like the comparator does
+            if coinFlip(rng):
+                return teamA
+            else:
+                return teamB
+        return teamA if prob > 0.5 else teamB
+
+    #function that predicts P(team A wins) for arrays of games (see predictMatchups), working out only the games missing from the cache in one batched call
+    def predictMatchups(self, seasons, teamsA, teamsB, refDF):
+        teamsA = np.asarray(teamsA, dtype = np.int64)
+        teamsB = np.asarray(teamsB, dtype = np.int64)
+        seasons = np.broadcast_to(np.asarray(seasons, dtype = np.int64), teamsA.shape)
+        fingerprint = getTeamFeatures(refDF).fingerprint()
+
+        keys = [(self.modelKey, fingerprint, season, teamA, teamB) for season, teamA, teamB in zip(seasons.tolist(), teamsA.tolist(), teamsB.tolist())]
+        probs = np.array([self.cache.get(x) for x in keys], dtype = np.float64) #missing games come out as nan
+        missing = np.flatnonzero(np.isnan(probs))
+
+        if missing.shape[0] > 0:
+            probs[missing] = predictMatchups(self.evalFn, seasons[missing], teamsA[missing], teamsB[missing], refDF)
+            for i, prob in zip(missing.tolist(), probs[missing].tolist()):
+                self.cache.put(keys[i], prob)
+
+        return probs
@@ -0,0 +1,67 @@
+#### initialize libraries ####
+import inspect
+import numpy as np
+
+#### random number generators ####
+
+#these functions give every part of the project (tie-breaks in the evaluation functions, train / test splits, points of view in the log reg DF, simulations)
+#its own numpy Generator, so runs can be reproduced from a single seed and parallel runs never share random state
+#anything that takes an rng argument also accepts None, which keeps using numpy's global RNG as the project always has
+
+#function that returns a numpy Generator
+#input:
+#   seed: an int, a np.random.SeedSequence, or an existing Generator (returned as is); default None seeds from the OS
+#output:
+#   rng: the Generator
+def makeRNG(seed = None):
+    return np.random.default_rng(seed)
+
+#function that returns the seed sequences of independent child streams (these are small and can be sent to worker processes)
+#inputs:
+#   seed: an int, a np.random.SeedSequence, or a Generator to spawn from (a Generator gives new children on every call)
+#   n: the number of child streams
+#output:
+#   a list of n np.random.SeedSequence objects
+def spawnSeeds(seed, n):
+    if isinstance(seed, np.random.Generator):
+        return seed.bit_generator.seed_seq.spawn(n)
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    return seed.spawn(n)
+
+#function that returns independent child Generators
+#inputs:
+#   seed: an int, a np.random.SeedSequence, or a Generator to spawn from
+#   n: the number of child Generators
+#output:
+#   a list of n Generators
+def spawnRNGs(seed, n):
+    return [makeRNG(x) for x in spawnSeeds(seed, n)]
+
+#function that flips a fair coin (used to break ties)
+#input:
+#   rng: the Generator to draw from (default None draws from numpy's global RNG)
+#output:
+#   True or False with equal probability
+def coinFlip(rng = None):
+    if rng is None:
+        return np.random.random() < 0.5
+    return rng.random() < 0.5
+
+#function that checks whether an evaluation function takes an rng argument (evalFns written as evalFn(teamA, teamB, refDF) do not, and break ties with numpy's global RNG)
+#input:
+#   evalFn: the evaluation function
+#output:
+#   True if evalFn can be called with rng = ...
+def acceptsRNG(evalFn):
+    try:
+        parameters = inspect.signature(evalFn).parameters.values()
+    except (TypeError, ValueError): #some builtins and extension types have no signature
+        return False
+    return any(x.name == 'rng' or x.kind == inspect.Parameter.VAR_KEYWORD for x in parameters)
+
+#function that seeds numpy's global RNG from a Generator, so evalFns that only use the global RNG still get a reproducible stream of their own
+#input:
+#   rng: the Generator to draw the seed from
+def seedGlobalRNG(rng):
+    np.random.seed(int(rng.integers(2 ** 32)))
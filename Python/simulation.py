@@ -1,5 +1,11 @@
 import numpy as np
 import pandas as pd
+import functools
+import weakref
+import concurrent.futures
+import instrument
+from seeding import makeRNG, spawnSeeds, acceptsRNG, seedGlobalRNG
+from models import hasBatchedPrediction, predictMatchups, winProbability, cachedEvalFn
 
 #function to generate every possible matchup for the given round of the tournament
 #input:
@@ -51,7 +57,10 @@ class tourneyGame:
         if self.teamB == None: 
             self.teamB = self.priorGameB.findWinner() #same for team B
         
-        self.winner = self.evalFn(self.teamA, self.teamB, self.refDF) #new attribute 'winner' is the teamID of the winning team as determined by evalFn
+        if instrument.enabled: #count and time the call
+            self.winner = instrument.wrapEvalFn(self.evalFn)(self.teamA, self.teamB, self.refDF)
+        else:
+            self.winner = self.evalFn(self.teamA, self.teamB, self.refDF) #new attribute 'winner' is the teamID of the winning team as determined by evalFn
 
         return self.winner
 
@@ -77,126 +86,269 @@ class tourneyNet:
         self.net[62].findWinner()
         return [x.winner for x in self.net]
 
+#class that holds the fixed layout of the bracket, built once and shared by everything that places teams in or reads games out of the tourney net
+#attributes:
+#   nGames: number of "regular" games in the tournament (63)
+#   roundStarts: index of the first game of each round in the tourney net
+#   gameRound: array of the round (0 for the first round) of each game
+#   priorA, priorB: arrays of the prior games that decide team A and team B of each game (-1 for first round games)
+#   nextGame, nextSide: arrays of the game each winner moves on to and which side of it (0 for team A, 1 for team B) they take (-1 for the championship)
+#   firstRoundSlots: dictionary of (section, seed) -> (game index, side) of the first round game that seed plays in
+#   gameSlots: dictionary of (section, seed, seed) -> index of the game (first four rounds) in which those seeds can meet
+#   priorList: priorA and priorB as plain lists
+#   evalOrder: list of the game indices with every game after the games that feed it
+class bracketTopology:
+    def __init__(self):
+        matchups = [generateMatchups(1), generateMatchups(2), generateMatchups(3), generateMatchups(4)] #combinations of seeds that can play in each of the first four rounds
+        sections = ['W', 'X', 'Y', 'Z']
+
+        self.nGames = 63
+        self.roundStarts = [0, 32, 48, 56, 60, 62]
+        self.gameRound = np.zeros(self.nGames, dtype = np.int64)
+        self.priorA = np.full(self.nGames, -1, dtype = np.int64)
+        self.priorB = np.full(self.nGames, -1, dtype = np.int64)
+        self.nextGame = np.full(self.nGames, -1, dtype = np.int64)
+        self.nextSide = np.full(self.nGames, -1, dtype = np.int64)
+
+        #link the rounds the same way tourneyNet does: each game takes the winners of the next two unlinked games
+        count = 0
+        game = 32
+        for roundNum, i in enumerate([16, 8, 4, 2, 1]):
+            for _ in range(i):
+                self.gameRound[game] = roundNum + 1
+                self.priorA[game] = count
+                self.priorB[game] = count + 1
+                self.nextGame[count] = game
+                self.nextGame[count + 1] = game
+                self.nextSide[count] = 0
+                self.nextSide[count + 1] = 1
+                count += 2
+                game += 1
+
+        #the better seed of each first round matchup is always team A
+        self.firstRoundSlots = {}
+        for sectionNum, section in enumerate(sections):
+            for j, (seedA, seedB) in enumerate(matchups[0]):
+                self.firstRoundSlots[(section, seedA)] = (8 * sectionNum + j, 0)
+                self.firstRoundSlots[(section, seedB)] = (8 * sectionNum + j, 1)
+
+        roundSectionMultiplierList = [8, 4, 2, 1] #multiplier for each section by round
+        matchupsDivisorList = [1, 4, 16, 64] #number of possible matchups per game by round
+        self.gameSlots = {}
+        for sectionNum, section in enumerate(sections):
+            for roundNum in range(len(matchups)):
+                for k, (seedA, seedB) in enumerate(matchups[roundNum]):
+                    index = self.roundStarts[roundNum] + (roundSectionMultiplierList[roundNum] * sectionNum) + k // matchupsDivisorList[roundNum]
+                    self.gameSlots.setdefault((section, seedA, seedB), index)
+                    self.gameSlots.setdefault((section, seedB, seedA), index)
+
+        self.priorList = [self.priorA.tolist(), self.priorB.tolist()] #the same links as plain lists for game by game loops
+
+        #order to evaluate the games in so every game comes after its prior games (the same order the recursive findWinner() calls visit them)
+        self.evalOrder = []
+        stack = [(self.nGames - 1, False)]
+        while len(stack) > 0:
+            game, priorsDone = stack.pop()
+            if priorsDone or self.priorA[game] < 0:
+                self.evalOrder.append(game)
+            else:
+                stack.append((game, True))
+                stack.append((int(self.priorB[game]), False))
+                stack.append((int(self.priorA[game]), False))
+
+    #function to find the first round game two seeds of a section play in
+    #output:
+    #   the index of the game, or None if the two seeds do not meet in the first round
+    def firstRoundGame(self, section, seedA, seedB):
+        slotA = self.firstRoundSlots[(section, seedA)]
+        slotB = self.firstRoundSlots[(section, seedB)]
+        if slotA[0] != slotB[0]:
+            return None
+        return slotA[0]
+
+    #function to find the index in the tourney net of a game between two teams, in the same order tourneyActual uses
+    #inputs:
+    #   dayNum: day the game was played (final four games are on day 152, the championship on day 154)
+    #   section: section of the winning team
+    #   seedA, seedB: integer seeds of the two teams
+    def gameIndex(self, dayNum, section, seedA, seedB):
+        if dayNum == 152: #final four game
+            return 60 if section in ('W', 'X') else 61
+        if dayNum == 154: #championship game
+            return 62
+        return self.gameSlots[(section, seedA, seedB)] #otherwise it is a game in the first four rounds
+
+topology = bracketTopology() #the one bracket layout used by the functions below
+
+#function that finds the play in games among one year of tournament games: games between the two teams of a seed line decided by a play in game
+#(same section and seed line, e.g. 16.1 and 16.2); two play in winners can also meet in a later round, so both teams having play in seeds is not enough
+#input:
+#   masterTemp: the rows of a master DF (masterCompact / masterDetailed) for a single year
+#output:
+#   boolean array that is True for the play in games
+def playInMask(masterTemp):
+    WNumSeed = np.asarray(masterTemp['WNumSeed'], dtype = np.float64)
+    LNumSeed = np.asarray(masterTemp['LNumSeed'], dtype = np.float64)
+    return (masterTemp['WSection'].to_numpy() == masterTemp['LSection'].to_numpy()) & (np.floor(WNumSeed) == np.floor(LNumSeed)) & (WNumSeed != np.floor(WNumSeed))
+
+#class that represents an entire tournament as fixed-size integer arrays (an alternative to tourneyNet that allocates nothing per game and can be reused)
+#attributes:
+#   teams: array of the two teams in each game; rows 0-62 are the regular games in tourney net order and play in games follow
+#   winners: array of the winner of each game, in the same order as teams
+#   playInFeeds: array of the play in game (row of teams) that decides each side of each first round game (-1 if there is none)
+#   nPlayIns: number of play in games in the loaded tournament
+class tourneyBracket:
+    def __init__(self, maxPlayIns = 64):
+        self.teams = np.full((topology.nGames + maxPlayIns, 2), -1, dtype = np.int64)
+        self.winners = np.full(topology.nGames + maxPlayIns, -1, dtype = np.int64)
+        self.playInFeeds = np.full((32, 2), -1, dtype = np.int64)
+        self.nPlayIns = 0
+
+    #function to fill in the first round and play in games from one year of tournament games
+    #input:
+    #   masterTemp: the rows of a master DF (masterCompact / masterDetailed) for a single year
+    def load(self, masterTemp):
+        self.teams[:] = -1
+        self.winners[:] = -1
+        self.playInFeeds[:] = -1
+
+        isPlayIn = playInMask(masterTemp)
+        playInGames = masterTemp[isPlayIn] #the games that are not part of the 63 "regular" tourney games
+        playInGames = playInGames.sort_values(by = ['WSection', 'WNumSeed']) #play in games go at the end in this order
+
+        nonPlayInGames = masterTemp[~isPlayIn] #all other games are "regular" 63 games
+
+        if playInGames.shape[0] > self.teams.shape[0] - topology.nGames:
+            raise ValueError('too many play in games: ' + str(playInGames.shape[0]))
+        self.nPlayIns = playInGames.shape[0]
+
+        #put the play in games at the end and point the first round game they feed at them
+        for i, (section, WSeed, WTeam, LTeam) in enumerate(zip(playInGames['WSection'], playInGames['WNumSeed'], playInGames['WTeamID'], playInGames['LTeamID'])):
+            game = topology.nGames + i
+            self.teams[game, 0] = WTeam
+            self.teams[game, 1] = LTeam
+            count, side = topology.firstRoundSlots[(section, int(WSeed))]
+            self.playInFeeds[count, side] = game
+
+        #fill in the first round non play in games based on section and seed
+        for WSection, LSection, WSeed, LSeed, WTeam, LTeam in zip(nonPlayInGames['WSection'], nonPlayInGames['LSection'], nonPlayInGames['WNumSeed'], nonPlayInGames['LNumSeed'], nonPlayInGames['WTeamID'], nonPlayInGames['LTeamID']):
+            if WSection != LSection: #final four and championship games are never first round games
+                continue
+            count = topology.firstRoundGame(WSection, int(WSeed), int(LSeed))
+            if count is None: #not a first round game
+                continue
+            if WSeed < LSeed: #team A is the better seed
+                teamA, teamB = WTeam, LTeam
+            else:
+                teamA, teamB = LTeam, WTeam
+            if self.playInFeeds[count, 0] < 0: #as long as there was no play in game for team A spot
+                self.teams[count, 0] = teamA
+            if self.playInFeeds[count, 1] < 0:
+                self.teams[count, 1] = teamB
+
+        if ((self.teams[:32] < 0) & (self.playInFeeds < 0)).any():
+            raise ValueError('incomplete bracket')
+
+    #function that plays every game of the loaded tournament with evalFn, each game after the games that feed it
+    #inputs:
+    #   evalFn: the function to be used to determine the winner of the games (see models.py)
+    #   refDF: the data frame that contains stats for all the teams (to be used by the evalFn)
+    #   rng: numpy Generator for breaking ties, handed to evalFn if it takes an rng argument and used to seed numpy's global RNG if it does not
+    #        (default None leaves evalFn on numpy's global RNG)
+    #output:
+    #   a list of the winner of each game (the 63 regular games, then the play in games)
+    def simulate(self, evalFn, refDF, rng = None):
+        takesRNG = rng is not None and acceptsRNG(evalFn) #checked before wrapping, since the timing wrapper takes any arguments
+        evalFn = instrument.wrapEvalFn(evalFn) #counts and times every call while instrumentation is on
+        if takesRNG:
+            evalFn = functools.partial(evalFn, rng = rng)
+        elif rng is not None:
+            seedGlobalRNG(rng)
+
+        #work on plain lists (numpy scalar access is slow game by game) and copy the results back into the buffers at the end
+        teams = self.teams.tolist()
+        winners = self.winners.tolist()
+        playInFeeds = self.playInFeeds.tolist()
+        priorA = topology.priorList[0]
+        priorB = topology.priorList[1]
+
+        for game in topology.evalOrder:
+            if game < 32:
+                for side in (0, 1):
+                    feed = playInFeeds[game][side]
+                    if feed >= 0: #play the play in game first to decide this side
+                        winners[feed] = evalFn(teams[feed][0], teams[feed][1], refDF)
+                        teams[game][side] = winners[feed]
+            else:
+                teams[game][0] = winners[priorA[game]]
+                teams[game][1] = winners[priorB[game]]
+            winners[game] = evalFn(teams[game][0], teams[game][1], refDF)
+
+        self.teams[:] = teams
+        self.winners[:] = winners
+
+        return winners[:topology.nGames + self.nPlayIns]
+
+yearRowsCache = {} #id of a DF -> dictionary of year -> that year's rows
+
+#function that returns the rows of a DF for one year, keeping them so repeated simulations and backtests get back the same DF
+#(so the teamFeatures built from it, see getTeamFeatures in models.py, and matchups cached on it are reused instead of worked out again)
+#DFs are treated as read-only; the kept rows are dropped when the DF itself is garbage collected
+#inputs:
+#   df: a DF with a Season column
+#   year: the year
+#output:
+#   the rows of df for that year
+def yearRows(df, year):
+    key = id(df)
+    years = yearRowsCache.get(key)
+    if years is None:
+        years = yearRowsCache[key] = {}
+        weakref.finalize(df, yearRowsCache.pop, key, None)
+
+    rows = years.get(year)
+    if rows is None:
+        rows = years[year] = df[df['Season'] == year]
+    return rows
+
 #function that simulates a full tournament based on the actual teams that played in the tournament as well as a particular evalFn for picking winners
 #inputs:
 #   year: the year to be simulated
 #   evalFn: the function to be used to determine the winner of the games (see models.py)
 #   refDF: the data frame that contains stats for all the teams
+#   bracket: a tourneyBracket to reuse for the simulation (default None creates a new one)
+#   rng: seed or numpy Generator used by evalFn to break ties (default None uses numpy's global RNG)
 #output:
 #   outList: a list containing the teamID of each victorious team in the tournament; will be the length of the number of games in the tournament
-def tourneySim(year, evalFn, refDF):
-    masterTemp = refDF[:]
+def tourneySim(year, evalFn, refDF, bracket = None, rng = None):
+    with instrument.stage('tourneySim load'):
+        masterTemp = yearRows(refDF, year) #subset by year
 
-    matchups = [generateMatchups(1), generateMatchups(2), generateMatchups(3), generateMatchups(4)] #combinations of seeds that can play in each of the first four rounds
+        if bracket is None:
+            bracket = tourneyBracket()
+        bracket.load(masterTemp)
 
-    masterTemp = masterTemp[masterTemp['Season'] == year] #subset by year
-    
-    tourney = tourneyNet(evalFn, masterTemp)
+    with instrument.stage('tourneySim simulate'):
+        outList = bracket.simulate(evalFn, masterTemp, rng = None if rng is None else makeRNG(rng))
+    return outList
 
-    playInGames = masterTemp[(masterTemp['WNumSeed'] != round(masterTemp['WNumSeed'])) & (masterTemp['LNumSeed'] != round(masterTemp['LNumSeed']))] #the games that are not part of the 63 "regular" tourney games
-    playInGames.sort_values(by = ['WSection', 'WNumSeed'], inplace = True) #sort for easy comparison later
-    playInGames.reset_index(inplace = True)
+#function to output the actual winners of the tournament for a particular year in the same order as the tourneySim function (for comparison, to determine accuracy)
+def tourneyActual(year, compactDF):
+    masterTemp = yearRows(compactDF, year)
 
-    nonPlayInGames = masterTemp[(masterTemp['WNumSeed'] == round(masterTemp['WNumSeed'])) | (masterTemp['LNumSeed'] == round(masterTemp['LNumSeed']))] #all other games are "regular" 63 games
-    nonPlayInGames.reset_index(inplace = True)
+    isPlayIn = playInMask(masterTemp)
+    playInGames = masterTemp[isPlayIn]
+    playInGames = playInGames.sort_values(by = ['WSection', 'WNumSeed']) #sort play in games by same criteria as above
 
-    sectionDict = {'W': 0, 'X': 8, 'Y': 16, 'Z': 24} #dictionary that contains index of each section's games (e.g. section X games start at position 8 in the tourney net)
+    nonPlayInGames = masterTemp[~isPlayIn]
 
-    #loop to add the play in games to the end of the tourney net
-    for i in range(playInGames.shape[0]):
-        count = sectionDict[playInGames.loc[i, 'WSection']]
-        tourney.net.append(tourneyGame(evalFn, masterTemp, teamA = playInGames.loc[i, 'WTeamID'], teamB = playInGames.loc[i, 'LTeamID']))
-        
-        #loop to connect the appropriate first round games to the play in game object just created
-        for j in range(len(matchups[0])):
-            if int(playInGames.loc[i, 'WNumSeed']) == matchups[0][j][0]:
-                tourney.net[count].priorGameA = tourney.net[-1]
-                break
-            if int(playInGames.loc[i, 'WNumSeed']) == matchups[0][j][1]:
-                tourney.net[count].priorGameB = tourney.net[-1]
-                break
-            count += 1
-
-    #loop to fill in the first round non play in games based on section and seed (other rounds already connected)
-    for i in range(nonPlayInGames.shape[0]):
-        count = sectionDict[nonPlayInGames.loc[i, 'WSection']] #look up the index for the section
-        firstRoundTestVar = [int(nonPlayInGames.loc[i, 'WNumSeed']), int(nonPlayInGames.loc[i, 'LNumSeed'])] #the test var is the seeds of the teams
-
-        for j in range(len(matchups[0])):
-            if matchups[0][j] == firstRoundTestVar or list(reversed(matchups[0][j])) == firstRoundTestVar: #if the test var matches a member of the first round matchups it is a first round game
-                winnerBetterSeedBool = nonPlayInGames.loc[i, 'WNumSeed'] < nonPlayInGames.loc[i, 'LNumSeed'] #T/F whether the winner of the game had a higher seed (for indexing)
-                if winnerBetterSeedBool:
-                    if tourney.net[count].priorGameA is None: #as long as there was no play in game for team A spot
-                        tourney.net[count].teamA = nonPlayInGames.loc[i, 'WTeamID'] #slot in the winning team for team A (team A is higher seed)
-                    if tourney.net[count].priorGameB is None: 
-                        tourney.net[count].teamB = nonPlayInGames.loc[i, 'LTeamID'] #same for team B
-                    break
-                else: #if the winner had the lower seed, switch it around
-                    if tourney.net[count].priorGameA is None:
-                        tourney.net[count].teamA = nonPlayInGames.loc[i, 'LTeamID']
-                    if tourney.net[count].priorGameB is None:
-                        tourney.net[count].teamB = nonPlayInGames.loc[i, 'WTeamID']
-                    break
-            count += 1
-
-    outList = tourney.simulate() #trigger the recursive evaluation of the network
-    return outList
+    out = [0] * topology.nGames
 
-#function to output the actual winners of the tournament for a particular year in the same order as the tourneySim function (for comparison, to determine accuracy)
-def tourneyActual(year, compactDF):
-    masterTemp = compactDF[:]
-
-    matchups = [generateMatchups(1), generateMatchups(2), generateMatchups(3), generateMatchups(4)]
-
-    masterTemp = masterTemp[masterTemp['Season'] == year]
-
-    playInGames = masterTemp[(masterTemp['WNumSeed'] != round(masterTemp['WNumSeed'])) & (masterTemp['LNumSeed'] != round(masterTemp['LNumSeed']))]
-    playInGames.sort_values(by = ['WSection', 'WNumSeed'], inplace = True) #sort play in games by same criteria as above
-    playInGames.reset_index(inplace = True)
-
-    nonPlayInGames = masterTemp[(masterTemp['WNumSeed'] == round(masterTemp['WNumSeed'])) | (masterTemp['LNumSeed'] == round(masterTemp['LNumSeed']))]
-    nonPlayInGames.reset_index(inplace = True)
-
-    roundIndList = [0, 32, 48, 56] #index for the first game of each round
-    roundSectionMultiplierList = [8, 4, 2, 1] #multiplier for each section by round
-    matchupsDivisorList = [1, 4, 16, 64] #need to divide the matchups count by a number for each round later
-    sectionDict = {'W': 0, 'X': 1, 'Y': 2, 'Z': 3} #key for each section within each round
-
-    out = [0] * 63
-
-    #loop that gets winner of each game in correct order
-    for i in range(nonPlayInGames.shape[0]):
-        if nonPlayInGames.loc[i, 'DayNum'] == 152 and (nonPlayInGames.loc[i, 'WSection'] == 'W' or nonPlayInGames.loc[i, 'WSection'] == 'X'): #this would be a final four game
-            index = 60
-        elif nonPlayInGames.loc[i, 'DayNum'] == 152 and (nonPlayInGames.loc[i, 'WSection'] == 'Y' or nonPlayInGames.loc[i, 'WSection'] == 'Z'): #final four game
-            index = 61
-        elif nonPlayInGames.loc[i, 'DayNum'] == 154: #championship game
-            index = 62
-        else: #otherwise it is a game in the first four rounds
-            testVar = [int(nonPlayInGames.loc[i, 'WNumSeed']), int(nonPlayInGames.loc[i, 'LNumSeed'])] #get seeds of teams in the game
-
-            breakFlag = False
-            for j in range(len(matchups)): #iterate through the four rounds of matchup
-                for k in range(len(matchups[j])): #iterate over each of the possible seeds for each round
-                    if matchups[j][k] == testVar or list(reversed(matchups[j][k])) == testVar: #if our game matches the matchup
-                        roundNum = j #this is the round of our game
-                        gameNum = k #this is the game index of our game (how many from the first game of the round on the bracket)
-                        breakFlag = True 
-                        break
-                if breakFlag:
-                    break
-            
-            roundInd = roundIndList[roundNum] #get the index of the start of the correct round for this game
-            roundSectionMultiplier = roundSectionMultiplierList[roundNum] #get the multiplier for the correct round and the correct section
-            matchupsDivisor = matchupsDivisorList[roundNum] #will need this for game indexing
-            sectionNum = sectionDict[nonPlayInGames.loc[i, 'WSection']]
-
-            index = roundInd + (roundSectionMultiplier * sectionNum) + int(gameNum / matchupsDivisor) #index of the game in the network
-
-        out[index] = nonPlayInGames.loc[i, 'WTeamID'] #put the winning team in the list at this point
-    
-    for i in range(playInGames.shape[0]):
-        out.append(playInGames.loc[i, 'WTeamID']) #add the play in games to the end in order
+    #loop that puts the winner of each game in its place in the tourney net
+    for dayNum, section, WSeed, LSeed, WTeam in zip(nonPlayInGames['DayNum'], nonPlayInGames['WSection'], nonPlayInGames['WNumSeed'], nonPlayInGames['LNumSeed'], nonPlayInGames['WTeamID']):
+        out[topology.gameIndex(dayNum, section, int(WSeed), int(LSeed))] = WTeam
+
+    out.extend(playInGames['WTeamID']) #add the play in games to the end in order
 
     return out
 
@@ -206,18 +358,382 @@ def tourneyActual(year, compactDF):
 #   evalFn: the function to be used to determine the winner of the games (see models.py)
 #   compactDF: the compact tourney results DF (only need compact for game winners)
 #   refDF: the DF containing stats for all the teams (default value: None)
-def tourneySimVsActual(yearsList, evalFn, compactDF, refDF = None):
+#   rng: seed or numpy Generator; every year gets its own child stream for breaking ties (default None uses numpy's global RNG)
+#   report: True prints a summary of where the time went (stage timers and evalFn calls, see instrument.py), a path writes it as json (default None)
+def tourneySimVsActual(yearsList, evalFn, compactDF, refDF = None, rng = None, report = None):
     if refDF is None:
         refDF = compactDF #use compact if no refDF given
 
     simResults = []
     actualResults = []
+    bracket = tourneyBracket() #one bracket reused for every year
+    yearSeeds = [None] * len(yearsList) if rng is None else spawnSeeds(makeRNG(rng), len(yearsList))
 
-    for i in yearsList:
-        simResults = simResults + tourneySim(i, evalFn, refDF) #append the results of our simulated tournament for a particular year
-        actualResults = actualResults + tourneyActual(i, compactDF) #append the actual results for that year
+    with instrument.recording(report):
+        for i, yearSeed in zip(yearsList, yearSeeds):
+            with instrument.stage('tourneySim'):
+                simResults.extend(tourneySim(i, evalFn, refDF, bracket = bracket, rng = yearSeed)) #append the results of our simulated tournament for a particular year
+            with instrument.stage('tourneyActual'):
+                actualResults.extend(tourneyActual(i, compactDF)) #append the actual results for that year
 
     simMatchEqual = [x == y for x, y in zip(simResults, actualResults)] #list with True where the predicted winner is the same as the actual winner
     accuracy = sum(simMatchEqual) / len(simMatchEqual) #accuracy is ratio of correct predictions
 
-    return accuracy
\ No newline at end of file
+    return accuracy
+
+#### parallel backtesting ####
+
+gameRoundNames = ['R64'] * 32 + ['R32'] * 16 + ['S16'] * 8 + ['E8'] * 4 + ['F4'] * 2 + ['Final'] #round of each of the 63 games in the tourney net order (play in games follow)
+roundOrder = ['PlayIn', 'R64', 'R32', 'S16', 'E8', 'F4', 'Final'] #rounds in playing order
+roundStartDays = [136, 138, 143, 145, 147, 153] #first DayNum of each round after the play in games (the tourney net's DayNum schedule)
+
+#function that puts the evalFns given to a backtest in a list along with a name for each
+#input:
+#   evalFns: a single evalFn, a list of them, or a dictionary of name -> evalFn
+#output:
+#   [names, evalFns]: the list of names and the list of evalFns in the same order
+#(two evalFns with the same name, e.g. an evalFn and a cachedEvalFn wrapping it, raise a ValueError, since their results would be filed under one name; pass a dictionary to name them)
+def evalFnNames(evalFns):
+    if isinstance(evalFns, dict):
+        return [list(evalFns.keys()), list(evalFns.values())]
+
+    if not isinstance(evalFns, (list, tuple)):
+        evalFns = [evalFns]
+    names = [getattr(x, '__name__', 'evalFn' + str(i)) for i, x in enumerate(evalFns)]
+
+    duplicates = sorted(set(x for x in names if names.count(x) > 1))
+    if len(duplicates) > 0:
+        raise ValueError('evalFns with the same name: ' + ', '.join(duplicates) + ' (pass a dictionary of name -> evalFn to tell them apart)')
+
+    return [names, list(evalFns)]
+
+#function that runs a single year of a backtest for a single evalFn; kept at module level so it can be sent to worker processes
+#input:
+#   task: a list holding the year, the evalFn, that year's rows of refDF and compactDF, and the np.random.SeedSequence of the stream used to break ties
+#output:
+#   a list holding the simulated winners, the actual winners for the year, and the (key, result) pairs a cachedEvalFn added to its cache (empty for other evalFns)
+def backtestYear(task):
+    year, evalFn, refDF, compactDF, seed = task
+    cache = evalFn.cache if isinstance(evalFn, cachedEvalFn) else None
+    if cache is not None:
+        cache.startRecording()
+    simResults = tourneySim(year, evalFn, refDF, rng = makeRNG(seed)) #every task has its own stream, so results do not depend on which worker runs it or in what order
+    newMatchups = [] if cache is None else cache.takeRecorded()
+    return [simResults, tourneyActual(year, compactDF), newMatchups]
+
+#function that compares simulated tournaments with the true results for several evalFns over many years, running the (year, evalFn) pairs in parallel
+#inputs:
+#   yearsList: a list of years to compare games within
+#   evalFns: a single evalFn, a list of them, or a dictionary of name -> evalFn (see models.py)
+#   compactDF: the compact tourney results DF (only need compact for game winners)
+#   refDF: the DF containing stats for all the teams (default value: None, which uses compactDF)
+#   processes: number of worker processes (default None uses every core; 1 runs everything in this process)
+#   seed: seed (or numpy Generator) used to spawn an independent random stream for every (year, evalFn) pair (default None)
+#output:
+#   [accuracy, yearDF, roundDF]:
+#       accuracy: series of the overall accuracy of each evalFn (the number tourneySimVsActual returns)
+#       yearDF: data frame of accuracy by year (rows) and evalFn (columns)
+#       roundDF: data frame of accuracy by round (rows) and evalFn (columns)
+def tourneyBacktest(yearsList, evalFns, compactDF, refDF = None, processes = None, seed = None):
+    if refDF is None:
+        refDF = compactDF #use compact if no refDF given
+
+    names, evalFns = evalFnNames(evalFns)
+
+    #each worker only gets the rows for its own year
+    refYears = {year: yearRows(refDF, year) for year in yearsList}
+    compactYears = {year: yearRows(compactDF, year) for year in yearsList}
+
+    taskSeeds = spawnSeeds(seed, len(evalFns) * len(yearsList))
+    tasks = []
+    taskNames = []
+    for i in range(len(evalFns)):
+        for j, year in enumerate(yearsList):
+            tasks.append([year, evalFns[i], refYears[year], compactYears[year], taskSeeds[i * len(yearsList) + j]])
+            taskNames.append(names[i])
+
+    if processes == 1:
+        results = [backtestYear(x) for x in tasks]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers = processes) as executor:
+            results = list(executor.map(backtestYear, tasks))
+
+        #the workers fill their own caches, so the results they worked out are added to the cache of each cachedEvalFn here
+        for task, (_, _, newMatchups) in zip(tasks, results):
+            for key, prob in newMatchups:
+                task[1].cache.put(key, prob)
+
+    #collect the correct / total games by evalFn, year and round
+    rows = []
+    for task, name, (simResults, actualResults, _) in zip(tasks, taskNames, results):
+        for k, (x, y) in enumerate(zip(simResults, actualResults)):
+            rows.append([name, task[0], gameRoundNames[k] if k < 63 else 'PlayIn', x == y])
+    gamesDF = pd.DataFrame(rows, columns = ['evalFn', 'Season', 'Round', 'correct'])
+
+    accuracy = gamesDF.groupby('evalFn', sort = False)['correct'].mean()[names]
+    yearDF = gamesDF.pivot_table(index = 'Season', columns = 'evalFn', values = 'correct', aggfunc = 'mean')[names]
+    roundDF = gamesDF.pivot_table(index = 'Round', columns = 'evalFn', values = 'correct', aggfunc = 'mean')[names]
+    roundDF = roundDF.reindex([x for x in roundOrder if x in roundDF.index]) #rounds in playing order
+
+    return [accuracy, yearDF, roundDF]
+
+#### probabilistic backtesting ####
+
+#these functions score the probability each evalFn gives to the actual result of every historical game (the log loss the Kaggle competition is scored on)
+#instead of walking the bracket; logistic models and stat comparisons are scored for every game of every year at once (see predictMatchups in models.py)
+
+#function that lists the historical tournament games of a set of years with the lower team id as team A (the orientation of a Kaggle submission)
+#inputs:
+#   yearsList: a list of years to take games from
+#   compactDF: the compact tourney results DF (masterCompact / masterDetailed)
+#output:
+#   gamesDF: a data frame with one row per game holding Season, DayNum, Round (see gameRounds), TeamA, TeamB, AWins (1 if team A won),
+#            and SeedGap (difference between the two teams' seed lines, 0 for play in games)
+def historicalGames(yearsList, compactDF):
+    masterTemp = compactDF[compactDF['Season'].isin(yearsList)]
+
+    WTeam = np.asarray(masterTemp['WTeamID'], dtype = np.int64)
+    LTeam = np.asarray(masterTemp['LTeamID'], dtype = np.int64)
+    dayNums = np.asarray(masterTemp['DayNum'], dtype = np.int64)
+    seedGap = np.abs(np.floor(np.asarray(masterTemp['WNumSeed'], dtype = np.float64)) - np.floor(np.asarray(masterTemp['LNumSeed'], dtype = np.float64))).astype(np.int64) #play in seeds (e.g. 16.1) count as their seed line
+
+    gamesDF = pd.DataFrame({'Season': np.asarray(masterTemp['Season'], dtype = np.int64), 'DayNum': dayNums, 'Round': gameRounds(dayNums),
+                            'TeamA': np.minimum(WTeam, LTeam), 'TeamB': np.maximum(WTeam, LTeam), 'AWins': (WTeam < LTeam).astype(np.int64), 'SeedGap': seedGap})
+
+    return gamesDF.reset_index(drop = True)
+
+#function that finds the round of tournament games from their DayNum
+#input:
+#   dayNums: array of DayNum values
+#output:
+#   array of round names from roundOrder
+def gameRounds(dayNums):
+    return np.array(roundOrder, dtype = object)[np.searchsorted(roundStartDays, np.asarray(dayNums), side = 'right')]
+
+#function that gives P(team A wins) for each game in gamesDF
+#evalFns with batched prediction are scored in one call; any other evalFn is called game by game on its season's rows of refDF and gives 1 or 0 for the team it picks
+#inputs:
+#   evalFn: the evaluation function
+#   gamesDF: games from historicalGames
+#   refDF: the DF containing stats for all the teams
+#   rng: numpy Generator passed on to evalFns that break ties themselves, or used to seed numpy's global RNG for evalFns without an rng argument
+#        (default None uses numpy's global RNG)
+#output:
+#   probs: array holding P(team A wins) for each game
+def gameProbabilities(evalFn, gamesDF, refDF, rng = None):
+    if hasBatchedPrediction(evalFn):
+        return predictMatchups(evalFn, gamesDF['Season'].to_numpy(), gamesDF['TeamA'].to_numpy(), gamesDF['TeamB'].to_numpy(), refDF)
+
+    if rng is not None and not acceptsRNG(evalFn):
+        seedGlobalRNG(rng)
+        rng = None
+
+    probs = np.zeros(gamesDF.shape[0])
+    refSeasons = np.asarray(refDF['Season'], dtype = np.int64)
+    for season in np.unique(gamesDF['Season'].to_numpy()).tolist():
+        refYear = refDF[refSeasons == season] #the evalFns look teams up without a season, so each one only sees its own year
+        rows = np.flatnonzero(gamesDF['Season'].to_numpy() == season)
+        for i, teamA, teamB in zip(rows.tolist(), gamesDF['TeamA'].to_numpy()[rows].tolist(), gamesDF['TeamB'].to_numpy()[rows].tolist()):
+            probs[i] = winProbability(evalFn, teamA, teamB, refYear, rng = rng)
+
+    return probs
+
+#function that scores predicted probabilities against the actual results
+#inputs:
+#   probs: array of P(team A wins)
+#   outcomes: array holding 1 where team A won and 0 where it lost
+#   eps: probabilities are clipped to [eps, 1 - eps] so a confident miss costs a large but finite log loss (default 1e-15)
+#output:
+#   [logLoss, brier, accuracy]: mean log loss, mean squared error of the probabilities, and the share of games picked correctly (a 0.5 counts as half right)
+def probabilityScores(probs, outcomes, eps = 1e-15):
+    probs = np.asarray(probs, dtype = np.float64)
+    outcomes = np.asarray(outcomes, dtype = np.float64)
+
+    clipped = np.clip(probs, eps, 1 - eps)
+    logLoss = -np.mean(outcomes * np.log(clipped) + (1 - outcomes) * np.log(1 - clipped))
+    brier = np.mean((probs - outcomes) ** 2)
+    accuracy = np.mean(np.where(probs == 0.5, 0.5, (probs > 0.5) == (outcomes == 1)))
+
+    return [logLoss, brier, accuracy]
+
+#function that groups predicted probabilities into equal width bins and compares each bin's mean prediction with how often team A actually won
+#inputs:
+#   probs: array of P(team A wins)
+#   outcomes: array holding 1 where team A won and 0 where it lost
+#   nBins: number of bins between 0 and 1 (default 10)
+#output:
+#   calibrationDF: a data frame indexed by bin with the bin's lower and upper edges, the number of games, the mean prediction, and the actual win rate (empty bins are left out)
+def calibrationBins(probs, outcomes, nBins = 10):
+    probs = np.asarray(probs, dtype = np.float64)
+    outcomes = np.asarray(outcomes, dtype = np.float64)
+
+    bins = np.minimum((probs * nBins).astype(np.int64), nBins - 1) #a probability of exactly 1 goes in the top bin
+    games = np.bincount(bins, minlength = nBins)
+    predSums = np.bincount(bins, weights = probs, minlength = nBins)
+    winSums = np.bincount(bins, weights = outcomes, minlength = nBins)
+
+    used = games > 0
+    calibrationDF = pd.DataFrame({'Lower': np.arange(nBins) / nBins, 'Upper': np.arange(1, nBins + 1) / nBins, 'Games': games,
+                                  'MeanPred': predSums / np.maximum(games, 1), 'WinRate': winSums / np.maximum(games, 1)})[used]
+    calibrationDF.index.name = 'Bin'
+
+    return calibrationDF
+
+#function that scores the win probabilities of several evalFns over the historical tournament games of many years
+#inputs:
+#   yearsList: a list of years to score games within
+#   evalFns: a single evalFn, a list of them, or a dictionary of name -> evalFn (see models.py)
+#   compactDF: the compact tourney results DF (masterCompact / masterDetailed)
+#   refDF: the DF containing stats for all the teams (default value: None, which uses compactDF)
+#   nBins: number of calibration bins (default 10)
+#   eps: clipping used for the log loss (default 1e-15)
+#   seed: seed or numpy Generator for evalFns without batched prediction that break ties themselves (default None uses numpy's global RNG)
+#output:
+#   [scoresDF, yearDF, calibrationDF]:
+#       scoresDF: data frame indexed by evalFn with the number of games, LogLoss, Brier, and Accuracy
+#       yearDF: data frame of log loss by year (rows) and evalFn (columns)
+#       calibrationDF: data frame of the calibration bins of each evalFn (indexed by evalFn and bin, see calibrationBins)
+def tourneyProbBacktest(yearsList, evalFns, compactDF, refDF = None, nBins = 10, eps = 1e-15, seed = None):
+    if refDF is None:
+        refDF = compactDF #use compact if no refDF given
+
+    names, evalFns = evalFnNames(evalFns)
+    gamesDF = historicalGames(yearsList, compactDF)
+    outcomes = gamesDF['AWins'].to_numpy()
+    rngs = [None] * len(evalFns) if seed is None else [makeRNG(x) for x in spawnSeeds(seed, len(evalFns))]
+
+    scores = []
+    yearLoss = {}
+    calibrations = []
+    for name, evalFn, rng in zip(names, evalFns, rngs):
+        probs = gameProbabilities(evalFn, gamesDF, refDF, rng = rng)
+        scores.append([gamesDF.shape[0]] + probabilityScores(probs, outcomes, eps = eps))
+
+        clipped = np.clip(probs, eps, 1 - eps)
+        gameLoss = -(outcomes * np.log(clipped) + (1 - outcomes) * np.log(1 - clipped))
+        yearLoss[name] = pd.Series(gameLoss).groupby(gamesDF['Season']).mean()
+        calibrations.append(calibrationBins(probs, outcomes, nBins = nBins))
+
+    scoresDF = pd.DataFrame(scores, index = pd.Index(names, name = 'evalFn'), columns = ['Games', 'LogLoss', 'Brier', 'Accuracy'])
+    yearDF = pd.DataFrame(yearLoss)[names]
+    calibrationDF = pd.concat(calibrations, keys = names, names = ['evalFn', 'Bin'])
+
+    return [scoresDF, yearDF, calibrationDF]
+
+#### game level backtesting ####
+
+#function that scores the pick each evalFn makes for the actual matchups of every historical tournament game, without simulating the bracket
+#every game is judged on the two teams that really played it, so one wrong pick does not carry into later rounds the way it does in tourneyBacktest
+#inputs:
+#   yearsList: a list of years to score games within
+#   evalFns: a single evalFn, a list of them, or a dictionary of name -> evalFn (see models.py)
+#   compactDF: the compact tourney results DF (masterCompact / masterDetailed)
+#   refDF: the DF containing stats for all the teams (default value: None, which uses compactDF)
+#   seed: seed or numpy Generator for evalFns without batched prediction that break ties themselves (default None uses numpy's global RNG)
+#output:
+#   [accuracy, yearDF, roundDF, seedGapDF]:
+#       accuracy: series of the overall accuracy of each evalFn (a tie the RNG would decide counts as half right)
+#       yearDF: data frame of accuracy by year (rows) and evalFn (columns)
+#       roundDF: data frame of accuracy by round (rows) and evalFn (columns), with the number of games in each round
+#       seedGapDF: data frame of accuracy by seed gap (rows) and evalFn (columns), with the number of games with each seed gap
+def tourneyGameBacktest(yearsList, evalFns, compactDF, refDF = None, seed = None):
+    if refDF is None:
+        refDF = compactDF #use compact if no refDF given
+
+    names, evalFns = evalFnNames(evalFns)
+    gamesDF = historicalGames(yearsList, compactDF)
+    outcomes = gamesDF['AWins'].to_numpy()
+    rngs = [None] * len(evalFns) if seed is None else [makeRNG(x) for x in spawnSeeds(seed, len(evalFns))]
+
+    correctDF = pd.DataFrame(index = gamesDF.index)
+    for name, evalFn, rng in zip(names, evalFns, rngs):
+        probs = gameProbabilities(evalFn, gamesDF, refDF, rng = rng)
+        correctDF[name] = np.where(probs == 0.5, 0.5, (probs > 0.5) == (outcomes == 1))
+
+    accuracy = correctDF.mean()
+    yearDF = correctDF.groupby(gamesDF['Season']).mean()
+
+    roundDF = correctDF.groupby(gamesDF['Round']).mean()
+    roundDF.insert(0, 'Games', gamesDF.groupby('Round').size())
+    roundDF = roundDF.reindex([x for x in roundOrder if x in roundDF.index]) #rounds in playing order
+
+    seedGapDF = correctDF.groupby(gamesDF['SeedGap']).mean()
+    seedGapDF.insert(0, 'Games', gamesDF.groupby('SeedGap').size())
+
+    return [accuracy, yearDF, roundDF, seedGapDF]
+
+#### monte carlo simulation ####
+
+roundNames = ['R64', 'R32', 'S16', 'E8', 'F4', 'Final', 'Champion'] #rounds reached, from making the round of 64 to winning the title
+
+#function that lays out the field of a past tournament in bracket order (the same order the tourney net uses for its first round games)
+#inputs:
+#   year: the year of the tournament
+#   refDF: a master DF (masterCompact / masterDetailed) holding that year's tournament games
+#output:
+#   field: a list of the 64 first round slots, each a list holding one team id, or two for a slot decided by a play in game
+def tourneyField(year, refDF):
+    masterTemp = refDF[refDF['Season'] == year]
+
+    #every team in the tournament with its section and seed (from either side of any of its games)
+    teams = pd.concat([pd.DataFrame({'TeamID': np.asarray(masterTemp[x + 'TeamID'], dtype = np.int64), 'Section': masterTemp[x + 'Section'].to_numpy(), 'NumSeed': masterTemp[x + 'NumSeed'].to_numpy()}) for x in ['W', 'L']])
+    teams = teams.drop_duplicates('TeamID').sort_values(by = 'NumSeed', kind = 'stable') #play in teams ordered a before b
+
+    field = [[] for _ in range(64)]
+    for team, section, numSeed in zip(teams['TeamID'].tolist(), teams['Section'].tolist(), teams['NumSeed'].tolist()):
+        game, side = topology.firstRoundSlots[(section, int(numSeed))]
+        field[2 * game + side].append(team)
+
+    if any(len(x) == 0 for x in field):
+        raise ValueError('incomplete bracket for ' + str(year))
+
+    return field
+
+#function that simulates many tournaments at once (round by round as array operations) and finds how often each team reaches each round
+#inputs:
+#   field: the 64 first round slots in bracket order (see tourneyField)
+#   teams: array of the team ids that index the rows and columns of probMatrix (must include every team in field)
+#   probMatrix: win probabilities, where probMatrix[i, j] is P(teams[i] beats teams[j]) (see winProbMatrix in models.py)
+#   nSims: number of tournaments to simulate
+#   seed: seed or numpy Generator for the simulations (default None)
+#   chunkSize: number of tournaments simulated together (bounds memory use; default 100000)
+#output:
+#   outDF: a data frame indexed by team id with the probability of reaching each round in roundNames
+def monteCarloTourney(field, teams, probMatrix, nSims, seed = None, chunkSize = 100000):
+    rng = makeRNG(seed)
+    teams = np.asarray(teams, dtype = np.int64)
+    nTeams = teams.shape[0]
+    teamInd = {x: i for i, x in enumerate(teams.tolist())}
+    flatProbs = np.asarray(probMatrix, dtype = np.float32).ravel() #flat lookups are faster than 2-D fancy indexing
+
+    slotTeams = np.array([teamInd[x[0]] for x in field], dtype = np.int64) #team in each slot (team a for play in slots)
+    playInSlots = [i for i, x in enumerate(field) if len(x) == 2]
+    playInTeamsB = np.array([teamInd[field[i][1]] for i in playInSlots], dtype = np.int64)
+
+    counts = np.zeros((nTeams, len(roundNames)))
+
+    done = 0
+    while done < nSims:
+        n = min(chunkSize, nSims - done)
+        alive = np.tile(slotTeams, (n, 1)) #one row per simulated tournament
+
+        #play in games decide who fills their slots
+        if len(playInSlots) > 0:
+            teamA = alive[:, playInSlots]
+            aWins = rng.random(teamA.shape, dtype = np.float32) < flatProbs[teamA * nTeams + playInTeamsB]
+            alive[:, playInSlots] = np.where(aWins, teamA, playInTeamsB)
+        counts[:, 0] += np.bincount(alive.ravel(), minlength = nTeams)
+
+        #each round pairs neighbouring slots and keeps the winners
+        for roundNum in range(1, len(roundNames)):
+            teamA = alive[:, 0::2]
+            teamB = alive[:, 1::2]
+            aWins = rng.random(teamA.shape, dtype = np.float32) < flatProbs[teamA * nTeams + teamB]
+            alive = np.where(aWins, teamA, teamB)
+            counts[:, roundNum] += np.bincount(alive.ravel(), minlength = nTeams)
+
+        done += n
+
+    outDF = pd.DataFrame(data = counts / nSims, index = pd.Index(teams, name = 'TeamID'), columns = roundNames)
+
+    return outDF
@@ -0,0 +1,213 @@
+#### initialize libraries ####
+import argparse
+import os
+import numpy as np
+import pandas as pd
+from seeding import makeRNG
+
+#### synthetic data ####
+
+#these functions write made up seasons in the same format as the Kaggle csv's data.py reads (MNCAATourneySeeds.csv, MNCAATourneyCompactResults.csv,
+#MRegularSeasonCompactResults.csv, MRegularSeasonDetailedResults.csv and MTeamConferences.csv), so the project can run without the download and
+#be stress tested at many times the real volume; point kaggleData in data.py at the output folder, e.g.:
+#   python synthetic.py ../SyntheticData --teams 3500 --seasons 35
+#   ds = data.kaggleData(dataDir = '../SyntheticData', generatedDir = '../SyntheticData')
+#every team has a hidden rating each season and the better rated team is more likely to win, so the stats carry some signal about the results
+
+sections = ['W', 'X', 'Y', 'Z']
+seedOrder = [1, 16, 8, 9, 5, 12, 4, 13, 6, 11, 3, 14, 7, 10, 2, 15] #seeds in first round bracket order within a section
+detailedItems = ['FGM', 'FGA', 'FGM3', 'FGA3', 'FTM', 'FTA', 'OR', 'DR', 'Ast', 'TO', 'Stl', 'Blk', 'PF'] #box score items of the detailed results
+roundDays = [[136, 137], [138, 139], [143, 144], [145, 146], [152, 152], [154, 154]] #DayNum of the first and second half of each round's games
+playInDay = 134
+
+#function that lists the seed lines (seed, section) that are decided by play in games
+#the first four are the lines the real tournament uses (two 16 seeds, an 11 and a 12), after which the remaining lines are used from the bottom seeds up
+#(up to 32 play in games this only reaches seeds 9 to 16, so every first round game has at most one play in winner)
+#input:
+#   playIns: number of play in games (0 to 32)
+#output:
+#   a list of (seed, section) pairs
+def playInLines(playIns):
+    lines = [(16, 'W'), (16, 'X'), (11, 'Y'), (12, 'Z')]
+    lines.extend([(seed, section) for seed in range(16, 0, -1) for section in sections if (seed, section) not in lines])
+    return lines[:playIns]
+
+#function that makes up box scores that add up to the given final scores
+#inputs:
+#   rng: numpy Generator
+#   scores: array of final scores
+#output:
+#   box: dictionary of box score item -> array of values (see detailedItems)
+def boxScores(rng, scores):
+    n = scores.shape[0]
+    FGM3 = rng.integers(2, 10, n)
+    FTM = np.minimum(rng.integers(5, 20, n), np.maximum(scores - 3 * FGM3, 0))
+    FGM3 = np.where(scores - 3 * FGM3 - FTM < 0, 0, FGM3)
+
+    twoPoints = scores - 3 * FGM3 - FTM
+    odd = twoPoints % 2 #an odd remainder becomes one more free throw
+    FTM = FTM + odd
+    FGM = (twoPoints - odd) // 2 + FGM3
+
+    box = {'FGM': FGM, 'FGA': FGM + rng.integers(15, 35, n), 'FGM3': FGM3, 'FGA3': FGM3 + rng.integers(5, 15, n), 'FTM': FTM, 'FTA': FTM + rng.integers(0, 9, n),
+           'OR': rng.integers(4, 18, n), 'DR': rng.integers(15, 32, n), 'Ast': rng.integers(6, 22, n), 'TO': rng.integers(6, 20, n), 'Stl': rng.integers(2, 12, n),
+           'Blk': rng.integers(0, 8, n), 'PF': rng.integers(10, 26, n)}
+    box['FGA3'] = np.minimum(box['FGA3'], box['FGA'])
+
+    return box
+
+#function that plays a set of games between teams with the given ratings
+#inputs:
+#   rng: numpy Generator
+#   ratings: array of each team's rating
+#   teamsA, teamsB: arrays of team positions (indexes of ratings) of the two teams in each game
+#   dayNums: DayNum of each game (or one DayNum for all of them)
+#   season: the season of the games
+#output:
+#   gamesDF: a data frame in the format of the compact results csv's (team positions in place of team ids)
+def playGames(rng, ratings, teamsA, teamsB, dayNums, season):
+    n = teamsA.shape[0]
+    aWins = rng.random(n) < 1 / (1 + np.exp(-(ratings[teamsA] - ratings[teamsB]) / 4))
+    LScore = rng.integers(45, 85, n)
+
+    gamesDF = pd.DataFrame({'Season': season, 'DayNum': dayNums, 'WTeamID': np.where(aWins, teamsA, teamsB), 'WScore': LScore + rng.integers(1, 25, n),
+                            'LTeamID': np.where(aWins, teamsB, teamsA), 'LScore': LScore, 'WLoc': rng.choice(['H', 'A', 'N'], n), 'NumOT': (rng.random(n) < 0.05).astype(np.int64)})
+
+    return gamesDF
+
+#function that makes up the tournament of one season: the top rated teams are seeded in order, play in games fill their lines and the bracket is played out
+#inputs:
+#   rng: numpy Generator
+#   ratings: array of each team's rating
+#   season: the season of the tournament
+#   playIns: number of play in games
+#output:
+#   [seedsDF, gamesDF]: the seeds and the tournament games (team positions in place of team ids)
+def playTournament(rng, ratings, season, playIns):
+    order = np.argsort(-ratings)[:(64 + playIns)] #the best teams get the best seeds
+
+    #seed lines in the order teams are given out: every 1 seed, then every 2 seed and so on (sections alternate direction like the real s-curve)
+    lines = [(seed, sections[j if seed % 2 == 1 else 3 - j]) for seed in range(1, 17) for j in range(4)]
+    playInSet = set(playInLines(playIns))
+
+    seedRows = []
+    slots = {}
+    pos = 0
+    for seed, section in lines:
+        if (seed, section) in playInSet:
+            slots[(seed, section)] = [order[pos], order[pos + 1]]
+            seedRows.append([season, section + '%02da' % seed, order[pos]])
+            seedRows.append([season, section + '%02db' % seed, order[pos + 1]])
+            pos += 2
+        else:
+            slots[(seed, section)] = [order[pos]]
+            seedRows.append([season, section + '%02d' % seed, order[pos]])
+            pos += 1
+
+    games = []
+    if playIns > 0:
+        playInList = [x for x in lines if x in playInSet] #play in lines in seeding order
+        playInDF = playGames(rng, ratings, np.array([slots[x][0] for x in playInList]), np.array([slots[x][1] for x in playInList]), playInDay, season)
+        playInDF['WLoc'] = 'N'
+        games.append(playInDF)
+        for x, winner in zip(playInList, playInDF['WTeamID'].tolist()):
+            slots[x] = [winner]
+
+    field = np.array([slots[(seed, section)][0] for section in sections for seed in seedOrder]) #the 64 teams in bracket order
+
+    for firstDay, secondDay in roundDays:
+        nGames = field.shape[0] // 2
+        dayNums = np.where(np.arange(nGames) < max(nGames // 2, 1), firstDay, secondDay) #the first half of the round's games are played on its first day
+        roundDF = playGames(rng, ratings, field[0::2], field[1::2], dayNums, season)
+        roundDF['WLoc'] = 'N'
+        games.append(roundDF)
+        field = roundDF['WTeamID'].to_numpy()
+
+    seedsDF = pd.DataFrame(seedRows, columns = ['Season', 'Seed', 'TeamID'])
+    gamesDF = pd.concat(games, ignore_index = True)
+
+    return [seedsDF, gamesDF]
+
+#function that writes a synthetic data set; seasons are generated and appended to the csv's one at a time, so memory use does not grow with the number of seasons
+#inputs:
+#   outDir: folder to write the csv's to (created if needed; existing files are replaced)
+#   teams: number of teams (at least 64 plus the number of play in games; default 350)
+#   gamesPerTeam: average number of regular season games each team plays (at least 1; every team plays at least one game; default 30)
+#   seasons: number of seasons (default 10)
+#   firstSeason: the first season (default 2003)
+#   playIns: number of play in games in each tournament (0 to 32; default 4, as in the real tournament since 2011)
+#   conferences: number of conferences (default 32)
+#   seed: seed or numpy Generator for all random choices (default 0)
+#output:
+#   paths: dictionary of csv name -> path of the written file
+def generate(outDir, teams = 350, gamesPerTeam = 30, seasons = 10, firstSeason = 2003, playIns = 4, conferences = 32, seed = 0):
+    if not 0 <= playIns <= 32: #up to 32 every first round game has at most one play in winner, as in the real tournament
+        raise ValueError('playIns must be between 0 and 32')
+    if gamesPerTeam < 1:
+        raise ValueError('gamesPerTeam must be at least 1, so every team has regular season stats')
+    if teams < 64 + playIns:
+        raise ValueError('at least ' + str(64 + playIns) + ' teams are needed for a tournament with ' + str(playIns) + ' play in games')
+
+    rng = makeRNG(seed)
+    teamIDs = np.arange(1101, 1101 + teams) #team ids start where the real ones do
+    baseRatings = rng.normal(0, 8, teams) #each team keeps some of its strength from season to season
+
+    os.makedirs(outDir, exist_ok = True)
+    names = ['MNCAATourneySeeds.csv', 'MNCAATourneyCompactResults.csv', 'MRegularSeasonCompactResults.csv', 'MRegularSeasonDetailedResults.csv', 'MTeamConferences.csv']
+    paths = {x: os.path.join(outDir, x) for x in names}
+
+    for i in range(seasons):
+        season = firstSeason + i
+        ratings = baseRatings + rng.normal(0, 3, teams)
+
+        conferencesDF = pd.DataFrame({'Season': season, 'TeamID': teamIDs, 'ConfAbbrev': ['conf' + str(x) for x in rng.integers(0, conferences, teams).tolist()]})
+
+        #regular season: a random pairing of every team (so each one has at least one game and a row of stats), then random pairs of different teams,
+        #all on random days before the tournament
+        matching = rng.permutation(teams)
+        if teams % 2 == 1: #the odd team out plays a random other team
+            matching = np.append(matching, matching[rng.integers(0, teams - 1)])
+        nExtra = max(teams * gamesPerTeam // 2 - matching.shape[0] // 2, 0)
+        extraA = rng.integers(0, teams, nExtra)
+        extraB = (extraA + rng.integers(1, teams, nExtra)) % teams
+        order = rng.permutation(matching.shape[0] // 2 + nExtra) #spread the pairing's games over the season
+        teamsA = np.concatenate([matching[0::2], extraA])[order]
+        teamsB = np.concatenate([matching[1::2], extraB])[order]
+        nGames = teamsA.shape[0]
+        compactDF = playGames(rng, ratings, teamsA, teamsB, np.sort(rng.integers(0, 133, nGames)), season)
+
+        box = {}
+        for prefix in ['W', 'L']:
+            items = boxScores(rng, compactDF[prefix + 'Score'].to_numpy())
+            for x in detailedItems:
+                box[prefix + x] = items[x]
+        detailedDF = pd.concat([compactDF, pd.DataFrame(box)], axis = 1)
+
+        seedsDF, tourneyDF = playTournament(rng, ratings, season, playIns)
+
+        #swap team positions for team ids
+        for df in [compactDF, detailedDF, tourneyDF]:
+            df['WTeamID'] = teamIDs[df['WTeamID'].to_numpy()]
+            df['LTeamID'] = teamIDs[df['LTeamID'].to_numpy()]
+        seedsDF['TeamID'] = teamIDs[seedsDF['TeamID'].to_numpy()]
+
+        tables = [seedsDF, tourneyDF, compactDF, detailedDF, conferencesDF]
+        for name, df in zip(names, tables):
+            df.to_csv(paths[name], mode = 'w' if i == 0 else 'a', header = (i == 0), index = False)
+
+    return paths
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'write a synthetic data set in the format of the Kaggle csv files')
+    parser.add_argument('outDir', help = 'folder to write the csv files to')
+    parser.add_argument('--teams', type = int, default = 350, help = 'number of teams (default 350)')
+    parser.add_argument('--games-per-team', type = int, default = 30, help = 'average regular season games per team (default 30)')
+    parser.add_argument('--seasons', type = int, default = 10, help = 'number of seasons (default 10)')
+    parser.add_argument('--first-season', type = int, default = 2003, help = 'first season (default 2003)')
+    parser.add_argument('--play-ins', type = int, default = 4, help = 'play in games per tournament (default 4)')
+    parser.add_argument('--conferences', type = int, default = 32, help = 'number of conferences (default 32)')
+    parser.add_argument('--seed', type = int, default = 0, help = 'random seed (default 0)')
+    args = parser.parse_args()
+
+    generate(args.outDir, teams = args.teams, gamesPerTeam = args.games_per_team, seasons = args.seasons, firstSeason = args.first_season,
+             playIns = args.play_ins, conferences = args.conferences, seed = args.seed)
@@ -0,0 +1,15 @@
+#### initialize libraries ####
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Python'))
+import data
+import synthetic
+
+#a small synthetic data set with a few seasons, built once for the test run
+@pytest.fixture(scope = 'session')
+def ds(tmp_path_factory):
+    outDir = str(tmp_path_factory.mktemp('synthetic'))
+    synthetic.generate(outDir, teams = 80, gamesPerTeam = 20, seasons = 4, seed = 1)
+    return data.kaggleData(dataDir = outDir, generatedDir = outDir, useCache = False)
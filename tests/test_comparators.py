@@ -0,0 +1,70 @@
+#### initialize libraries ####
+import numpy as np
+import pytest
+import models
+import simulation
+
+#### stat comparators ####
+
+#regression checks for the statComparator evaluation functions on reference DFs that hold several seasons, where a call without a season
+#compares each team's first row (which can come from different seasons for the two teams)
+
+#function that picks the winner the way a comparator should: by the stat values of each team's first row (None for a tie)
+def expectedWinner(comparator, features, teamA, teamB):
+    valueA = features.stat(teamA, comparator.stat)
+    valueB = features.stat(teamB, comparator.stat)
+    if valueA == valueB:
+        return None
+    return teamA if (valueA > valueB) == comparator.higherWins else teamB
+
+#every pairing of the first 40 tournament teams, which come from different seasons
+def pairings(df):
+    teams = sorted(set(df['WTeamID'].tolist()))[:40]
+    return [[a, b] for i, a in enumerate(teams) for b in teams[(i + 1):]]
+
+@pytest.mark.parametrize('name', ['highSeedWins', 'betterRecordWins', 'betterPtsDifWins', 'betterPtsDifPGWins'])
+def test_direct_calls_masterCompact(ds, name):
+    comparator = getattr(models, name)
+    df = ds.masterCompact
+    features = models.getTeamFeatures(df)
+    assert len(set(features.seasons[features.teamRows[x]] for x in set(df['WTeamID'].tolist()))) > 1 #the first rows span several seasons
+
+    for teamA, teamB in pairings(df):
+        expected = expectedWinner(comparator, features, teamA, teamB)
+        probability = models.winProbability(comparator, teamA, teamB, df)
+        if expected is None:
+            assert probability == 0.5
+        else:
+            assert comparator(teamA, teamB, df, rng = np.random.default_rng(0)) == expected
+            assert comparator(teamB, teamA, df, rng = np.random.default_rng(0)) == expected
+            assert probability == (1.0 if expected == teamA else 0.0)
+
+def test_resolve_without_season_matches_direct_calls(ds):
+    df = ds.masterCompact
+    features = models.getTeamFeatures(df)
+    games = pairings(df)
+    teamsA = [x[0] for x in games]
+    teamsB = [x[1] for x in games]
+    for comparator in [models.betterRecordWins, models.betterPtsDifPGWins]:
+        winners = comparator.resolve(teamsA, teamsB, df, rng = np.random.default_rng(0))
+        for (teamA, teamB), winner in zip(games, winners.tolist()):
+            expected = expectedWinner(comparator, features, teamA, teamB)
+            assert expected is None or winner == expected
+
+#composites, in the comparison or in its tie breaks, get a hashable key and a name of their own
+def test_composite_comparators(ds):
+    df = ds.masterCompact
+    compositeA = models.statComparator({'Record': 1.0, 'PtsPGDif': 0.5})
+    compositeB = models.statComparator({'Record': 0.5, 'PtsPGDif': 1.0})
+    tieBroken = models.statComparator('NumSeed', higherWins = False, tieBreaks = [({'Record': 1.0, 'PtsPGDif': 0.5}, True)])
+    assert compositeA.__name__ != compositeB.__name__
+    assert compositeA.key == models.statComparator({'PtsPGDif': 0.5, 'Record': 1.0}).key
+
+    teamA, teamB = pairings(df)[0]
+    for comparator in [compositeA, compositeB, tieBroken]:
+        assert comparator(teamA, teamB, df, rng = np.random.default_rng(0)) in (teamA, teamB)
+
+    years = [2003, 2004, 2005]
+    accuracy = simulation.tourneyGameBacktest(years, [compositeA, compositeB], df)[0]
+    assert list(accuracy.index) == [compositeA.__name__, compositeB.__name__]
+    assert accuracy[compositeA.__name__] == simulation.tourneyGameBacktest(years, compositeA, df)[0].iloc[0]
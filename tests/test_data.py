@@ -0,0 +1,80 @@
+#### initialize libraries ####
+import gc
+import os
+import shutil
+import numpy as np
+import pandas as pd
+import data
+import models
+
+#### compact team stats store ####
+
+#a teamFeatures built from a memory mapped stats array reads the stats from the mapped file instead of copying them
+def test_statsArray_features_share_memory(ds, tmp_path):
+    cached = data.kaggleData(dataDir = ds.dataDir, generatedDir = ds.generatedDir, cacheDir = str(tmp_path))
+    statsArray = cached.statsArray('teamFeaturesDetailed')
+    features = models.getTeamFeatures(statsArray)
+    assert isinstance(statsArray, np.memmap)
+    assert np.shares_memory(features.values, statsArray) and np.shares_memory(features.seasons, statsArray)
+
+    md = ds.masterDetailed
+    seasons = md['Season'].to_numpy()
+    teamsA = md['WTeamID'].to_numpy()
+    teamsB = md['LTeamID'].to_numpy()
+    for evalFn in [models.logRegPredictFull, models.betterRecordWins]:
+        assert np.allclose(models.predictMatchups(evalFn, seasons, teamsA, teamsB, md), models.predictMatchups(evalFn, seasons, teamsA, teamsB, statsArray), atol = 1e-6)
+
+#loading the same stats array again reuses the open memory map, so the team features cache does not grow with every load
+def test_statsArray_reloads_reuse_features(ds, tmp_path):
+    cached = data.kaggleData(dataDir = ds.dataDir, generatedDir = ds.generatedDir, cacheDir = str(tmp_path))
+    md = ds.masterDetailed
+    sizes = []
+    for _ in range(5):
+        statsArray = cached.statsArray('teamFeaturesDetailed')
+        models.predictMatchups(models.betterRecordWins, md['Season'].to_numpy(), md['WTeamID'].to_numpy(), md['LTeamID'].to_numpy(), statsArray)
+        del statsArray
+        gc.collect()
+        sizes.append(len(models.teamFeaturesCache))
+    assert len(set(sizes)) == 1
+
+#### season totals store ####
+
+#folding the regular season games in two batches gives exactly what a full build gives, whether the games come from a data frame or are appended to the csv
+def test_seasonTotalsStore_batches(ds, tmp_path):
+    results = ds.regSeasDetailedResults
+    expected = data.createRegSeasonStatsDF(results, data.columnsDetailed)
+    half = results.shape[0] // 2 + 3 #splits a day's games between the batches
+
+    store = data.seasonTotalsStore(str(tmp_path / 'frame.pkl'), data.columnsDetailed)
+    assert store.update(results.iloc[:half]) == half
+    assert store.update(results) == results.shape[0] - half
+    assert store.update(results) == 0
+    pd.testing.assert_frame_equal(store.totals, expected)
+
+    csvPath = str(tmp_path / 'results.csv')
+    results.iloc[:half].to_csv(csvPath, index = False)
+    store = data.seasonTotalsStore(str(tmp_path / 'csv.pkl'), data.columnsDetailed)
+    store.updateFromCSV(csvPath)
+    store.save()
+    results.iloc[half:].to_csv(csvPath, mode = 'a', header = False, index = False)
+    store = data.seasonTotalsStore(str(tmp_path / 'csv.pkl'), data.columnsDetailed)
+    assert store.updateFromCSV(csvPath) == results.shape[0] - half
+    pd.testing.assert_frame_equal(store.totals, expected)
+
+#kaggleData refreshes the season totals through the store when games are appended to the results csv
+def test_kaggleData_appended_games(ds, tmp_path):
+    dataDir = tmp_path / 'data'
+    dataDir.mkdir()
+    for x in os.listdir(ds.dataDir):
+        shutil.copy(os.path.join(ds.dataDir, x), str(dataDir / x))
+    results = ds.regSeasCompactResults
+    half = results.shape[0] // 2
+    results.iloc[:half].to_csv(str(dataDir / 'MRegularSeasonCompactResults.csv'), index = False)
+
+    cached = data.kaggleData(dataDir = str(dataDir), generatedDir = str(tmp_path), cacheDir = str(tmp_path / 'cache'))
+    pd.testing.assert_frame_equal(cached.regSeasCompactStats, data.createRegSeasonStatsDF(results.iloc[:half], data.columnsCompact))
+
+    results.iloc[half:].to_csv(str(dataDir / 'MRegularSeasonCompactResults.csv'), mode = 'a', header = False, index = False)
+    cached = data.kaggleData(dataDir = str(dataDir), generatedDir = str(tmp_path), cacheDir = str(tmp_path / 'cache'))
+    pd.testing.assert_frame_equal(cached.regSeasCompactStats, data.createRegSeasonStatsDF(results, data.columnsCompact))
+    assert any(x.endswith('.store.pkl') for x in os.listdir(str(tmp_path / 'cache')))
@@ -0,0 +1,70 @@
+#### initialize libraries ####
+import pickle
+import numpy as np
+import pandas as pd
+import pytest
+import models
+import simulation
+
+#### evaluation functions without an rng argument ####
+
+#evalFns written the original way, evalFn(teamA, teamB, refDF), break ties with numpy's global RNG and must keep working when a run is seeded
+
+def coinFlipWins(teamA, teamB, refDF):
+    return teamA if np.random.random() < 0.5 else teamB
+
+def test_tourneySimVsActual_seeded(ds):
+    years = [2003, 2004]
+    first = simulation.tourneySimVsActual(years, coinFlipWins, ds.masterCompact, ds.masterDetailed, rng = 1)
+    second = simulation.tourneySimVsActual(years, coinFlipWins, ds.masterCompact, ds.masterDetailed, rng = 1)
+    assert first == second
+
+def test_tourneyBacktest_processes(ds):
+    years = [2003, 2004, 2005]
+    evalFns = [coinFlipWins, models.betterRecordWins]
+    first = simulation.tourneyBacktest(years, evalFns, ds.masterCompact, ds.masterDetailed, processes = 1, seed = 3)
+    second = simulation.tourneyBacktest(years, evalFns, ds.masterCompact, ds.masterDetailed, processes = 2, seed = 3)
+    pd.testing.assert_series_equal(first[0], second[0])
+    pd.testing.assert_frame_equal(first[2], second[2])
+
+def test_winProbability_seeded(ds):
+    assert models.winProbability(coinFlipWins, 1101, 1102, ds.masterDetailed, rng = np.random.default_rng(0)) in (0.0, 1.0)
+
+#### matchup cache ####
+
+def test_cachedEvalFn_pickles_without_cache():
+    cached = models.cachedEvalFn(models.betterRecordWins, cache = models.matchupCache())
+    for i in range(1000):
+        cached.cache.put(('key', i), 0.5)
+    copy = pickle.loads(pickle.dumps(cached))
+    assert len(pickle.dumps(cached)) < 10000
+    assert copy.cache is models.matchupResults and copy.modelKey == cached.modelKey
+
+def test_tourneyBacktest_parallel_fills_cache(ds):
+    years = [2003, 2004, 2005]
+    serial = models.cachedEvalFn(models.logRegPredictFull, cache = models.matchupCache())
+    parallel = models.cachedEvalFn(models.logRegPredictFull, cache = models.matchupCache())
+    first = simulation.tourneyBacktest(years, serial, ds.masterCompact, ds.masterDetailed, processes = 1, seed = 3)
+    second = simulation.tourneyBacktest(years, parallel, ds.masterCompact, ds.masterDetailed, processes = 2, seed = 3)
+    pd.testing.assert_series_equal(first[0], second[0])
+    assert len(parallel.cache.entries) == len(serial.cache.entries) > 0
+
+def higherIDWins(teamA, teamB, refDF):
+    return max(teamA, teamB)
+
+def test_cachedEvalFn_plain_evalFn_seeded(ds):
+    years = [2003, 2004]
+    for cached in [models.cachedEvalFn(coinFlipWins, cache = models.matchupCache()), models.cachedEvalFn(higherIDWins, cache = models.matchupCache(), deterministic = True)]:
+        first = simulation.tourneySimVsActual(years, cached, ds.masterCompact, ds.masterDetailed, rng = 1)
+        second = simulation.tourneySimVsActual(years, cached, ds.masterCompact, ds.masterDetailed, rng = 1)
+        assert first == second
+
+def test_evalFnNames_duplicates(ds):
+    evalFns = [models.betterRecordWins, models.cachedEvalFn(models.betterRecordWins)]
+    with pytest.raises(ValueError, match = 'betterRecordWins'):
+        simulation.tourneyBacktest([2003], evalFns, ds.masterCompact, processes = 1)
+    with pytest.raises(ValueError, match = 'betterRecordWins'):
+        simulation.tourneyGameBacktest([2003], evalFns, ds.masterCompact)
+
+    names = simulation.evalFnNames({'plain': evalFns[0], 'cached': evalFns[1]})[0]
+    assert names == ['plain', 'cached']
@@ -0,0 +1,34 @@
+#### initialize libraries ####
+import pandas as pd
+import pytest
+import data
+import models
+import simulation
+import synthetic
+
+#### synthetic data ####
+
+#with very few games per team, every team still needs a game so each seeded team has stats and every bracket is complete
+@pytest.mark.parametrize('teams, gamesPerTeam', [[68, 1], [69, 1], [101, 2]])
+def test_every_team_plays(tmp_path, teams, gamesPerTeam):
+    synthetic.generate(str(tmp_path), teams = teams, gamesPerTeam = gamesPerTeam, seasons = 2, seed = 0)
+    ds = data.kaggleData(dataDir = str(tmp_path), generatedDir = str(tmp_path), useCache = False)
+
+    gamesDF = pd.read_csv(tmp_path / 'MRegularSeasonCompactResults.csv')
+    for season, seasonDF in gamesDF.groupby('Season'):
+        assert len(set(seasonDF['WTeamID']) | set(seasonDF['LTeamID'])) == teams
+
+    simulation.tourneySimVsActual([2003, 2004], models.betterRecordWins, ds.masterCompact, rng = 0)
+
+def test_gamesPerTeam_checked(tmp_path):
+    with pytest.raises(ValueError):
+        synthetic.generate(str(tmp_path), teams = 68, gamesPerTeam = 0, seasons = 1)
+
+#with 32 play in games, two play in winners can meet after the first round (here in 2004), which must not be read as a play in game
+def test_play_in_winners_meet(tmp_path):
+    synthetic.generate(str(tmp_path), teams = 200, gamesPerTeam = 20, seasons = 3, playIns = 32, seed = 1)
+    ds = data.kaggleData(dataDir = str(tmp_path), generatedDir = str(tmp_path), useCache = False)
+    for year in [2003, 2004, 2005]:
+        actual = simulation.tourneyActual(year, ds.masterCompact)
+        assert len(actual) == 63 + 32 and all(x != 0 for x in actual)
+    simulation.tourneySimVsActual([2003, 2004, 2005], models.betterRecordWins, ds.masterCompact, rng = 0)